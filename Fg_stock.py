@@ -3,42 +3,32 @@ import sys
 import re
 import logging
 import time
-from pathlib import Path
-from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 import pytz
-import pandas as pd
-import requests
-from google.oauth2 import service_account
-import gspread
 from gspread_dataframe import set_with_dataframe
-from dotenv import load_dotenv
+
+import date_windows
+import gsheets
+import period_cache
+import transform_pool
+from odoo_client import OdooClient, OdooError
 
 # ===== Setup Logging =====
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 log = logging.getLogger()
 
-# ===== Load environment variables =====
-load_dotenv()
-ODOO_URL = os.getenv("ODOO_URL")
-DB = os.getenv("ODOO_DB")
-USERNAME = os.getenv("ODOO_USERNAME")
-PASSWORD = os.getenv("ODOO_PASSWORD")
-
 SHEET_KEY = "1z6Zb_BronrO26rNS_gCKmsetoY7_OFysfIyvU3iazy0"
 
 # ===== Calculate date ranges =====
-today = date.today()
-yesterday = today - timedelta(days=1)
-current_first = today.replace(day=1)
-prev_last_month = current_first - timedelta(days=1)
-prev_first = prev_last_month.replace(day=1)
-prev_last = current_first - timedelta(days=1)
-
-reports = [
-    {"type": "cs", "from_date": current_first.isoformat(), "to_date": today.isoformat()},
-    {"type": "ld", "from_date": current_first.isoformat(), "to_date": yesterday.isoformat()},
-    {"type": "lm", "from_date": prev_first.isoformat(), "to_date": prev_last.isoformat()},
-]
+def build_reports():
+    # Three fixed windows per run: FROM_DATE / TO_DATE do not apply
+    cs, ld, lm = (date_windows.resolve(policy, env=False) for policy in ("mtd", "mt_yesterday", "prev_month"))
+    return [
+        {"type": "cs", "from_date": cs.from_date, "to_date": cs.to_date},
+        {"type": "ld", "from_date": ld.from_date, "to_date": ld.to_date},
+        {"type": "lm", "from_date": lm.from_date, "to_date": lm.to_date},
+    ]
 
 worksheet_map = {
     "Zipper": {
@@ -61,78 +51,13 @@ target_companies = {
 DOWNLOAD_DIR = os.path.join(os.getcwd(), "download")
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
-session = requests.Session()
-USER_ID = None
-
 # ===== Utility Functions =====
-def login():
-    global USER_ID
-    payload = {
-        "jsonrpc": "2.0",
-        "params": {
-            "db": DB,
-            "login": USERNAME,
-            "password": PASSWORD
-        }
-    }
-    r = session.post(f"{ODOO_URL}/web/session/authenticate", json=payload)
-    r.raise_for_status()
-    result = r.json().get("result")
-    if result and "uid" in result:
-        USER_ID = result["uid"]
-        log.info(f"✅ Logged in (uid={USER_ID})")
-        return result
-    else:
-        raise Exception("❌ Login failed")
-
-def switch_company(company_id):
-    if USER_ID is None:
-        raise Exception("User not logged in yet")
-    payload = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": "res.users",
-            "method": "write",
-            "args": [[USER_ID], {"company_id": company_id}],
-            "kwargs": {
-                "context": {
-                    "allowed_company_ids": [company_id],
-                    "company_id": company_id
-                }
-            }
-        }
-    }
-    r = session.post(f"{ODOO_URL}/web/dataset/call_kw", json=payload)
-    r.raise_for_status()
-    if "error" in r.json():
-        log.error(f"❌ Failed to switch to company {company_id}: {r.json()['error']}")
-        return False
-    else:
-        log.info(f"🔄 Session switched to company {company_id}")
-        return True
-
-def fetch_fg_store_datas(company_id, cname, from_date, to_date):
-    context = {
-        "lang": "en_US",
-        "tz": "Asia/Dhaka",
-        "uid": USER_ID,
-        "allowed_company_ids": [company_id]
-    }
-    payload = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": "operation.details",
-            "method": "retrieve_fg_store_datas",
-            "args": [[company_id], from_date, to_date],
-            "kwargs": {"context": context}
-        }
-    }
-    r = session.post(f"{ODOO_URL}/web/dataset/call_kw/operation.details/retrieve_fg_store_datas", json=payload)
-    r.raise_for_status()
+def fetch_fg_store_datas(client, company_id, cname, from_date, to_date):
+    # The company comes from the context, so windows of both companies can run side by side
+    context = client.context(company_id)
     try:
-        data = r.json()["result"]
+        data = client.call_kw("operation.details", "retrieve_fg_store_datas",
+                              [[company_id], from_date, to_date], {"context": context})
         if isinstance(data, list):
             def flatten_record(record):
                 return {
@@ -146,17 +71,16 @@ def fetch_fg_store_datas(company_id, cname, from_date, to_date):
         else:
             log.warning(f"⚠️ Unexpected data format for {cname}: {type(data)}")
             return []
-    except Exception as e:
+    except OdooError as e:
         log.error(f"❌ {cname}: Failed to parse data: {e}")
         return []
 
 # ====== Function to save records using regex-friendly pattern ======
 def save_records_to_excel(records, company_name, report_type, to_date):
     if records:
-        df = pd.DataFrame(records)
         company_clean = re.sub(r'\W+', '_', company_name.lower())
         output_file = os.path.join(DOWNLOAD_DIR, f"{company_clean}_fg_store_datas_{report_type}_{to_date}.xlsx")
-        df.to_excel(output_file, index=False)
+        transform_pool.write_excel(records, output_file)
         log.info(f"📂 Saved: {output_file}")
         return output_file
     else:
@@ -164,35 +88,21 @@ def save_records_to_excel(records, company_name, report_type, to_date):
         return None
 
 # ====== Function to paste downloaded files into Google Sheet ======
-def paste_downloaded_file_to_gsheet(company_name, sheet_key, worksheet_name, report_type):
+def paste_downloaded_file_to_gsheet(company_name, sheet_key, worksheet_name, report_type, file_path):
     try:
-        company_clean = re.sub(r'\W+', '_', company_name.lower())
-        files = list(Path(DOWNLOAD_DIR).glob(f"{company_clean}_fg_store_datas_{report_type}_*.xlsx"))
-        if not files:
+        if not file_path:
             log.warning(f"⚠️ No downloaded file found for {company_name} ({report_type})")
             return
         
-        files.sort(key=lambda x: x.stat().st_mtime, reverse=True)
-        latest_file = files[0]
-        df = pd.read_excel(latest_file)
-        
-        # Drop first column if exists
-        if df.shape[1] > 1:
-            df = df.iloc[:, 1:]
+        df = transform_pool.read_excel(file_path, drop_first_column=True, replace_false=True)
         
-        log.info(f"✅ Loaded file {latest_file.name} into DataFrame (first column dropped)")
+        log.info(f"✅ Loaded file {os.path.basename(file_path)} into DataFrame (first column dropped)")
 
-        scope = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
-        creds = service_account.Credentials.from_service_account_file('gcreds.json', scopes=scope)
-        client = gspread.authorize(creds)
-        
-        sheet = client.open_by_key(sheet_key)
-        worksheet = sheet.worksheet(worksheet_name)
+        worksheet = gsheets.get_worksheet(sheet_key, worksheet_name)
         
         if df.empty:
             log.warning(f"⚠️ DataFrame for {company_name} ({report_type}) is empty. Skipping paste.")
             return
-        df = df.replace(False, "") 
         worksheet.batch_clear(["A:N"])
         time.sleep(2)
         set_with_dataframe(worksheet, df)
@@ -205,28 +115,41 @@ def paste_downloaded_file_to_gsheet(company_name, sheet_key, worksheet_name, rep
         
     except Exception as e:
         log.error(f"❌ Error in paste_downloaded_file_to_gsheet({company_name}, {report_type}): {e}")
+        raise
 
 # ====== Main Workflow ======
-if __name__ == "__main__":
-    userinfo = login()
-    log.info(f"User info (allowed companies): {userinfo.get('user_companies', {})}")
+def run_window(client, cid, cname, report):
+    from_date = report["from_date"]
+    to_date = report["to_date"]
+    report_type = report["type"]
+    worksheet_name = worksheet_map.get(cname, {}).get(report_type)
+    if not worksheet_name:
+        log.warning(f"⚠️ No worksheet mapping for {cname} ({report_type}), skipping...")
+        return True
+    try:
+        log.info(f"Processing report {report_type} for {cname}: FROM_DATE={from_date}, TO_DATE={to_date}")
+        records = period_cache.cached("fg_store", cid, from_date, to_date,
+                                      lambda: fetch_fg_store_datas(client, cid, cname, from_date, to_date))
+        output_file = save_records_to_excel(records, cname, report_type, to_date)
+        paste_downloaded_file_to_gsheet(cname, SHEET_KEY, worksheet_name, report_type, output_file)
+        return output_file is not None
+    except Exception as e:
+        log.error(f"❌ {cname} ({report_type}) failed: {e}")
+        return False
 
-    for cid, cname in target_companies.items():
-        if not switch_company(cid):
-            log.warning(f"⚠️ Failed to switch to company {cid} ({cname}), skipping...")
-            continue
+def run(client, company_ids=None, windows=None):
+    # Every (company, window) is computed at the same time; the run takes as long as the slowest one
+    jobs = [(cid, cname, report)
+            for cid, cname in target_companies.items() if not company_ids or cid in company_ids
+            for report in build_reports() if not windows or report["type"] in windows]
+    with ThreadPoolExecutor(max_workers=max(len(jobs), 1), thread_name_prefix="window") as pool:
+        done = list(pool.map(lambda job: run_window(client, *job), jobs))
+    # The windows that failed, for run_unit to report
+    return [f"{cname} {report['type']}" for (_, cname, report), ok in zip(jobs, done) if not ok]
 
-        log.info(f"🔍 Processing {cname} (Company ID: {cid})")
 
-        for report in reports:
-            from_date = report["from_date"]
-            to_date = report["to_date"]
-            report_type = report["type"]
-            worksheet_name = worksheet_map.get(cname, {}).get(report_type)
-            if not worksheet_name:
-                log.warning(f"⚠️ No worksheet mapping for {cname} ({report_type}), skipping...")
-                continue
-            log.info(f"Processing report {report_type}: FROM_DATE={from_date}, TO_DATE={to_date}")
-            records = fetch_fg_store_datas(cid, cname, from_date, to_date)
-            save_records_to_excel(records, cname, report_type, to_date)
-            paste_downloaded_file_to_gsheet(cname, SHEET_KEY, worksheet_name, report_type)
\ No newline at end of file
+if __name__ == "__main__":
+    client = OdooClient()
+    userinfo = client.login()
+    log.info(f"User info (allowed companies): {userinfo.get('user_companies', {})}")
+    run(client)
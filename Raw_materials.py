@@ -1,29 +1,23 @@
-import os
 import sys
 import time
 import logging
 import pytz
 import re
-from pathlib import Path
 from datetime import date, datetime
-import requests
 import pandas as pd
-from google.oauth2 import service_account
-import gspread
 from gspread_dataframe import set_with_dataframe
-from dotenv import load_dotenv
+
+import gsheets
+import category_domains
+import date_windows
+import delta_sync
+import transform_pool
+from odoo_client import OdooClient, OdooError, flatten_record
 
 # ===== Setup Logging =====
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 log = logging.getLogger()
 
-# ===== Load environment variables =====
-load_dotenv()
-ODOO_URL = os.getenv("ODOO_URL")
-DB = os.getenv("ODOO_DB")
-USERNAME = os.getenv("ODOO_USERNAME")
-PASSWORD = os.getenv("ODOO_PASSWORD")
-
 # ===== Companies & Google Sheet info =====
 COMPANIES = {
     1: "Zipper",
@@ -41,95 +35,36 @@ SHEET_INFO = {
     }
 }
 
-# ===== Default date =====
-today = date.today()
-FROM_DATE = os.getenv("FROM_DATE", today.replace(day=1).isoformat())
-TO_DATE = os.getenv("TO_DATE", today.isoformat())
-
-log.info(f"Using FROM_DATE={FROM_DATE}, TO_DATE={TO_DATE}")
-
-session = requests.Session()
-USER_ID = None
-
-# ===== Login =====
-def login():
-    global USER_ID
-    payload = {"jsonrpc": "2.0", "params": {"db": DB, "login": USERNAME, "password": PASSWORD}}
-    r = session.post(f"{ODOO_URL}/web/session/authenticate", json=payload)
-    r.raise_for_status()
-    result = r.json().get("result")
-    if result and "uid" in result:
-        USER_ID = result["uid"]
-        log.info(f"✅ Logged in (uid={USER_ID})")
-        return result
-    else:
-        raise Exception("❌ Login failed")
-
-# ===== Switch company =====
-def switch_company(company_id):
-    if USER_ID is None:
-        raise Exception("User not logged in yet")
-    payload = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": "res.users",
-            "method": "write",
-            "args": [[USER_ID], {"company_id": company_id}],
-            "kwargs": {"context": {"allowed_company_ids": [company_id], "company_id": company_id}}
-        }
-    }
-    r = session.post(f"{ODOO_URL}/web/dataset/call_kw", json=payload)
-    r.raise_for_status()
-    if "error" in r.json():
-        log.error(f"❌ Failed to switch to company {company_id}: {r.json()['error']}")
-        return False
-    log.info(f"🔄 Session switched to company {company_id}")
-    return True
+# ===== Default: current month 1st to today if env vars are empty =====
+def resolve_window():
+    return date_windows.resolve("mtd")
 
 # ===== Fetch Raw Material Products =====
-def fetch_raw_materials(company_id, cname):
-    context = {"lang": "en_US","tz": "Asia/Dhaka","uid": USER_ID,"allowed_company_ids": [company_id],"current_company_id": company_id}
-    payload = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": "product.template",
-            "method": "web_search_read",
-            "args": [],
-            "kwargs": {
-                "specification": {
-                    "categ_type": {"fields": {"display_name": {}}},
-                    "default_code": {},
-                    "name": {},
-                    "categ_id": {"fields": {"display_name": {}}},
-                    "qty_available": {},
-                    "generic_name": {}
-                },
-                "offset": 0,
-                "limit": 10000,
-                "context": context,
-                "count_limit": 100000,
-                "domain": [
-                    "&",
-                    ["categ_id", "ilike", "ALL / RM /"],
-                    ["default_code", "ilike", "R_"]
-                ],
-            },
-        },
+def fetch_raw_materials(client, company_id, cname):
+    context = {"lang": "en_US","tz": "Asia/Dhaka","uid": client.uid,"allowed_company_ids": [company_id],"current_company_id": company_id}
+    specification = {
+        "categ_type": {"fields": {"display_name": {}}},
+        "default_code": {},
+        "name": {},
+        "categ_id": {"fields": {"display_name": {}}},
+        "qty_available": {},
+        "generic_name": {}
     }
-
-    r = session.post(f"{ODOO_URL}/web/dataset/call_kw/product.template/web_search_read", json=payload)
-    r.raise_for_status()
+    domain = [
+        "&",
+        ["categ_id", "ilike", "ALL / RM /"],
+        ["default_code", "ilike", "R_"]
+    ]
     try:
-        records = r.json()["result"]["records"]
-        def flatten(record):
-            return {k: (v.get("display_name") if isinstance(v, dict) and "display_name" in v else v) for k,v in record.items()}
-        flattened = [flatten(rec) for rec in records]
+        # On-hand qty is computed from quants, so a quant update counts as a change of the product
+        records = delta_sync.fetch(client, "raw_materials", "product.template", specification,
+                                   category_domains.compile_domain(client, domain), context, company_id,
+                                   depends=("product_variant_ids.stock_quant_ids.write_date",))
+        flattened = [flatten_record(rec) for rec in records]
         log.info(f"📦 {cname}: {len(flattened)} raw material product rows fetched")
         return flattened
-    except Exception:
-        log.error(f"❌ {cname}: Failed to parse product data: {r.text[:200]}")
+    except OdooError as e:
+        log.error(f"❌ {cname}: Failed to parse product data: {e.error}")
         return []
 
 # ===== Save to Excel & Paste to Google Sheet =====
@@ -138,21 +73,18 @@ def save_and_paste_to_sheet(records, cname):
         log.warning(f"❌ No data for {cname}")
         return
     df = pd.DataFrame(records)
-    file_name = f"{cname.lower().replace(' ','_')}_raw_materials_{today.isoformat()}.xlsx"
-    df.to_excel(file_name, index=False)
-    log.info(f"📂 Saved: {file_name}")
+    file_name = f"{cname.lower().replace(' ','_')}_raw_materials_{date.today().isoformat()}.xlsx"
+    # Written in the transform pool while the sheet is being pasted
+    saved = transform_pool.submit_write_excel(df, file_name)
 
     # Google Sheet
-    scope = ["https://www.googleapis.com/auth/spreadsheets","https://www.googleapis.com/auth/drive"]
-    creds = service_account.Credentials.from_service_account_file('gcreds.json', scopes=scope)
-    client = gspread.authorize(creds)
-
     sheet_key = SHEET_INFO[re.sub(r'\W+', '_', cname.lower())]["sheet_id"]
     worksheet_name = SHEET_INFO[re.sub(r'\W+', '_', cname.lower())]["worksheet_name"]
-    worksheet = client.open_by_key(sheet_key).worksheet(worksheet_name)
+    worksheet = gsheets.get_worksheet(sheet_key, worksheet_name)
 
     if df.empty:
         log.warning("Skip: DataFrame empty, not pasting.")
+        saved.result()
         return
 
     if df.shape[1] > 1:
@@ -166,12 +98,28 @@ def save_and_paste_to_sheet(records, cname):
     local_time = datetime.now(local_tz).strftime("%Y-%m-%d %H:%M:%S")
     worksheet.update('G2', [[f"{local_time}"]])
     log.info(f"✅ Data pasted to {worksheet_name} with timestamp {local_time}")
+    saved.result()
+    log.info(f"📂 Saved: {file_name}")
 
 # ===== Main =====
-if __name__ == "__main__":
-    userinfo = login()
-    log.info(f"User info: {userinfo.get('user_companies',{})}")
+def run(client, company_ids=None):
+    from_date, to_date = resolve_window()
+    log.info(f"Using FROM_DATE={from_date}, TO_DATE={to_date}")
+    failed = []
     for cid, cname in COMPANIES.items():
-        if switch_company(cid):
-            records = fetch_raw_materials(cid, cname)
+        if company_ids and cid not in company_ids:
+            continue
+        if client.switch_company(cid):
+            records = fetch_raw_materials(client, cid, cname)
             save_and_paste_to_sheet(records, cname)
+        else:
+            log.error(f"🚫 Skipping {cname}: could not switch company")
+            failed.append(cname)
+    return failed
+
+
+if __name__ == "__main__":
+    client = OdooClient()
+    userinfo = client.login()
+    log.info(f"User info: {userinfo.get('user_companies',{})}")
+    run(client)
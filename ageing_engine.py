@@ -0,0 +1,174 @@
+"""Ageing buckets (slot_1 … slot_6, duration) computed locally from the lots in stock.
+
+The ageing scripts ran a ``stock.ageing`` wizard for every as-of date only to list the lots
+in stock, each bucketed by its age. The same lots, with their receive date, closing
+qty / value and prices, are the rows of the opening/closing report of any window that ends
+on the as-of date. With AGEING_ENGINE=1:
+
+* the lots come from the shared opening/closing read (union_fetch) of the month up to the
+  as-of date. That is the read Closing_stock.py, unuseable_stock.py and Spares_stock.py
+  make for their month-to-date window, and one read serves the RM and the spare-parts
+  reports. Closed month-ends (inventory_ageing_1.py, spares_ageing_closing_preious_month.py)
+  are kept in the closed-period cache, so they are read once a month. No stock.ageing
+  wizard runs;
+* ``buckets`` bins the lots by ``as_of - receive_date`` with ``np.searchsorted``, for any
+  number of as-of dates in one pass. The edges come from AGEING_BUCKETS (default
+  ``30,60,90,180,365``, Odoo's 0-30 … 365+) and the slot amount from
+  AGEING_SLOT_MEASURE (default ``cloing_qty``);
+* in an AGEING_ENGINE_VERIFY fraction of the runs (default 0.05) the stock.ageing wizard is
+  computed as well and its rows are compared with the engine's at Odoo's edges. On any
+  difference Odoo's rows are used and a warning shows the first one.
+
+A run with FROM_DATE set is computed by the wizard. Lots without a receive date are not
+aged: duration 0 and every slot empty.
+"""
+import os
+import random
+import logging
+from collections import Counter
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import period_cache
+import union_fetch
+from stock_reports import save_forecast_wizard, compute_forecast, fetch_report_rows, result_set
+
+log = logging.getLogger(__name__)
+
+ENABLED = os.getenv("AGEING_ENGINE", "").strip().lower() in ("1", "true", "yes")
+VERIFY_RATE = float(os.getenv("AGEING_ENGINE_VERIFY", 0.05))
+ODOO_EDGES = (30, 60, 90, 180, 365)
+EDGES = tuple(int(days) for days in os.getenv("AGEING_BUCKETS", ",".join(map(str, ODOO_EDGES))).split(","))
+MEASURE = os.getenv("AGEING_SLOT_MEASURE", "cloing_qty")
+TOLERANCE = 0.01
+
+SCOPE = "union_opening_closing"
+SLOTS = tuple(f"slot_{i}" for i in range(1, len(ODOO_EDGES) + 2))
+# Compared between the engine and Odoo in a verification run
+COMPARED = ("product_id", "lot_id", "duration", "cloing_qty", "cloing_value")
+
+
+def slot_labels(edges=EDGES):
+    """Column names of the buckets: ``0-30``, ``31-60``, …, ``365+``."""
+    bounds = (-1,) + tuple(edges)
+    return [f"{low + 1}-{high}" for low, high in zip(bounds, bounds[1:])] + [f"{edges[-1]}+"]
+
+
+def buckets(receive_dates, amounts, as_of_dates, edges=EDGES):
+    """Ages ``(dates, lots)`` in days and bucketed amounts ``(dates, lots, len(edges) + 1)`` at every as-of date."""
+    received = pd.to_datetime(pd.Series([d or None for d in receive_dates], dtype=object),
+                              errors="coerce").to_numpy("datetime64[D]")
+    amounts = pd.to_numeric(pd.Series(list(amounts), dtype=object), errors="coerce").fillna(0).to_numpy(float)
+    as_of = np.asarray(as_of_dates, dtype="datetime64[D]")
+    known = ~np.isnat(received)
+    days = np.where(known, (as_of[:, None] - received[None, :]).astype(np.int64), 0)
+    # 0-30 → 0, 31-60 → 1, …: an age equal to an edge belongs to the bucket it closes
+    index = np.searchsorted(np.asarray(edges), days, side="left")
+    hit = (index[..., None] == np.arange(len(edges) + 1)) & known[None, :, None]
+    return days, np.where(hit, amounts[None, :, None], 0.0)
+
+
+def age_many(rows, as_of_dates, labels, edges=EDGES, measure=MEASURE):
+    """``{as_of: rows}``: ``rows`` (flattened with ``labels``) with their slot and duration columns recomputed."""
+    server_slots = [labels.get(slot, slot) for slot in SLOTS]
+    duration = labels.get("duration", "duration")
+    names = slot_labels(edges)
+    days, amounts = buckets([row.get(labels.get("receive_date", "receive_date")) for row in rows],
+                            [row.get(labels.get(measure, measure)) for row in rows], as_of_dates, edges)
+    skipped = set(server_slots[1:])
+    aged = {}
+    for as_of, lot_days, lot_amounts in zip(as_of_dates, days.tolist(), amounts.tolist()):
+        out = []
+        for row, age_days, slots in zip(rows, lot_days, lot_amounts):
+            new = {}
+            for key, value in row.items():
+                if key == server_slots[0]:
+                    new.update(zip(names, slots))
+                elif key == duration:
+                    new[key] = age_days
+                elif key not in skipped:
+                    new[key] = value
+            if server_slots[0] not in row:
+                new.update(zip(names, slots))
+                new[duration] = age_days
+            out.append(new)
+        aged[as_of] = out
+    return aged
+
+
+def age(rows, as_of, labels, edges=EDGES, measure=MEASURE):
+    return age_many(rows, [as_of], labels, edges, measure)[as_of]
+
+
+def _number(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _company(client, company_id, cname):
+    """The company as a many2one value, named as in the user's allowed companies."""
+    companies = client.user_info.get("user_companies", {}).get("allowed_companies", {})
+    company = companies.get(str(company_id)) or companies.get(company_id) or {}
+    return {"id": company_id, "display_name": company.get("name", cname)}
+
+
+def positions(client, company_id, cname, domain, to_date):
+    """Lots in stock at ``to_date``: the shared opening/closing read of its month, split for ``domain``."""
+    from_date = date.fromisoformat(to_date).replace(day=1).isoformat()
+    records = period_cache.cached(SCOPE, company_id, from_date, to_date,
+                                  lambda: union_fetch.shared_rows(client, company_id, cname, from_date, to_date))
+    return [rec for rec in union_fetch.split(client, records, domain)
+            if abs(_number(rec.get("cloing_qty")) or 0) > TOLERANCE]
+
+
+def local_rows(client, company_id, cname, domain, specification, flatten, to_date):
+    """The lots of ``positions`` shaped like a ``stock.ageing`` read with ``specification`` (slots not set)."""
+    company = _company(client, company_id, cname)
+    rows = []
+    for rec in positions(client, company_id, cname, domain, to_date):
+        record = union_fetch.project(rec, specification)
+        if "company_id" in record:
+            record["company_id"] = company
+        rows.append(flatten(record))
+    return rows
+
+
+def differences(engine, odoo, columns):
+    """Rows (as value tuples over ``columns``) found on one side only: ``(engine_only, odoo_only)``."""
+    def signature(row):
+        return tuple(round(v, 2) if isinstance(v, (int, float)) and not isinstance(v, bool) else v
+                     for v in (row.get(column) for column in columns))
+    engine, odoo = Counter(map(signature, engine)), Counter(map(signature, odoo))
+    return list((engine - odoo).elements()), list((odoo - engine).elements())
+
+
+def fetch(client, company_id, cname, report_for, domain, specification, flatten, labels, from_date, to_date):
+    """Ageing rows at ``to_date`` with the engine's buckets (Odoo's when a verification run differs)."""
+    def server():
+        with result_set(client):
+            wizard_id = save_forecast_wizard(client, company_id, "ageing", report_for, from_date, to_date)
+            compute_forecast(client, company_id, wizard_id)
+            return fetch_report_rows(client, "stock.ageing", specification, domain, company_id, cname,
+                                     wizard_id=wizard_id, flatten=flatten)
+
+    if from_date:
+        log.info(f"⏳ {cname}: FROM_DATE is set, ageing computed by the wizard")
+        return server()
+    rows = local_rows(client, company_id, cname, domain, specification, flatten, to_date)
+    if random.random() < VERIFY_RATE:
+        odoo = server()
+        columns = [labels.get(field, field) for field in COMPARED] + slot_labels(ODOO_EDGES)
+        engine_only, odoo_only = differences(age(rows, to_date, labels, ODOO_EDGES), odoo, columns)
+        if engine_only or odoo_only:
+            example = dict(zip(columns, (engine_only or odoo_only)[0]))
+            log.warning(f"⚠️ {cname}: ageing engine differs from Odoo on {len(engine_only)} of its rows and "
+                        f"{len(odoo_only)} of Odoo's (e.g. {'engine' if engine_only else 'Odoo'} only: {example}), "
+                        f"keeping Odoo's rows")
+            return odoo
+        log.info(f"🔎 {cname}: ageing engine matches Odoo ({len(odoo)} lots)")
+    log.info(f"⏳ {cname}: {len(rows)} lots aged at {to_date} locally ({', '.join(slot_labels())})")
+    return age(rows, to_date, labels)
@@ -0,0 +1,239 @@
+"""Rebuild the monthly history of a stock report into a partitioned Parquet archive.
+
+    python backfill.py --from 2025-04 --to 2025-11 --report closing_stock
+    python backfill.py --from 2024-04 --to 2025-03 --report spares_stock --company 3 --workers 6
+    python backfill.py --seed download/ --report closing_stock      # import the hand-collected files
+
+The range is split into calendar months and the (company, month) windows are shared out
+to ``--workers`` threads. The calls stay under ``--odoo-concurrency``. Each thread computes
+its own forecast wizard, scoped to the window through the context. Odoo keeps one result set
+per user, so the compute and read of a window hold it (``stock_reports.result_set``) and the
+windows take turns on the server; the Parquet writes overlap them. Each window is written to
+``archive/<report>/company=<id>/month=<YYYY-MM>/part-0.parquet`` (ODOO_ARCHIVE_DIR). Months
+already there are skipped unless ``--refresh`` is given, so an interrupted backfill resumes
+where it stopped. Months that are not closed yet (see period_cache) are never archived.
+
+``load`` reads the archive back as one DataFrame, with ``company`` and ``month`` columns.
+Writing needs ``pyarrow``.
+"""
+import os
+import re
+import glob
+import sys
+import time
+import logging
+import argparse
+import threading
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import odoo_client
+import page_tuner
+import period_cache
+import wizards
+from category_domains import compile_domain
+from odoo_client import OdooClient, flatten_record
+from stock_reports import (OPENING_CLOSING_SPEC, RM_DOMAIN, SPARE_PARTS_DOMAIN, create_forecast_wizard,
+                           compute_forecast, report_context, result_set)
+
+try:
+    import pyarrow  # noqa: F401  (Parquet engine used by pandas)
+except ImportError:
+    pyarrow = None
+
+log = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.getenv("ODOO_ARCHIVE_DIR", "archive")
+MODEL = "stock.opening.closing"
+
+COMPANIES = {
+    1: "Zipper",
+    3: "Metal Trims",
+}
+
+# ===== Reports that can be backfilled =====
+REPORTS = {
+    "closing_stock": {"specification": OPENING_CLOSING_SPEC, "domain": RM_DOMAIN},
+    "spares_stock": {"specification": OPENING_CLOSING_SPEC, "domain": SPARE_PARTS_DOMAIN},
+}
+
+# Hand-collected monthly files, e.g. download/zipper_Apr_2025_opening_closing.xlsx (RM opening/closing)
+PARTITION = re.compile(r"company=(?P<company>\d+)[/\\]month=(?P<month>\d{4}-\d{2})")
+SEED_FILE = re.compile(r"^(?P<company>\w+?)_(?P<month>[A-Z][a-z]{2})_(?P<year>\d{4})_opening_closing\.xlsx$")
+SEED_REPORT = "closing_stock"
+# Not %b: the file names are English whatever the locale
+MONTHS = {name: i for i, name in enumerate(
+    ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), start=1)}
+
+
+def parse_month(value):
+    try:
+        return date.fromisoformat(f"{value}-01")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid month {value!r}, expected YYYY-MM")
+
+
+def months_between(first, last):
+    """First days of every month from ``first`` to ``last``, both included."""
+    months, month = [], first.replace(day=1)
+    while month <= last:
+        months.append(month)
+        month = (month + timedelta(days=32)).replace(day=1)
+    return months
+
+
+def month_window(month):
+    """``(from_date, to_date)`` ISO strings of the calendar month starting at ``month``."""
+    last = (month + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return month.isoformat(), last.isoformat()
+
+
+def partition_path(report, company_id, month):
+    return os.path.join(ARCHIVE_DIR, report, f"company={company_id}", f"month={month:%Y-%m}", "part-0.parquet")
+
+
+def is_archived(report, company_id, month):
+    return os.path.exists(partition_path(report, company_id, month))
+
+
+def columnar(records):
+    """``records`` as a DataFrame typed the way the archive stores them."""
+    df = pd.DataFrame(records)
+    for col in df.columns[df.dtypes == object]:
+        # Empty many2ones / chars come back as False: keep text columns text
+        df[col] = df[col].map(lambda v: None if v is False else v).astype("string")
+    return df
+
+
+def write_parquet(path, records):
+    if pyarrow is None:
+        raise SystemExit("❌ The archive is written as Parquet, install pyarrow")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    columnar(records).to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+    return path
+
+
+def write_partition(report, company_id, month, records):
+    return write_parquet(partition_path(report, company_id, month), records)
+
+
+def load(report, company_ids=None, months=None):
+    """The archived rows of ``report`` as one DataFrame, optionally restricted to some companies / months."""
+    wanted = {f"{m:%Y-%m}" for m in months} if months else None
+    frames = []
+    # Partition by partition: a column empty in one month and filled in another has a different type
+    for path in sorted(glob.glob(os.path.join(ARCHIVE_DIR, report, "company=*", "month=*", "part-0.parquet"))):
+        match = PARTITION.search(path)
+        company_id, month = int(match["company"]), match["month"]
+        if (company_ids and company_id not in company_ids) or (wanted and month not in wanted):
+            continue
+        frames.append(pd.read_parquet(path).assign(company=company_id, month=month))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+# ===== Backfill =====
+def compute_month(client, report, company_id, month):
+    """Compute and read one (company, month) window; returns its flattened rows."""
+    entry = REPORTS[report]
+    cname = COMPANIES[company_id]
+    from_date, to_date = month_window(month)
+    with result_set(client):
+        wizard_id = create_forecast_wizard(client, company_id, from_date, to_date)
+        compute_forecast(client, company_id, wizard_id)
+        return page_tuner.read_all(client, MODEL, entry["specification"], compile_domain(client, entry["domain"]),
+                                   report_context(company_id, wizard_id), label=f"{cname} {month:%Y-%m}",
+                                   transform=flatten_record)
+
+
+def backfill(client, report, months, company_ids=None, workers=4, refresh=False):
+    """Archive every missing (company, month) of ``report``; returns the windows that failed."""
+    company_ids = company_ids or list(COMPANIES)
+    todo, skipped = [], 0
+    for month in months:
+        if not period_cache.is_closed(month_window(month)[1]):
+            log.warning(f"⚠️ {month:%Y-%m} is not closed yet, not archived")
+            continue
+        for company_id in company_ids:
+            if not refresh and is_archived(report, company_id, month):
+                skipped += 1
+                continue
+            todo.append((company_id, month))
+    log.info(f"🗃️ {report}: {len(todo)} window(s) to compute, {skipped} already archived")
+
+    failed = []
+
+    def run_window(window):
+        company_id, month = window
+        started = time.time()
+        try:
+            records = compute_month(client, report, company_id, month)
+            if not records:
+                raise ValueError("no rows, nothing archived")
+            path = write_partition(report, company_id, month, records)
+        except Exception as e:
+            log.error(f"❌ {COMPANIES[company_id]} {month:%Y-%m}: {e}")
+            failed.append(window)
+            return
+        log.info(f"🗃️ {COMPANIES[company_id]} {month:%Y-%m}: {len(records)} rows archived in "
+                 f"{time.time() - started:.1f}s → {path}")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(todo))), thread_name_prefix="backfill") as pool:
+        list(pool.map(run_window, todo))
+    return failed
+
+
+def seed(report, directory):
+    """Archive the hand-collected monthly xlsx files of ``directory``; months already archived are kept."""
+    if report != SEED_REPORT:
+        raise SystemExit(f"❌ The hand-collected files are {SEED_REPORT} (RM) data, they cannot seed {report}")
+    by_slug = {re.sub(r"\W+", "_", name.lower()): cid for cid, name in COMPANIES.items()}
+    seeded = 0
+    for name in sorted(os.listdir(directory)):
+        match = SEED_FILE.match(name)
+        if not match or match["company"] not in by_slug or match["month"] not in MONTHS:
+            continue
+        company_id = by_slug[match["company"]]
+        month = date(int(match["year"]), MONTHS[match["month"]], 1)
+        if is_archived(report, company_id, month):
+            continue
+        df = pd.read_excel(os.path.join(directory, name))
+        write_partition(report, company_id, month, df.to_dict("records"))
+        seeded += 1
+        log.info(f"🌱 {name}: {len(df)} rows archived as {COMPANIES[company_id]} {month:%Y-%m}")
+    return seeded
+
+
+if __name__ == "__main__":
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Backfill the monthly archive of a stock report")
+    parser.add_argument("--report", choices=sorted(REPORTS), default="closing_stock")
+    parser.add_argument("--from", dest="first", type=parse_month, metavar="YYYY-MM")
+    parser.add_argument("--to", dest="last", type=parse_month, metavar="YYYY-MM",
+                        help="last month to archive (default: --from)")
+    parser.add_argument("--company", type=int, nargs="+", choices=sorted(COMPANIES), help="default: all companies")
+    parser.add_argument("--workers", type=int, default=4, help="windows computed at the same time (default 4)")
+    parser.add_argument("--odoo-concurrency", type=int, default=odoo_client.BUDGET.limit,
+                        help="Odoo calls in flight (default: unlimited)")
+    parser.add_argument("--refresh", action="store_true", help="recompute months that are already archived")
+    parser.add_argument("--seed", metavar="DIR", help="first archive the hand-collected monthly xlsx files of DIR")
+    args = parser.parse_args()
+    if not args.first and not args.seed:
+        parser.error("give --from (and --to), --seed, or both")
+
+    if args.seed:
+        log.info(f"🌱 {seed(args.report, args.seed)} file(s) seeded from {args.seed}")
+    failed = []
+    if args.first:
+        odoo_client.BUDGET.limit = args.odoo_concurrency
+        client = OdooClient()
+        client.login()
+        started = time.time()
+        failed = backfill(client, args.report, months_between(args.first, args.last or args.first),
+                          args.company, args.workers, args.refresh)
+        wizards.release_all()
+        log.info(f"🗃️ Backfill done in {time.time() - started:.1f}s, {len(failed)} window(s) failed")
+    sys.exit(1 if failed else 0)
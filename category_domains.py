@@ -0,0 +1,151 @@
+"""Rewrite category-name filters into category-id domains.
+
+``["product_id.categ_id.complete_name", "ilike", "All / RM"]`` makes Odoo join every
+row to ``product_category`` and text-scan ``complete_name`` for each page. The
+product.category tree is small, so it is read once, cached in ``.cache/`` for
+CATEGORY_CACHE_TTL seconds (default 6 hours) and the same match is done locally:
+
+    ["product_id.categ_id.complete_name", "ilike", "All / RM"]  ->  ["product_id.categ_id", "child_of", [12]]
+    ["categ_id", "ilike", "ALL / RM /"]                          ->  ["categ_id", "in", [13, 14, 15]]
+
+``child_of`` is used when the matches are whole subtrees, ``in`` otherwise. If the tree
+cannot be read the domain is sent unchanged. Set CATEGORY_DOMAINS=0 to turn it off.
+"""
+import os
+import sys
+import json
+import time
+import logging
+
+from odoo_client import OdooError
+
+log = logging.getLogger(__name__)
+
+ENABLED = os.getenv("CATEGORY_DOMAINS", "1").strip().lower() not in ("0", "false", "no")
+CACHE_DIR = os.getenv("ODOO_CACHE_DIR", ".cache")
+CACHE_TTL = int(os.getenv("CATEGORY_CACHE_TTL", 6 * 3600))
+
+CATEGORY_MODEL = "product.category"
+NEGATED = {"ilike": False, "not ilike": True}
+
+
+# ===== Category tree =====
+def _cache_path(client):
+    return os.path.join(CACHE_DIR, f"product_category_{client.db or 'odoo'}.json")
+
+
+def _read_tree(client):
+    categories, offset = [], 0
+    while True:
+        result = client.web_search_read(CATEGORY_MODEL, {"complete_name": {}, "parent_id": {}},
+                                        context={"lang": "en_US", "active_test": False}, offset=offset, limit=5000)
+        categories.extend({"id": rec["id"], "complete_name": rec["complete_name"] or "",
+                           "parent_id": rec["parent_id"] or False} for rec in result["records"])
+        offset += len(result["records"])
+        if len(result["records"]) < 5000:
+            return categories
+
+
+def load_categories(client, refresh=False):
+    """Every product.category as ``{"id", "complete_name", "parent_id"}``, from the TTL cache when fresh.
+
+    The in-memory copy expires with the file it came from, so a long-running process
+    (refresh_daemon.py) picks up new categories too.
+    """
+    cached = None if refresh else client.cache.get("categories")
+    if cached and time.time() - cached["fetched_at"] < CACHE_TTL:
+        return cached["categories"]
+    path = _cache_path(client)
+    cached = None
+    if not refresh:
+        try:
+            with open(path) as f:
+                cached = json.load(f)
+            if time.time() - cached["fetched_at"] >= CACHE_TTL:
+                cached = None
+        except (OSError, ValueError, KeyError, TypeError):
+            cached = None
+    if cached is None:
+        cached = {"fetched_at": time.time(), "categories": _read_tree(client)}
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(cached, f)
+        os.replace(tmp, path)
+        log.info(f"🗂️ {len(cached['categories'])} product categories cached in {path}")
+    client.cache["categories"] = cached
+    return cached["categories"]
+
+
+def _subtree(children, root):
+    ids, stack = set(), [root]
+    while stack:
+        node = stack.pop()
+        ids.add(node)
+        stack.extend(children.get(node, ()))
+    return ids
+
+
+def match_categories(categories, pattern):
+    """Ids whose ``complete_name`` contains ``pattern``, case-insensitively (what ``ilike`` does)."""
+    needle = pattern.casefold()
+    return {c["id"] for c in categories if needle in c["complete_name"].casefold()}
+
+
+def _id_leaf(field, ids, negate, categories):
+    parent = {c["id"]: c["parent_id"] for c in categories}
+    children = {}
+    for c in categories:
+        if c["parent_id"]:
+            children.setdefault(c["parent_id"], []).append(c["id"])
+    roots = sorted(i for i in ids if parent.get(i) not in ids)
+    if roots and not negate and set().union(*(_subtree(children, r) for r in roots)) == ids:
+        return [field, "child_of", roots]
+    return [field, "not in" if negate else "in", sorted(ids)]
+
+
+# ===== Domain compiler =====
+def _category_field(path):
+    """The many2one path a category-name leaf filters on, or None for other leaves."""
+    if path.endswith("categ_id.complete_name"):
+        return path.removesuffix(".complete_name")
+    if path == "categ_id" or path.endswith(".categ_id"):
+        # name_search on product.category matches complete_name, its _rec_name
+        return path
+    return None
+
+
+def compile_domain(client, domain):
+    """Return ``domain`` with its category-name leaves replaced by category-id leaves."""
+    if not ENABLED or not domain:
+        return domain
+    leaves = [(i, term) for i, term in enumerate(domain)
+              if isinstance(term, (list, tuple)) and len(term) == 3 and term[1] in NEGATED
+              and isinstance(term[2], str) and "%" not in term[2] and "_" not in term[2]
+              and _category_field(term[0])]
+    if not leaves:
+        return domain
+    try:
+        categories = load_categories(client)
+    except (OdooError, OSError) as e:
+        log.warning(f"⚠️ Category tree unavailable, keeping name filters: {e}")
+        return domain
+    compiled = list(domain)
+    for i, (path, operator, pattern) in leaves:
+        compiled[i] = _id_leaf(_category_field(path), match_categories(categories, pattern),
+                               NEGATED[operator], categories)
+    log.debug(f"🗂️ Compiled {domain} -> {compiled}")
+    return compiled
+
+
+if __name__ == "__main__":
+    # Print what the shared stock filters compile to against the configured Odoo
+    from odoo_client import OdooClient
+    from stock_reports import RM_DOMAIN, SPARE_PARTS_DOMAIN, SPARE_DOMAIN
+
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+    client = OdooClient()
+    client.login()
+    load_categories(client, refresh="--refresh" in sys.argv)
+    for domain in (RM_DOMAIN, SPARE_PARTS_DOMAIN, SPARE_DOMAIN, [["categ_id", "ilike", "ALL / RM /"]]):
+        log.info(f"{domain} -> {compile_domain(client, domain)}")
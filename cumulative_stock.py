@@ -0,0 +1,155 @@
+"""Cumulative opening/closing rows over a long range, built from monthly snapshots.
+
+The consumption scripts report stock movements from a fixed start (2025-04-01) up to
+today, so the server computed a range that grew by a day on every run. Instead the
+range is cut into calendar months:
+
+* closed months are read once and kept in the closed-period cache (period_cache);
+  missing ones are computed by CUMULATIVE_WORKERS threads, each with its own wizard,
+  taking turns on the user's result set (``stock_reports.result_set``);
+* only the current month is computed on every run;
+* the months are chained per lot: the opening of a month must equal the closing of the
+  month before. The cumulative row keeps the first opening and the last closing of
+  the lot, sums its receipts and issues over all months and takes its other columns,
+  the ``rejected`` flag ("Ok" / "Reject") among them, from its latest month.
+
+A lot missing from one of two months' reports cannot be chained. The real monthly
+files have one or two such lots most months, for example a lot that closes with stock
+and has no row in the next month. These lots are logged and kept as reported, which is
+not what a report over the whole range would show for them: their opening is the one of
+the first month they appear in, their closing the one of the last, and the movements of
+the months they are missing from are not in their sums. Fetching the range for them would
+compute the whole range again most runs, so CUMULATIVE_FULL_REFRESH=1 is the way to get
+the server's figures for these lots. If a lot
+present in both months does not chain (a posting back-dated into a cached month), the
+whole range is fetched in one computation as before. Run with CLOSED_PERIOD_REFRESH=1 to
+rebuild the stale snapshots. CUMULATIVE_FULL_REFRESH=1 always fetches the full range.
+"""
+import os
+import logging
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import period_cache
+from stock_reports import (OPENING_CLOSING_SPEC, RM_DOMAIN, create_forecast_wizard, compute_forecast,
+                           fetch_report_rows, result_set)
+
+log = logging.getLogger(__name__)
+
+FULL_REFRESH = os.getenv("CUMULATIVE_FULL_REFRESH", "").strip().lower() in ("1", "true", "yes")
+WORKERS = int(os.getenv("CUMULATIVE_WORKERS", 4))
+TOLERANCE = 0.01
+
+SCOPE = "rm_opening_closing"
+KEY = ("product_id", "lot_id")
+OPENING = ("opening_qty", "opening_value")
+CLOSING = ("cloing_qty", "cloing_value")
+FLOWS = ("receive_qty", "receive_value", "issue_qty", "issue_value")
+
+
+def month_windows(from_date, to_date):
+    """``(from_date, to_date)`` ISO pairs of the calendar months covering the range, clipped to it."""
+    start, end = date.fromisoformat(from_date), date.fromisoformat(to_date)
+    windows = []
+    while start <= end:
+        month_end = (start.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        windows.append((start.isoformat(), min(month_end, end).isoformat()))
+        start = month_end + timedelta(days=1)
+    return windows
+
+
+def fetch_window(client, company_id, cname, from_date, to_date):
+    with result_set(client):
+        wizard_id = create_forecast_wizard(client, company_id, from_date, to_date)
+        compute_forecast(client, company_id, wizard_id)
+        return fetch_report_rows(client, "stock.opening.closing", OPENING_CLOSING_SPEC, RM_DOMAIN, company_id,
+                                 f"{cname} {from_date} → {to_date}", wizard_id=wizard_id)
+
+
+def _add(total, value):
+    """``total + value`` for numbers (empty values count as 0), else ``value``."""
+    numbers = [v for v in (total, value) if v is not None and v is not False]
+    if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in numbers):
+        return sum(numbers)
+    return value
+
+
+def _by_lot(rows):
+    lots = {}
+    for row in rows:
+        key = tuple(row.get(k) for k in KEY)
+        if key in lots:
+            # Several rows of one lot in a month: one row with their sums
+            merged = lots[key]
+            for field in OPENING + CLOSING + FLOWS:
+                merged[field] = _add(merged.get(field), row.get(field))
+        else:
+            lots[key] = dict(row)
+    return lots
+
+
+def reconcile(months):
+    """Lots whose opening differs from their closing of the month before.
+
+    Returns ``[(month, key, field, closing, opening, in_both)]``; ``in_both`` is False for a
+    lot that has no row in one of the two months.
+    """
+    mismatches = []
+    for (_, previous), (month, current) in zip(months, months[1:]):
+        for key in previous.keys() | current.keys():
+            in_both = key in previous and key in current
+            for close_field, open_field in zip(CLOSING, OPENING):
+                closing = (previous.get(key) or {}).get(close_field) or 0
+                opening = (current.get(key) or {}).get(open_field) or 0
+                if abs(closing - opening) > TOLERANCE:
+                    mismatches.append((month, key, open_field, closing, opening, in_both))
+    return mismatches
+
+
+def combine(months):
+    """One cumulative row per lot: first opening, last closing, receipts and issues summed, latest attributes."""
+    cumulative = {}
+    for _, lots in months:
+        for key, row in lots.items():
+            if key not in cumulative:
+                cumulative[key] = dict(row)
+                continue
+            entry = cumulative[key]
+            flows = {field: _add(entry.get(field), row.get(field)) for field in FLOWS}
+            opening = {field: entry.get(field) for field in OPENING}
+            entry.update(row)
+            entry.update(flows)
+            entry.update(opening)
+    return sorted(cumulative.values(), key=lambda row: row["id"])
+
+
+def fetch(client, company_id, cname, from_date, to_date, specification=OPENING_CLOSING_SPEC):
+    """Rows of ``from_date`` → ``to_date`` as one report over the range would give them, projected on ``specification``."""
+    windows = month_windows(from_date, to_date)
+    if FULL_REFRESH or len(windows) == 1:
+        rows = fetch_window(client, company_id, cname, from_date, to_date)
+    else:
+        def read(window):
+            return period_cache.cached(SCOPE, company_id, *window,
+                                       lambda: fetch_window(client, company_id, cname, *window))
+
+        with ThreadPoolExecutor(max_workers=max(1, min(WORKERS, len(windows))), thread_name_prefix="month") as pool:
+            months = [(window[0], _by_lot(rows)) for window, rows in zip(windows, pool.map(read, windows))]
+        mismatches = reconcile(months)
+        gaps = [m for m in mismatches if not m[-1]]
+        breaks = [m for m in mismatches if m[-1]]
+        if gaps:
+            month, key, field, closing, opening, _ = gaps[0]
+            log.warning(f"⚠️ {cname}: {len({m[:2] for m in gaps})} lot(s) missing from one month's report "
+                        f"(e.g. {month} {key}: {field} {opening} vs previous closing {closing}), kept as reported; "
+                        f"their rows can differ from the full range's (CUMULATIVE_FULL_REFRESH=1)")
+        if breaks:
+            month, key, field, closing, opening, _ = breaks[0]
+            log.warning(f"⚠️ {cname}: {len({m[:2] for m in breaks})} lot(s) do not carry over between months "
+                        f"(e.g. {month} {key}: {field} {opening} vs previous closing {closing}), "
+                        f"fetching {from_date} → {to_date} in one go")
+            rows = fetch_window(client, company_id, cname, from_date, to_date)
+        else:
+            rows = combine(months)
+            log.info(f"📚 {cname}: {len(rows)} lots carried over {len(windows)} months")
+    return [{k: v for k, v in row.items() if k == "id" or k in specification} for row in rows]
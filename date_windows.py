@@ -0,0 +1,151 @@
+"""Report date windows, resolved once per run from named policies.
+
+Every script used to work out its own dates, and they disagreed. Some ignored FROM_DATE /
+TO_DATE, some took an empty variable for a date, and some broke on the first days of a
+month. Reports meant to share a window (and therefore a computed wizard, a shared read
+or a closed-period snapshot) could miss each other by a day when a run crossed midnight.
+Now a script asks for a policy:
+
+* ``mtd``: first of the month → today;
+* ``mt_yesterday``: first of yesterday's month → yesterday (the whole previous month on the 1st);
+* ``prev_month``: the previous calendar month;
+* ``prev_month_end``: the last day of the previous month (a one-day window);
+* ``month``: the whole current month;
+* ``since_fiscal_start``: start of the fiscal year (FISCAL_YEAR_START, ``MM-DD``, default
+  ``07-01``) → today;
+* ``since``: a fixed ``start`` → today.
+
+``rollover_days=N`` resolves the policy as if today were the last day of the previous
+month during the first N days of a month. For example, the invoice summaries report the
+whole previous month on the 1st and 2nd.
+
+FROM_DATE / TO_DATE override the bounds when they are set and not empty, for the open-ended
+windows (``mtd``, ``since``) only. The scheduled workflow always exports TO_DATE as today, so
+the fixed windows (previous month, month to yesterday, …) pass ``env=False`` and ignore
+them, as the scripts always did; so do the scripts that build several windows per run.
+The run date is fixed when the first window is resolved. It can be set with
+REPORT_RUN_DATE, which the runner passes to its queue workers. ``new_run`` starts over,
+for example in the refresh daemon before each report. Resolved
+windows are memoised, so every report of a run gets the same dates for the same policy,
+and ``Window.key`` is the part of the cache keys (period_cache, union_fetch) they share.
+"""
+import os
+import logging
+import threading
+from datetime import date, timedelta
+from typing import NamedTuple
+
+log = logging.getLogger(__name__)
+
+RUN_DATE_ENV = "REPORT_RUN_DATE"
+FISCAL_YEAR_START = tuple(int(part) for part in os.getenv("FISCAL_YEAR_START", "07-01").split("-"))
+ONE_DAY = timedelta(days=1)
+
+
+class Window(NamedTuple):
+    from_date: str
+    to_date: str
+
+    @property
+    def key(self):
+        """Cache key part shared by every report computed for this window."""
+        return f"{self.from_date}_{self.to_date}"
+
+
+def _month_start(day):
+    return day.replace(day=1)
+
+
+def _prev_month_end(day):
+    return day.replace(day=1) - ONE_DAY
+
+
+def _month_end(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1) - ONE_DAY
+
+
+def _fiscal_start(day):
+    month, first = FISCAL_YEAR_START
+    start = day.replace(month=month, day=first)
+    return start if start <= day else start.replace(year=day.year - 1)
+
+
+POLICIES = {
+    "mtd": lambda d: (_month_start(d), d),
+    "mt_yesterday": lambda d: (_month_start(d - ONE_DAY), d - ONE_DAY),
+    "prev_month": lambda d: (_month_start(_prev_month_end(d)), _prev_month_end(d)),
+    "prev_month_end": lambda d: (_prev_month_end(d), _prev_month_end(d)),
+    "month": lambda d: (_month_start(d), _month_end(d)),
+    "since_fiscal_start": lambda d: (_fiscal_start(d), d),
+    "since": lambda d: (None, d),
+}
+
+_lock = threading.Lock()
+_run_date = None
+_windows = {}
+
+
+def run_date():
+    """The date every window of this run is resolved against."""
+    global _run_date
+    with _lock:
+        if _run_date is None:
+            env = os.getenv(RUN_DATE_ENV, "").strip()
+            _run_date = _parse(RUN_DATE_ENV, env) if env else date.today()
+        return _run_date
+
+
+def new_run(today=None):
+    """Forget the resolved windows; the next ones are resolved against ``today`` (default: as at start-up)."""
+    global _run_date
+    with _lock:
+        _run_date = today
+        _windows.clear()
+
+
+def _parse(name, value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name}={value!r} is not a YYYY-MM-DD date") from None
+
+
+def _env(name):
+    value = os.getenv(name, "").strip()
+    return _parse(name, value) if value else None
+
+
+def resolve(policy, start=None, rollover_days=0, env=True):
+    """The ``Window`` of ``policy`` for this run, FROM_DATE / TO_DATE applied unless ``env`` is False."""
+    key = (policy, start, rollover_days, env)
+    with _lock:
+        window = _windows.get(key)
+    if window:
+        return window
+    if policy not in POLICIES:
+        raise ValueError(f"unknown date window policy {policy!r}, expected one of {', '.join(POLICIES)}")
+
+    today = run_date()
+    anchor = today if today.day > rollover_days else _prev_month_end(today)
+    from_date, to_date = POLICIES[policy](anchor)
+    if start:
+        from_date = _parse("start", start)
+    if env:
+        from_date, to_date = _env("FROM_DATE") or from_date, _env("TO_DATE") or to_date
+    if from_date is None:
+        raise ValueError(f"policy {policy!r} needs a start date")
+    if from_date > to_date:
+        raise ValueError(f"empty {policy} window: {from_date} → {to_date}")
+
+    window = Window(from_date.isoformat(), to_date.isoformat())
+    with _lock:
+        window = _windows.setdefault(key, window)
+    log.info(f"📅 {policy}: {window.from_date} → {window.to_date}")
+    return window
+
+
+def as_of(policy, rollover_days=0, env=True):
+    """``(from_date, to_date)`` of an as-of report (ageing): the policy's end date, from FROM_DATE or open (False)."""
+    window = resolve(policy, rollover_days=rollover_days, env=env)
+    from_date = env and _env("FROM_DATE")
+    return Window(from_date.isoformat() if from_date else False, window.to_date)
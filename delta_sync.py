@@ -0,0 +1,166 @@
+"""Incremental ``write_date`` sync of catalogue-like reads into a local table.
+
+Raw_materials.py (product.template) and spares_workcenter_df.py (stock.lot) re-read
+every record on each run although very few change. With DELTA_SYNC=1 each
+(scope, company) keeps its rows in ``.cache/delta_<db>.db`` with a high-water mark:
+
+* records whose ``write_date`` is past the mark (or whose ``depends`` paths are, e.g.
+  the stock.quant rows behind a computed on-hand quantity) are re-read and upserted;
+* the ids still matching the domain are listed with ``search``: local rows not in that
+  list (deleted, or no longer matching) are dropped and ids not held yet are read;
+* a full read replaces the table on the first run, when the specification or domain
+  changes, and every DELTA_FULL_SYNC_HOURS (default 24) as a safety net.
+
+The rows come back in the server's default order, as the one-shot read returns them: the
+order of the full read, or of the ``search`` ids on a delta run.
+
+A ``depends`` record that is deleted leaves nothing with a newer ``write_date`` behind. A
+stock.quant merged or removed between two runs therefore does not mark its product or lot
+as changed, and that row keeps the old computed quantity until the next full sync.
+
+The mark trails the sync start by DELTA_OVERLAP_SECONDS (default 300) to absorb clock
+skew with the server; re-reading a record twice is harmless.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import page_tuner
+
+log = logging.getLogger(__name__)
+
+ENABLED = os.getenv("DELTA_SYNC", "").strip().lower() in ("1", "true", "yes")
+CACHE_DIR = os.getenv("ODOO_CACHE_DIR", ".cache")
+FULL_SYNC_HOURS = float(os.getenv("DELTA_FULL_SYNC_HOURS", 24))
+OVERLAP_SECONDS = int(os.getenv("DELTA_OVERLAP_SECONDS", 300))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (
+    scope TEXT NOT NULL,
+    company_id INTEGER NOT NULL,
+    id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (scope, company_id, id)
+);
+CREATE TABLE IF NOT EXISTS marks (
+    scope TEXT NOT NULL,
+    company_id INTEGER NOT NULL,
+    signature TEXT NOT NULL,
+    write_date TEXT NOT NULL,
+    full_sync_at REAL NOT NULL,
+    PRIMARY KEY (scope, company_id)
+);
+"""
+
+
+def _odoo_datetime(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class DeltaStore:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self.db.executescript(SCHEMA)
+
+    @property
+    def db(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def _read_all(self, client, model, specification, domain, context):
+        return page_tuner.read_all(client, model, specification, domain, context)
+
+    def sync(self, client, scope, model, specification, domain, context, company_id, depends=()):
+        """Bring the local copy of ``model``/``domain`` up to date and return all its records, in server order."""
+        started = time.time()
+        signature = hashlib.sha1(json.dumps([model, specification, domain, list(depends)],
+                                            sort_keys=True).encode()).hexdigest()
+        mark = self.db.execute("SELECT signature, write_date, full_sync_at FROM marks "
+                               "WHERE scope = ? AND company_id = ?", (scope, company_id)).fetchone()
+        full = (mark is None or mark[0] != signature or started - mark[2] > FULL_SYNC_HOURS * 3600)
+        new_mark = _odoo_datetime(started - OVERLAP_SECONDS)
+
+        if full:
+            records = self._read_all(client, model, specification, domain, context)
+            order = [rec["id"] for rec in records]
+            with self._transaction():
+                self.db.execute("DELETE FROM rows WHERE scope = ? AND company_id = ?", (scope, company_id))
+                self._upsert(scope, company_id, records)
+                self._set_mark(scope, company_id, signature, new_mark, started)
+            log.info(f"🔄 {scope}[{company_id}]: full sync, {len(records)} rows in {time.time() - started:.1f}s")
+        else:
+            since = mark[1]
+            changed_domain = (["|"] * len(depends) + [["write_date", ">", since]]
+                              + [[path, ">", since] for path in depends])
+            changed = self._read_all(client, model, specification, list(domain) + changed_domain, context)
+            # search returns the ids in the model's default order
+            order = client.call_kw(model, "search", [domain], {"context": context})
+            live = set(order)
+            local = {row[0] for row in self.db.execute("SELECT id FROM rows WHERE scope = ? AND company_id = ?",
+                                                        (scope, company_id))}
+            # Records that started matching the domain without being written themselves
+            entered = sorted(live - local - {rec["id"] for rec in changed})
+            if entered:
+                changed += self._read_all(client, model, specification, [["id", "in", entered]], context)
+            gone = local - live
+            with self._transaction():
+                self._upsert(scope, company_id, changed)
+                self.db.executemany("DELETE FROM rows WHERE scope = ? AND company_id = ? AND id = ?",
+                                    [(scope, company_id, i) for i in gone])
+                self._set_mark(scope, company_id, signature, new_mark, mark[2])
+            log.info(f"🔄 {scope}[{company_id}]: {len(changed)} changed, {len(gone)} removed since {since} "
+                     f"in {time.time() - started:.1f}s")
+
+        rows = {row[0]: row[1] for row in self.db.execute(
+            "SELECT id, data FROM rows WHERE scope = ? AND company_id = ?", (scope, company_id))}
+        return [json.loads(rows[i]) for i in order if i in rows]
+
+    def _upsert(self, scope, company_id, records):
+        self.db.executemany("INSERT OR REPLACE INTO rows (scope, company_id, id, data) VALUES (?, ?, ?, ?)",
+                            [(scope, company_id, rec["id"], json.dumps(rec)) for rec in records])
+
+    def _set_mark(self, scope, company_id, signature, write_date, full_sync_at):
+        self.db.execute("INSERT OR REPLACE INTO marks (scope, company_id, signature, write_date, full_sync_at) "
+                        "VALUES (?, ?, ?, ?, ?)", (scope, company_id, signature, write_date, full_sync_at))
+
+
+_stores = {}
+_lock = threading.Lock()
+
+
+def get_store(client):
+    path = os.path.join(CACHE_DIR, f"delta_{client.db or 'odoo'}.db")
+    with _lock:
+        if path not in _stores:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            _stores[path] = DeltaStore(path)
+        return _stores[path]
+
+
+def fetch(client, scope, model, specification, domain, context, company_id, depends=()):
+    """Records of ``model`` matching ``domain``: a one-shot read, or the delta-synced local copy with DELTA_SYNC=1."""
+    if not ENABLED:
+        return page_tuner.read_all(client, model, specification, domain, context, label=scope)
+    return get_store(client).sync(client, scope, model, specification, domain, context, company_id, depends)
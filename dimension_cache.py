@@ -0,0 +1,172 @@
+"""Local cache of relational display names (products, partners, categories, UoMs, lots, ...).
+
+The report specifications ask Odoo to expand ``{"fields": {"display_name": {}}}`` on
+every many2one of every row, so the server resolves the same few thousand names on
+each read. With DIMENSION_CACHE=1 those fields are requested as bare ids and the
+names come from a SQLite table in ``.cache/``:
+
+* ids not cached yet are read in bulk, once;
+* every DIMENSION_REFRESH_SECONDS (default 900) a model is re-synced with
+  ``write_date >= last seen write_date``, so renamed records are picked up.
+
+Records are rebuilt as ``{"id": ..., "display_name": ...}`` so ``flatten_record`` and
+everything after it see the usual shape.
+"""
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+ENABLED = os.getenv("DIMENSION_CACHE", "").strip().lower() in ("1", "true", "yes")
+CACHE_DIR = os.getenv("ODOO_CACHE_DIR", ".cache")
+REFRESH_SECONDS = int(os.getenv("DIMENSION_REFRESH_SECONDS", 900))
+READ_BATCH = 1000
+
+NAME_ONLY = {"fields": {"display_name": {}}}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS names (
+    model TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    display_name TEXT,
+    write_date TEXT,
+    PRIMARY KEY (model, id)
+);
+CREATE TABLE IF NOT EXISTS marks (
+    model TEXT PRIMARY KEY,
+    write_date TEXT,
+    checked_at REAL
+);
+"""
+
+
+class DimensionCache:
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self.db.executescript(SCHEMA)
+
+    @property
+    def db(self):
+        # One connection per thread, as in work_queue
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _store(self, model, records):
+        self.db.executemany(
+            "INSERT INTO names (model, id, display_name, write_date) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (model, id) DO UPDATE SET display_name = excluded.display_name, write_date = excluded.write_date",
+            [(model, rec["id"], rec.get("display_name") or "", rec.get("write_date") or None) for rec in records],
+        )
+
+    # ===== Sync =====
+    def refresh(self, client, model, context):
+        """Pull the names changed since the last sync of ``model``, at most every REFRESH_SECONDS."""
+        row = self.db.execute("SELECT write_date, checked_at FROM marks WHERE model = ?", (model,)).fetchone()
+        if row and time.time() - row[1] < REFRESH_SECONDS:
+            return
+        mark = row[0] if row else None
+        if mark is None:
+            # Nothing cached yet: the first resolve reads what it needs
+            mark = self.db.execute("SELECT MAX(write_date) FROM names WHERE model = ?", (model,)).fetchone()[0]
+        changed = 0
+        if mark:
+            offset = 0
+            while True:
+                result = client.web_search_read(model, {"display_name": {}, "write_date": {}},
+                                                domain=[["write_date", ">=", mark]], context=context,
+                                                offset=offset, limit=READ_BATCH)
+                self._store(model, result["records"])
+                changed += len(result["records"])
+                offset += len(result["records"])
+                if len(result["records"]) < READ_BATCH:
+                    break
+        latest = self.db.execute("SELECT MAX(write_date) FROM names WHERE model = ?", (model,)).fetchone()[0]
+        self.db.execute("INSERT OR REPLACE INTO marks (model, write_date, checked_at) VALUES (?, ?, ?)",
+                        (model, latest, time.time()))
+        if changed:
+            log.info(f"🔁 {model}: {changed} cached name(s) refreshed since {mark}")
+
+    def resolve(self, client, model, ids, context):
+        """``{id: display_name}`` for ``ids``, reading only the ones not cached yet."""
+        self.refresh(client, model, context)
+        names = {}
+        wanted = sorted(ids)
+        for i in range(0, len(wanted), 500):
+            chunk = wanted[i:i + 500]
+            names.update(self.db.execute(
+                f"SELECT id, display_name FROM names WHERE model = ? AND id IN ({','.join('?' * len(chunk))})",
+                [model, *chunk]).fetchall())
+        missing = [i for i in wanted if i not in names]
+        for i in range(0, len(missing), READ_BATCH):
+            result = client.web_search_read(model, {"display_name": {}, "write_date": {}},
+                                            domain=[["id", "in", missing[i:i + READ_BATCH]]], context=context,
+                                            limit=READ_BATCH)
+            self._store(model, result["records"])
+            names.update((rec["id"], rec["display_name"]) for rec in result["records"])
+        if missing:
+            log.info(f"🗃️ {model}: {len(missing)} new name(s) cached")
+        return names
+
+
+_caches = {}
+_lock = threading.Lock()
+
+
+def get_cache(client):
+    path = os.path.join(CACHE_DIR, f"dimensions_{client.db or 'odoo'}.db")
+    with _lock:
+        if path not in _caches:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            _caches[path] = DimensionCache(path)
+        return _caches[path]
+
+
+def relations(client, model, specification):
+    """``{field: comodel}`` for the many2one fields of ``specification`` that only ask for a name."""
+    key = ("relations", model)
+    if key not in client.cache:
+        client.cache[key] = {}
+    known = client.cache[key]
+    unknown = [f for f, spec in specification.items() if spec == NAME_ONLY and f not in known]
+    if unknown:
+        fields = client.call_kw(model, "fields_get", [], {"allfields": unknown, "attributes": ["type", "relation"]})
+        for field in unknown:
+            info = fields.get(field, {})
+            known[field] = info.get("relation") if info.get("type") == "many2one" else None
+    return {f: known[f] for f, spec in specification.items() if spec == NAME_ONLY and known.get(f)}
+
+
+# ===== Fetch =====
+def web_search_read(client, model, specification, domain=None, context=None, offset=0, limit=5000,
+                    count_limit=10000):
+    """Drop-in for ``client.web_search_read`` that resolves many2one names locally when enabled."""
+    if not ENABLED:
+        return client.web_search_read(model, specification, domain=domain, context=context, offset=offset,
+                                      limit=limit, count_limit=count_limit)
+    m2o = relations(client, model, specification)
+    slim = {f: ({} if f in m2o else spec) for f, spec in specification.items()}
+    result = client.web_search_read(model, slim, domain=domain, context=context, offset=offset,
+                                    limit=limit, count_limit=count_limit)
+    records = result["records"]
+
+    cache = get_cache(client)
+    read_context = {**(context or {}), "active_test": False}
+    by_model = {}
+    for field, comodel in m2o.items():
+        by_model.setdefault(comodel, set()).update(rec[field] for rec in records if rec.get(field))
+    names = {comodel: cache.resolve(client, comodel, ids, read_context) for comodel, ids in by_model.items() if ids}
+
+    for rec in records:
+        for field, comodel in m2o.items():
+            value = rec.get(field)
+            if value:
+                rec[field] = {"id": value, "display_name": names[comodel].get(value, "")}
+    return result
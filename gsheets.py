@@ -0,0 +1,117 @@
+"""Google Sheets helpers shared by the report scripts."""
+import os
+import logging
+import threading
+
+import gspread
+from gspread.utils import a1_range_to_grid_range
+from google.oauth2 import service_account
+
+log = logging.getLogger(__name__)
+
+SCOPE = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
+CREDS_FILE = "gcreds.json"
+STAGING_SUFFIX = "__staging"
+
+# Set GSHEETS_DRY_RUN=1 to log sheet writes instead of sending them (local runs against mock_odoo.py)
+DRY_RUN = os.getenv("GSHEETS_DRY_RUN", "").strip().lower() in ("1", "true", "yes")
+
+_client = None
+_lock = threading.Lock()
+
+
+class DryRunWorksheet:
+    """Stands in for a ``gspread.Worksheet`` and only logs what would have been written."""
+
+    def __init__(self, sheet_key, title):
+        self.sheet_key = sheet_key
+        self.title = title
+        self.row_count = 1000
+        self.col_count = 26
+
+    def resize(self, rows=None, cols=None):
+        self.row_count = rows or self.row_count
+        self.col_count = cols or self.col_count
+
+    def update_cells(self, cells, **kwargs):
+        log.info(f"📝 [dry-run] {self.title}: {len(cells)} cells")
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            log.info(f"📝 [dry-run] {self.title}.{name}()")
+        return call
+
+
+def get_client():
+    """Return one authorized gspread client per process instead of re-authorizing for every paste."""
+    global _client
+    with _lock:
+        if _client is None:
+            creds = service_account.Credentials.from_service_account_file(CREDS_FILE, scopes=SCOPE)
+            _client = gspread.authorize(creds)
+        return _client
+
+
+def get_worksheet(sheet_key, worksheet_name, create=False):
+    """Open a worksheet by title; with ``create=True`` a missing tab is added instead of raising."""
+    if DRY_RUN:
+        return DryRunWorksheet(sheet_key, worksheet_name)
+    spreadsheet = get_client().open_by_key(sheet_key)
+    try:
+        return spreadsheet.worksheet(worksheet_name)
+    except gspread.WorksheetNotFound:
+        if not create:
+            raise
+        log.info(f"➕ Adding worksheet {worksheet_name}")
+        return spreadsheet.add_worksheet(title=worksheet_name, rows=1000, cols=26)
+
+
+# ===== Staged writes =====
+def staging_worksheet(worksheet):
+    """A fresh hidden tab next to ``worksheet`` to write into; ``publish_staged`` moves its values over."""
+    title = f"{worksheet.title}{STAGING_SUFFIX}"
+    if DRY_RUN:
+        return DryRunWorksheet(worksheet.sheet_key, title)
+    spreadsheet = worksheet.spreadsheet
+    try:
+        # Left over by a run that was killed before it could clean up
+        spreadsheet.del_worksheet(spreadsheet.worksheet(title))
+    except gspread.WorksheetNotFound:
+        pass
+    staging = spreadsheet.add_worksheet(title=title, rows=worksheet.row_count, cols=worksheet.col_count)
+    staging.hide()
+    return staging
+
+
+def publish_staged(staging, worksheet, rows, cols, clear_range=None):
+    """Replace ``clear_range`` of ``worksheet`` with the first ``rows`` x ``cols`` of ``staging`` and drop ``staging``.
+
+    Sent as one batch update, which the Sheets API applies entirely or not at all.
+    """
+    if DRY_RUN:
+        log.info(f"📝 [dry-run] {staging.title} → {worksheet.title}: {rows} x {cols} cells")
+        return
+    copied = {"startRowIndex": 0, "endRowIndex": rows, "startColumnIndex": 0, "endColumnIndex": cols}
+    requests = [{"updateSheetProperties": {
+        "properties": {"sheetId": worksheet.id, "gridProperties": {"rowCount": max(rows, worksheet.row_count),
+                                                                   "columnCount": max(cols, worksheet.col_count)}},
+        "fields": "gridProperties(rowCount,columnCount)"}}]
+    if clear_range:
+        requests.append({"updateCells": {"range": a1_range_to_grid_range(clear_range, worksheet.id),
+                                         "fields": "userEnteredValue"}})
+    requests += [
+        {"copyPaste": {"source": {"sheetId": staging.id, **copied}, "destination": {"sheetId": worksheet.id, **copied},
+                       "pasteType": "PASTE_VALUES"}},
+        {"deleteSheet": {"sheetId": staging.id}},
+    ]
+    worksheet.spreadsheet.batch_update({"requests": requests})
+
+
+def discard_staged(staging):
+    if DRY_RUN:
+        log.info(f"📝 [dry-run] {staging.title} discarded")
+        return
+    try:
+        staging.spreadsheet.del_worksheet(staging)
+    except Exception as e:
+        log.warning(f"⚠️ Could not delete {staging.title}: {e}")
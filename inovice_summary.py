@@ -1,56 +1,33 @@
-import requests
 import json
-import re
 import logging
 import sys
 import os
-from datetime import date, datetime, timedelta
-import gspread
+from datetime import datetime
+from functools import partial
 from gspread_dataframe import set_with_dataframe
-from google.oauth2 import service_account
-import pandas as pd
 import pytz
-from dotenv import load_dotenv
 from pathlib import Path
 import time
-load_dotenv()
+
+import date_windows
+import gsheets
+import report_download
+import transform_pool
+import wizards
+from odoo_client import OdooClient
+
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 log = logging.getLogger()
 
 # ========= CONFIG ==========
-ODOO_URL = os.getenv("ODOO_URL")
-DB = os.getenv("ODOO_DB")
-USERNAME = os.getenv("ODOO_USERNAME")
-PASSWORD = os.getenv("ODOO_PASSWORD")
-
 MODEL = "mrp.report.custom"
 REPORT_BUTTON_METHOD = "action_generate_xlsx_report"
 REPORT_TYPE = "invs"
 
-# Default date range: first-to-last of current month
-today = date.today()
-from_date_env = os.getenv("FROM_DATE", "").strip()
-to_date_env = os.getenv("TO_DATE", "").strip()
-
-# Calculate the first day of the current month
-first_day_this_month = today.replace(day=1)
-
-if today.day in (1, 2):
-    # Get last day of previous month
-    last_day_prev_month = first_day_this_month - timedelta(days=1)
-    from_date = last_day_prev_month.replace(day=1)  # 1st of previous month
-    to_date = last_day_prev_month                   # last day of previous month
-else:
-    from_date = first_day_this_month
-    to_date = today
-
-FROM_DATE = from_date.isoformat()
-TO_DATE = to_date.isoformat()
-
-print("FROM_DATE:", FROM_DATE)
-print("TO_DATE:", TO_DATE)
-
-log.info(f"Using FROM_DATE={FROM_DATE}, TO_DATE={TO_DATE}")
+# Default date range: current month to date
+def resolve_window():
+    # The whole previous month on the 1st and 2nd
+    return date_windows.resolve("mtd", rollover_days=2)
 
 COMPANIES = {
     1: "Zipper",
@@ -60,113 +37,45 @@ COMPANIES = {
 download_dir = "./downloads"
 os.makedirs(download_dir, exist_ok=True)
 
-# ========= START SESSION ==========
-session = requests.Session()
-session.headers.update({"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"})
-
-# ----------------------
-# Step 1: Login
-login_url = f"{ODOO_URL}/web/session/authenticate"
-login_payload = {
-    "jsonrpc": "2.0",
-    "params": {
-        "db": DB,
-        "login": USERNAME,
-        "password": PASSWORD
-    }
-}
-resp = session.post(login_url, json=login_payload)
-resp.raise_for_status()
-uid = resp.json().get("result", {}).get("uid")
-print("✅ Logged in, UID =", uid)
-
-# ----------------------
-def refresh_csrf():
-    resp = session.get(f"{ODOO_URL}/web")
-    match = re.search(r'var odoo = {\s*csrf_token: "([A-Za-z0-9]+)"', resp.text)
-    return match.group(1) if match else None
-
-# ----------------------
-# Google Sheets setup
-scope = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
-creds = service_account.Credentials.from_service_account_file('gcreds.json', scopes=scope)
-client = gspread.authorize(creds)
 local_tz = pytz.timezone('Asia/Dhaka')
 
 # ----------------------
-# Main loop for companies
-for company_id, cname in COMPANIES.items():
+def trigger(client, company_id, cname, FROM_DATE, TO_DATE):
+    """Start the report of one company on the server; returns its pending download."""
     print(f"\n🔹 Processing company: {cname} (ID={company_id})")
-
-    # Create wizard
-    create_url = f"{ODOO_URL}/web/dataset/call_kw/{MODEL}/create"
-    create_payload = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": MODEL,
-            "method": "create",
-            "args": [{}],
-            "kwargs": {"context": {"uid": uid}}
-        }
-    }
-    resp = session.post(create_url, json=create_payload)
-    resp.raise_for_status()
-    wizard_id = resp.json().get("result")
-    print("✅ Wizard created, ID =", wizard_id)
-
-    # Save wizard
-    save_url = f"{ODOO_URL}/web/dataset/call_kw/{MODEL}/web_save"
-    save_payload = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": MODEL,
-            "method": "web_save",
-            "args": [[], {"report_type": REPORT_TYPE, "date_from": FROM_DATE, "date_to": TO_DATE}],
-            "kwargs": {
-                "context": {
-                    "lang": "en_US",
-                    "tz": "Asia/Dhaka",
-                    "uid": uid,
-                    "allowed_company_ids": [company_id]
-                },
-                "specification": {"report_type": {}, "date_from": {}, "date_to": {}}
-            }
-        }
-    }
-    resp = session.post(save_url, json=save_payload)
-    resp.raise_for_status()
-    wizard_id = resp.json().get("result", [{}])[0].get("id")
+    uid = client.uid
+
+    # Create (or reuse) the wizard with all its values in one call
+    wizard_id = wizards.save(
+        client, MODEL, company_id,
+        {"report_type": REPORT_TYPE, "date_from": FROM_DATE, "date_to": TO_DATE},
+        {
+            "lang": "en_US",
+            "tz": "Asia/Dhaka",
+            "uid": uid,
+            "allowed_company_ids": [company_id]
+        },
+        specification={"report_type": {}, "date_from": {}, "date_to": {}},
+        kind=REPORT_TYPE,
+    )
     print("✅ Wizard saved, ID =", wizard_id)
 
     # Call report button
-    button_url = f"{ODOO_URL}/web/dataset/call_button"
-    button_payload = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": MODEL,
-            "method": REPORT_BUTTON_METHOD,
-            "args": [[wizard_id]],
-            "kwargs": {
-                "context": {
-                    "lang": "en_US",
-                    "tz": "Asia/Dhaka",
-                    "uid": uid,
-                    "allowed_company_ids": [company_id]
-                }
+    triggered_at = time.time()
+    report_info = client.call_button(
+        MODEL, REPORT_BUTTON_METHOD, [[wizard_id]],
+        {
+            "context": {
+                "lang": "en_US",
+                "tz": "Asia/Dhaka",
+                "uid": uid,
+                "allowed_company_ids": [company_id]
             }
-        }
-    }
-    resp = session.post(button_url, json=button_payload)
-    resp.raise_for_status()
-    report_info = resp.json().get("result")
+        },
+    )
     print("✅ Report info received for", cname)
 
-    csrf_token = refresh_csrf()
-    if company_id == 1:  # Zipper
-        time.sleep(10)
+    csrf_token = client.fetch_csrf_token()
 
     options = {"date_from": FROM_DATE, "date_to": TO_DATE, "company_id": company_id}
     context = {
@@ -181,55 +90,57 @@ for company_id, cname in COMPANIES.items():
 
     REPORT_TEMPLATE = report_info.get("report_name") or "taps_manufacturing.pi_xls_template"
     report_path = f"/report/xlsx/{REPORT_TEMPLATE}?options={json.dumps(options)}&context={json.dumps(context)}"
-    download_payload = {
-        "data": json.dumps([report_path, "xlsx"]),
-        "context": json.dumps(context),
-        "token": "dummy-because-api-expects-one",
-        "csrf_token": csrf_token
-    }
+    return report_download.PendingReport(client, report_path, context, csrf_token, f"{REPORT_TYPE}/{cname}",
+                                         partial(paste, company_id, cname, FROM_DATE, TO_DATE),
+                                         triggered_at=triggered_at)
+
+
+def paste(company_id, cname, FROM_DATE, TO_DATE, content):
+    filename = Path(download_dir) / f"{cname.replace(' ', '_')}_{REPORT_TYPE}_{FROM_DATE}_to_{TO_DATE}.xlsx"
+    with open(filename, "wb") as f:
+        f.write(content)
+    print(f"✅ Report downloaded for {cname}: {filename}")
+
+    # === Load file and paste to Google Sheets ===
+    df_sheet1 = transform_pool.read_excel(filename, fillna="")
+
+    if company_id == 1:  # Zipper Sheets
+        sheet1 = gsheets.get_worksheet("1acV7UrmC8ogC54byMrKRTaD9i1b1Cf9QZ-H1qHU5ZZc", "Production Data")
+    else:  # Metal Trims Sheets
+        sheet1 = gsheets.get_worksheet("1acV7UrmC8ogC54byMrKRTaD9i1b1Cf9QZ-H1qHU5ZZc", "MT_Production_QTY")
+
+    for df, ws in zip([df_sheet1], [sheet1]):
+        if df.empty:
+            print("Skip: DataFrame empty, not pasting to sheet.")
+        else:
+            ws.batch_clear(["A:AB"])
+            set_with_dataframe(ws, df)
+            timestamp = datetime.now(local_tz).strftime("%Y-%m-%d %H:%M:%S")
+            ws.update("AC2", [[timestamp]])
+            print(f"Data pasted to {ws.title} with timestamp {timestamp}")
+
+
+# ----------------------
+# Trigger every company first, the server builds the reports while we wait
+def trigger_all(client, company_ids=None):
+    FROM_DATE, TO_DATE = resolve_window()
+    print("FROM_DATE:", FROM_DATE)
+    print("TO_DATE:", TO_DATE)
+
+    log.info(f"Using FROM_DATE={FROM_DATE}, TO_DATE={TO_DATE}")
+
+    return [trigger(client, company_id, cname, FROM_DATE, TO_DATE)
+            for company_id, cname in COMPANIES.items()
+            if not company_ids or company_id in company_ids]
+
+
+def run(client, company_ids=None):
+    handled = report_download.collect(trigger_all(client, company_ids))
+    return [report.label for report in handled if report.error is not None]
+
 
-    download_url = f"{ODOO_URL}/report/download"
-    headers = {"X-CSRF-Token": csrf_token, "Referer": f"{ODOO_URL}/web"}
-    
-    success = False
-
-    for attempt in range(1, 2):  # max 10 tries per company
-        try:
-            print(f"Attempt {attempt}/10 downloading report for {cname}...")
-            resp = session.post(download_url, data=download_payload, headers=headers, timeout=60)
-            if resp.status_code == 200 and "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet" in resp.headers.get("content-type", ""):
-                filename = Path(download_dir) / f"{cname.replace(' ', '_')}_{REPORT_TYPE}_{FROM_DATE}_to_{TO_DATE}.xlsx"
-                with open(filename, "wb") as f:
-                    f.write(resp.content)
-                print(f"✅ Report downloaded for {cname}: {filename}")
-
-                # === Load file and paste to Google Sheets ===
-                df_sheet1 = pd.read_excel(filename)
-                
-                if company_id == 1:  # Zipper Sheets
-                    sheet1 = client.open_by_key("1acV7UrmC8ogC54byMrKRTaD9i1b1Cf9QZ-H1qHU5ZZc").worksheet("Production Data")
-                else:  # Metal Trims Sheets
-                    sheet1 = client.open_by_key("1acV7UrmC8ogC54byMrKRTaD9i1b1Cf9QZ-H1qHU5ZZc").worksheet("MT_Production_QTY")
-
-                for df, ws in zip([df_sheet1], [sheet1]):
-                    if df.empty:
-                        print("Skip: DataFrame empty, not pasting to sheet.")
-                    else:
-                        df = df.fillna("")
-                        ws.batch_clear(["A:AB"])
-                        set_with_dataframe(ws, df)
-                        timestamp = datetime.now(local_tz).strftime("%Y-%m-%d %H:%M:%S")
-                        ws.update("AC2", [[timestamp]])
-                        print(f"Data pasted to {ws.title} with timestamp {timestamp}")
-
-                success = True
-                break  # stop retry loop since download succeeded
-            else:
-                print(f"❌ Failed to download report for {cname}, status={resp.status_code}")
-        except Exception as e:
-            print(f"❌ Exception during download/paste for {cname}: {e}")
-
-        time.sleep(20)  # wait before retry
-
-    if not success:
-        print(f"❌ Giving up after 10 attempts for {cname}")
+if __name__ == "__main__":
+    client = OdooClient()
+    client.login()
+    print("✅ Logged in, UID =", client.uid)
+    run(client)
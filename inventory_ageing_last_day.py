@@ -1,50 +1,29 @@
-import requests
-import json
-import re
 import logging
 import sys
-import os
-from datetime import date, datetime,timedelta
-import gspread
+from datetime import datetime
 from gspread_dataframe import set_with_dataframe
-from google.oauth2 import service_account
 import pandas as pd
 import pytz
-from dotenv import load_dotenv
 import time
 
-load_dotenv()
+import ageing_engine
+import date_windows
+import gsheets
+import transform_pool
+from odoo_client import OdooClient, OdooError
+from stock_reports import RM_DOMAIN, save_forecast_wizard, fetch_report_rows, result_set
+
 logging.basicConfig(stream=sys.stdout, level=logging.INFO)
 log = logging.getLogger()
 
-# ========= CONFIG ==========
-ODOO_URL = os.getenv("ODOO_URL")
-DB = os.getenv("ODOO_DB")
-USERNAME = os.getenv("ODOO_USERNAME")
-PASSWORD = os.getenv("ODOO_PASSWORD")
-
 COMPANIES = {
     1: "Zipper",
     3: "Metal Trims",
 }
 
-today = date.today()
-
 # ========= GITHUB ENV ==========
-FROM_DATE = os.getenv("FROM_DATE")  # from GitHub Actions
-TO_DATE = os.getenv("TO_DATE")      # from GitHub Actions
-
-# Always set TO_DATE as yesterday, ignoring env if set
-yesterday = today - timedelta(days=1)
-TO_DATE = yesterday.isoformat()
-
-if not FROM_DATE:
-    FROM_DATE = False  # keep False if wizard supports it
-
-print("To date: ",TO_DATE)
-
-session = requests.Session()
-USER_ID = None
+def resolve_window():
+    return date_windows.as_of("mt_yesterday", env=False)
 
 # ========= LABEL MAPPING ==========
 LABELS = {
@@ -70,179 +49,78 @@ LABELS = {
     "company_id": "Company",
 }
 
-# ========= LOGIN ==========
-def login():
-    global USER_ID
-    payload = {"jsonrpc": "2.0", "params": {"db": DB, "login": USERNAME, "password": PASSWORD}}
-    r = session.post(f"{ODOO_URL}/web/session/authenticate", json=payload)
-    r.raise_for_status()
-    result = r.json().get("result")
-    if result and "uid" in result:
-        USER_ID = result["uid"]
-        print(f"✅ Logged in (uid={USER_ID})")
-        return result
-    else:
-        raise Exception("❌ Login failed")
-
-# ========= SWITCH COMPANY ==========
-def switch_company(company_id):
-    if USER_ID is None:
-        raise Exception("User not logged in yet")
-    payload = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": "res.users",
-            "method": "write",
-            "args": [[USER_ID], {"company_id": company_id}],
-            "kwargs": {"context": {"allowed_company_ids": [company_id], "company_id": company_id}},
-        },
-    }
-    r = session.post(f"{ODOO_URL}/web/dataset/call_kw", json=payload)
-    r.raise_for_status()
-    if "error" in r.json():
-        print(f"❌ Failed to switch to company {company_id}: {r.json()['error']}")
-        return False
-    else:
-        print(f"🔄 Session switched to company {company_id}")
-        return True
-
 # ========= CREATE AGEING WIZARD ==========
-def create_ageing_wizard(company_id, from_date, to_date):
-    payload = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": "stock.forecast.report",
-            "method": "web_save",
-            "args": [[], {
-                "report_type": "ageing",
-                "report_for": "rm",
-                "all_iteam_list": [],
-                "from_date": from_date,
-                "to_date": to_date
-            }],
-            "kwargs": {
-                "context": {"lang": "en_US", "tz": "Asia/Dhaka", "uid": USER_ID,
-                            "allowed_company_ids": [company_id], "company_id": company_id},
-                "specification": {
-                    "report_type": {},
-                    "report_for": {},
-                    "all_iteam_list": {"fields": {"display_name": {}}},
-                    "from_date": {},
-                    "to_date": {},
-                },
-            },
-        },
-    }
-    r = session.post(f"{ODOO_URL}/web/dataset/call_kw/stock.forecast.report/web_save", json=payload)
-    r.raise_for_status()
-    result = r.json().get("result", [])
-    if isinstance(result, list) and result:
-        wiz_id = result[0]["id"]
-        print(f"🪄 Ageing wizard {wiz_id} created for company {company_id}")
-        return wiz_id
-    else:
-        raise Exception(f"❌ Failed to create ageing wizard: {r.text}")
+def create_ageing_wizard(client, company_id, from_date, to_date):
+    return save_forecast_wizard(client, company_id, "ageing", "rm", from_date, to_date)
 
 # ========= COMPUTE AGEING ==========
-def compute_ageing(company_id, wizard_id):
-    payload = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": "stock.forecast.report",
-            "method": "print_date_wise_stock_register",
-            "args": [[wizard_id]],
-            "kwargs": {"context": {"lang": "en_US", "tz": "Asia/Dhaka",
-                                   "uid": USER_ID,
-                                   "allowed_company_ids": [company_id],
-                                   "company_id": company_id}},
-        },
-    }
-    r = session.post(f"{ODOO_URL}/web/dataset/call_button", json=payload)
-    r.raise_for_status()
-    result = r.json()
-    if "error" in result:
-        print(f"❌ Error computing ageing for {company_id}: {result['error']}")
-    else:
-        print(f"⚡ Ageing computed for wizard {wizard_id} (company {company_id})")
+def compute_ageing(client, company_id, wizard_id):
+    try:
+        result = client.call_button("stock.forecast.report", "print_date_wise_stock_register",
+                                    [[wizard_id]], {"context": client.context(company_id)})
+    except OdooError as e:
+        print(f"❌ Error computing ageing for {company_id}: {e.error}")
+        return {"error": e.error}
+    print(f"⚡ Ageing computed for wizard {wizard_id} (company {company_id})")
     return result
 
 # ========= FETCH AGEING REPORT ==========
-def fetch_ageing(company_id, cname, wizard_id):
-    context = {"allowed_company_ids": [company_id], "company_id": company_id,
-               "active_model": "stock.forecast.report", "active_id": wizard_id, "active_ids": [wizard_id]}
-    payload = {
-        "jsonrpc": "2.0",
-        "method": "call",
-        "params": {
-            "model": "stock.ageing",
-            "method": "web_search_read",
-            "args": [],
-            "kwargs": {
-                "specification": {k: ({"fields": {"display_name": {}}} if k.endswith("_id") or k.endswith("_category") else {}) for k in LABELS.keys()},
-                "offset": 0,
-                "limit": 5000,
-                "context": context,
-                "count_limit": 10000,
-                "domain": [["product_id.categ_id.complete_name", "ilike", "All / RM"]],
-            },
-        },
-    }
-    r = session.post(f"{ODOO_URL}/web/dataset/call_kw", json=payload)
-    r.raise_for_status()
-    try:
-        data = r.json()["result"]["records"]
-        def flatten(record):
-            flat = {}
-            for k, v in record.items():
-                if isinstance(v, dict) and "display_name" in v:
-                    flat[LABELS.get(k, k)] = v["display_name"]
-                else:
-                    flat[LABELS.get(k, k)] = v
-            return flat
-        flattened = [flatten(rec) for rec in data]
-        print(f"📊 {cname}: {len(flattened)} ageing rows fetched")
-        return flattened
-    except Exception:
-        print(f"❌ {cname}: Failed to parse ageing report:", r.text[:200])
-        return []
+def flatten(record):
+    flat = {}
+    for k, v in record.items():
+        if isinstance(v, dict) and "display_name" in v:
+            flat[LABELS.get(k, k)] = v["display_name"]
+        else:
+            flat[LABELS.get(k, k)] = v
+    return flat
+
+AGEING_SPEC = {k: ({"fields": {"display_name": {}}} if k.endswith("_id") or k.endswith("_category") else {}) for k in LABELS.keys()}
+
+def fetch_ageing(client, company_id, cname, wizard_id):
+    return fetch_report_rows(client, "stock.ageing", AGEING_SPEC, RM_DOMAIN, company_id, cname,
+                             wizard_id=wizard_id, flatten=flatten)
+
+def fetch_aged(client, company_id, cname, from_date, to_date):
+    # Lots of the shared opening/closing read, bucketed locally
+    return ageing_engine.fetch(client, company_id, cname, "rm", RM_DOMAIN, AGEING_SPEC, flatten, LABELS,
+                               from_date, to_date)
 
 # ========= MAIN ==========
-if __name__ == "__main__":
-    userinfo = login()
-    print("User info (allowed companies):", userinfo.get("user_companies", {}))
-
+def run(client, company_ids=None):
+    from_date, to_date = resolve_window()
+    print("To date: ",to_date)
+    failed = []
     for cid, cname in COMPANIES.items():
+        if company_ids and cid not in company_ids:
+            continue
         print(f"\n🚀 Processing company: {cname} (ID={cid})")
         success = False
 
         for attempt in range(1, 2):  # Retry up to 1 times per company
             try:
-                if switch_company(cid):
-                    wiz_id = create_ageing_wizard(cid, FROM_DATE, TO_DATE)
-                    compute_ageing(cid, wiz_id)
-                    records = fetch_ageing(cid, cname, wiz_id)
+                if client.switch_company(cid):
+                    if ageing_engine.ENABLED:
+                        records = fetch_aged(client, cid, cname, from_date, to_date)
+                    else:
+                        with result_set(client):
+                            wiz_id = create_ageing_wizard(client, cid, from_date, to_date)
+                            compute_ageing(client, cid, wiz_id)
+                            records = fetch_ageing(client, cid, cname, wiz_id)
 
                     if records:
                         df = pd.DataFrame(records)
                         # Drop first column
                         df = df.iloc[:, 1:]
-                        output_file = f"{cname.lower().replace(' ', '_')}_stock_ageing_{TO_DATE}.xlsx"
-                        df.to_excel(output_file, index=False)
-                        print(f"📂 Saved: {output_file}")
+                        output_file = f"{cname.lower().replace(' ', '_')}_stock_ageing_{to_date}.xlsx"
+                        # Written in the transform pool while the sheet is being pasted
+                        saved = transform_pool.submit_write_excel(df, output_file)
 
                         # ========= GOOGLE SHEETS ==========
                         try:
                             if cid == 1:  # Zipper
-                                client = gspread.service_account(filename="gcreds.json")
-                                sheet = client.open_by_key("1z6Zb_BronrO26rNS_gCKmsetoY7_OFysfIyvU3iazy0")
-                                worksheet = sheet.worksheet("ageing_last_day_zip")
+                                worksheet = gsheets.get_worksheet("1z6Zb_BronrO26rNS_gCKmsetoY7_OFysfIyvU3iazy0", "ageing_last_day_zip")
                             elif cid == 3:  # Metal Trims
-                                client = gspread.service_account(filename="gcreds.json")
-                                sheet = client.open_by_key("1z6Zb_BronrO26rNS_gCKmsetoY7_OFysfIyvU3iazy0")
-                                worksheet = sheet.worksheet("ageing_last_day_mt")   
+                                worksheet = gsheets.get_worksheet("1z6Zb_BronrO26rNS_gCKmsetoY7_OFysfIyvU3iazy0", "ageing_last_day_mt")
                             else:
                                 worksheet = None
 
@@ -260,6 +138,9 @@ if __name__ == "__main__":
                     else:
                         raise Exception(f"No ageing data fetched for {cname}")
 
+                    saved.result()
+                    print(f"📂 Saved: {output_file}")
+
                     # If all steps succeed, mark success and break retry loop
                     success = True
                     print(f"✅ Completed successfully for {cname} (Attempt {attempt})")
@@ -276,3 +157,12 @@ if __name__ == "__main__":
 
         if not success:
             print(f"🚫 Skipping {cname} after 30 failed attempts.\n")
+            failed.append(cname)
+    return failed
+
+
+if __name__ == "__main__":
+    client = OdooClient()
+    userinfo = client.login()
+    print("User info (allowed companies):", userinfo.get("user_companies", {}))
+    run(client)
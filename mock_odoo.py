@@ -0,0 +1,466 @@
+"""Minimal stand-in for the Odoo endpoints the report scripts use, for local runs and load tests.
+
+    python mock_odoo.py --port 8069 --rows 500 --latency 0.5
+    ODOO_URL=http://127.0.0.1:8069 GSHEETS_DRY_RUN=1 python run_reports.py --queue runs.db --workers 4
+
+Records are generated from the requested specification, so every script gets rows
+of the right shape. ``GET /mock/stats`` returns how many calls each model/method received.
+
+The report models (stock.opening.closing, stock.ageing) keep one result set per computed
+wizard, read through the ``active_id`` of the context. A read that does not name a computed
+wizard gets the user's latest compute, which may belong to another window. It is counted as
+``<model> read without its wizard``. The stock.opening.closing quantities and values follow a
+ledger over the wizard's from/to dates: issues are negative, closing = opening + receive +
+issue, and the closing of a window is the opening of the next. The stock.ageing rows hold
+the same lots at the wizard's to_date, bucketed by the age of their receive date.
+"""
+import io
+import re
+import sys
+import gzip
+import json
+import time
+import logging
+import argparse
+import threading
+from datetime import date
+from collections import Counter
+from urllib.parse import parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+log = logging.getLogger()
+
+CSRF_TOKEN = "mockcsrf0123456789"
+XLSX_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+NUMERIC_FIELD = re.compile(r"qty|value|price|cost|amount|rate|rejected|days")
+DATE_FIELD = re.compile(r"date")
+WIZARD_IN_PATH = re.compile(r"/(\d+)\?")
+MANY2ONE_FIELD = re.compile(r"_id$|_category$|^product_uom$|^product_type$|^categ_type$")
+REPORT_MODELS = ("stock.opening.closing", "stock.ageing")
+# Day the opening/closing ledger starts from
+LEDGER_START = date(2024, 1, 1)
+
+# (id, name, parent_id)
+CATEGORIES = [
+    (1, "All", False), (2, "RM", 1), (3, "Chemicals", 2), (4, "Dyes", 2), (5, "Yarn", 2),
+    (6, "Spare Parts", 1), (7, "Machine", 6), (8, "Electrical", 6), (9, "Spare", 1),
+    (10, "FG", 1), (11, "Zipper", 10), (12, "Packing", 1),
+]
+
+
+class MockOdoo:
+    def __init__(self, rows=200, latency=0.0, compute_latency=0.0, scan_latency=0.0, row_latency=0.0, gzip=False,
+                 report_latency=0.0, render_latency=0.0):
+        self.rows = rows
+        self.gzip = gzip
+        self.report_latency = report_latency
+        # Odoo renders the xlsx inside the /report/download request
+        self.render_latency = render_latency
+        # company id -> when its last triggered XLSX report can be downloaded
+        self.report_ready_at = {}
+        self.latency = latency
+        self.row_latency = row_latency
+        self.compute_latency = compute_latency
+        self.scan_latency = scan_latency
+        self.category_name = {c["id"]: c["complete_name"] for c in self.categories()}
+        self.calls = Counter()
+        # wizard id -> its values; like Odoo, the user has one result set: the last computed wizard's
+        self.wizards = {}
+        self.computed = None
+        self.computed_values = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def next_id(self):
+        with self._lock:
+            self._next_id += 1
+            return self._next_id
+
+    def count(self, key):
+        with self._lock:
+            self.calls[key] += 1
+
+    # ===== Fake data =====
+    @staticmethod
+    def row_category(i):
+        return CATEGORIES[i % len(CATEGORIES)][0]
+
+    def value(self, field, spec, i):
+        if isinstance(spec, dict) and "fields" in spec:
+            rel_id = self.row_category(i) if field == "categ_id" else i % 17 + 1
+            return {"id": rel_id, "display_name": f"{field} {rel_id}",
+                    **{k: self.value(k, v, i) for k, v in spec["fields"].items() if k != "display_name"}}
+        if field == "categ_id":
+            return self.row_category(i)
+        if MANY2ONE_FIELD.search(field):
+            # Bare many2one: only the id, as web_search_read returns without a sub-specification
+            return i % 17 + 1
+        if NUMERIC_FIELD.search(field):
+            return round((i * 7.3) % 1000, 2)
+        if DATE_FIELD.search(field):
+            return f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}"
+        return f"{field}-{i}"
+
+    @staticmethod
+    def ledger(record, i, window):
+        """Set the opening/closing fields of ``record`` for the wizard values ``window``.
+
+        Each lot receives and issues a fixed quantity a day, issues negative like Odoo's, so
+        closing = opening + receive + issue and consecutive windows chain.
+        """
+        if not window.get("to_date"):
+            return record
+        first = date.fromisoformat(window.get("from_date") or LEDGER_START.isoformat())
+        last = date.fromisoformat(window["to_date"])
+        before, days = max((first - LEDGER_START).days, 0), max((last - first).days + 1, 0)
+        receive, issue, price = i % 5, -(i % 3), i % 9 + 1
+        opening = 1000 + i + (receive + issue) * before
+        qty = {"opening": opening, "receive": receive * days, "issue": issue * days,
+               "cloing": opening + (receive + issue) * days}
+        for name, amount in qty.items():
+            for field, value in ((f"{name}_qty", amount), (f"{name}_value", amount * price)):
+                if field in record:
+                    record[field] = value
+        return record
+
+    def ageing(self, record, i, window):
+        """Set the closing, duration and slot fields of a stock.ageing ``record`` at the wizard's to_date."""
+        if not window.get("to_date"):
+            return record
+        self.ledger(record, i, {"to_date": window["to_date"]})
+        days = (date.fromisoformat(window["to_date"]) - date.fromisoformat(self.value("receive_date", {}, i))).days
+        closing = self.ledger({"cloing_qty": 0}, i, {"to_date": window["to_date"]})["cloing_qty"]
+        # 0-30, 31-60, 61-90, 91-180, 181-365, 365+
+        bucket = sum(days > edge for edge in (30, 60, 90, 180, 365))
+        for n in range(6):
+            if f"slot_{n + 1}" in record:
+                record[f"slot_{n + 1}"] = closing if n == bucket else 0
+        if "duration" in record:
+            record["duration"] = days
+        return record
+
+    def records(self, specification, offset=0, limit=None):
+        stop = self.rows if limit is None else min(self.rows, offset + limit)
+        return [{"id": i + 1, **{f: self.value(f, s, i) for f, s in specification.items()}} for i in range(offset, stop)]
+
+    def categories(self):
+        names = {}
+        for cid, name, parent in CATEGORIES:
+            names[cid] = f"{names[parent]} / {name}" if parent else name
+        return [{"id": cid, "complete_name": names[cid], "parent_id": parent} for cid, _, parent in CATEGORIES]
+
+    def dimension(self, model, domain):
+        """Names of a related model (``mock.<field>``), read by id or by ``write_date``."""
+        field = model.removeprefix("mock.")
+        ids = []
+        for term in domain:
+            if term[0] == "id":
+                ids = term[2]
+            elif term[0] == "write_date":
+                # Pretend one record was renamed since the last sync
+                ids = [1]
+        records = [{"id": i, "display_name": f"{field} {i}", "write_date": "2025-01-01 00:00:00"} for i in ids]
+        return {"length": len(records), "records": records}
+
+    def _leaf(self, term, i):
+        path, operator, value = term
+        if path == "id":
+            ops = {"in": lambda: i + 1 in value, "=": lambda: i + 1 == value, ">=": lambda: i + 1 >= value,
+                   "<=": lambda: i + 1 <= value, ">": lambda: i + 1 > value, "<": lambda: i + 1 < value}
+            return ops[operator]() if operator in ops else True
+        if path.endswith("write_date") and operator == ">":
+            # A handful of records changed since the last sync
+            return i < 5
+        if path.endswith("categ_id.complete_name") or (path.endswith("categ_id") and "ilike" in operator):
+            match = value.casefold() in self.category_name[self.row_category(i)].casefold()
+            return not match if operator.startswith("not") else match
+        if path.endswith("categ_id"):
+            categ, ids = self.row_category(i), value if isinstance(value, list) else [value]
+            if operator == "child_of":
+                name = self.category_name[categ]
+                return any(name == self.category_name[c] or name.startswith(self.category_name[c] + " / ") for c in ids)
+            if operator in ("=", "in"):
+                return categ in ids
+            if operator == "not in":
+                return categ not in ids
+        return True
+
+    def select(self, domain):
+        """Ids matching ``domain`` (prefix ``|``/``&``/``!`` with id, category and write_date leaves;
+        other leaves match everything), or None for an empty domain."""
+        if not domain:
+            return None
+        matched = []
+        for i in range(self.rows):
+            stack = []
+            for term in reversed(domain):
+                if term == "|":
+                    stack.append(stack.pop() | stack.pop())
+                elif term == "&":
+                    stack.append(stack.pop() & stack.pop())
+                elif term == "!":
+                    stack.append(not stack.pop())
+                else:
+                    stack.append(self._leaf(term, i))
+            if all(stack):
+                matched.append(i + 1)
+        return matched
+
+    def domain_cost(self, model, domain):
+        """Count (and delay) the category filters a real server would have to evaluate per read."""
+        for term in domain or []:
+            if not isinstance(term, list) or len(term) != 3:
+                continue
+            path, operator = term[0], term[1]
+            if "categ_id" not in path:
+                continue
+            if path.endswith("complete_name") or operator in ("ilike", "not ilike"):
+                # Join to product_category plus a text scan of complete_name
+                self.count(f"{model} category name scan")
+                time.sleep(self.scan_latency)
+            else:
+                self.count(f"{model} category id filter")
+
+    def read_group(self, domain, fields, groupby, window=None):
+        """Non-lazy ``read_group`` over the generated rows: many2one groups as ``[id, name]``, ``:sum`` measures."""
+        measures = [f.split(":")[0] for f in fields]
+        spec = {**{g: {"fields": {"display_name": {}}} for g in groupby}, **{m: {} for m in measures}}
+        ids = self.select(domain)
+        groups = {}
+        for i in (range(self.rows) if ids is None else (i - 1 for i in ids)):
+            rec = self.ledger(self.records(spec, i, 1)[0], i, window or {})
+            key = tuple((rec[g]["id"], rec[g]["display_name"]) for g in groupby)
+            group = groups.setdefault(key, {**{g: list(k) for g, k in zip(groupby, key)}, "__count": 0,
+                                            **{m: 0 for m in measures}})
+            group["__count"] += 1
+            for m in measures:
+                group[m] += rec[m] if isinstance(rec[m], (int, float)) else 0
+        return list(groups.values())
+
+    def result_set(self, model, kwargs):
+        """Values the user's result set was last computed for (None outside the report models).
+
+        A read for another wizard than the last computed one sees that wizard's rows anyway, as on
+        the server, and is counted.
+        """
+        if model not in REPORT_MODELS:
+            return None
+        wizard_id = (kwargs.get("context") or {}).get("active_id")
+        with self._lock:
+            computed, values = self.computed, self.computed_values
+        if wizard_id != computed:
+            self.count(f"{model} read after another wizard's compute")
+        return values
+
+    # ===== JSON-RPC =====
+    def call_kw(self, model, method, args, kwargs):
+        if method == "create":
+            return self.next_id()
+        if method == "web_save":
+            wizard_id = self.next_id()
+            with self._lock:
+                self.wizards[wizard_id] = dict(args[1]) if len(args) > 1 else {}
+            return [{"id": wizard_id}]
+        if method == "write":
+            with self._lock:
+                for wizard_id in args[0]:
+                    self.wizards.setdefault(wizard_id, {}).update(args[1])
+            return True
+        if method == "onchange":
+            return {"value": {}}
+        window = None
+        if method in ("web_search_read", "search_count", "read_group"):
+            window = self.result_set(model, kwargs)
+        if method == "web_search_read":
+            spec = kwargs.get("specification") or {}
+            offset, limit = kwargs.get("offset", 0), kwargs.get("limit")
+            if model == "product.category":
+                categories = self.categories()
+                return {"length": len(categories), "records": categories[offset:offset + (limit or len(categories))]}
+            if model.startswith("mock."):
+                return self.dimension(model, kwargs.get("domain") or [])
+            domain = kwargs.get("domain") or []
+            self.domain_cost(model, domain)
+            ids = self.select(domain)
+            if ids is not None:
+                records = [rec for i in ids[offset:offset + (limit or len(ids))] for rec in self.records(spec, i - 1, 1)]
+            else:
+                records = self.records(spec, offset, limit)
+            if model == "stock.opening.closing":
+                records = [self.ledger(rec, rec["id"] - 1, window or {}) for rec in records]
+            elif model == "stock.ageing":
+                records = [self.ageing(rec, rec["id"] - 1, window or {}) for rec in records]
+            # Server-side work grows with the rows a read returns
+            time.sleep(len(records) / 1000 * self.row_latency)
+            return {"length": self.rows if ids is None else len(ids), "records": records}
+        if method in ("search", "search_count"):
+            domain = (args[0] if args else kwargs.get("domain")) or []
+            ids = self.select(domain)
+            ids = list(range(1, self.rows + 1)) if ids is None else ids
+            return ids[:kwargs.get("limit") or len(ids)] if method == "search" else len(ids)
+        if method in ("search_read", "export_data"):
+            # Flat shapes: search_read dicts with many2ones as [id, name], export_data rows as lists
+            fields = kwargs.get("fields") or [] if method == "search_read" else args[1]
+            spec = {f.split("/")[0]: ({"fields": {"display_name": {}}} if MANY2ONE_FIELD.search(f.split("/")[0]) else {})
+                    for f in fields}
+            if method == "search_read":
+                ids = self.select(kwargs.get("domain") or []) or range(1, self.rows + 1)
+                ids = ids[kwargs.get("offset", 0):][:kwargs.get("limit") or len(ids)]
+            else:
+                ids = args[0]
+            records = [self.records(spec, i - 1, 1)[0] for i in ids]
+            time.sleep(len(records) / 1000 * self.row_latency)
+            if method == "search_read":
+                return [{k: [v["id"], v["display_name"]] if isinstance(v, dict) else v for k, v in rec.items()}
+                        for rec in records]
+            return {"datas": [[(rec[f.split("/")[0]]["display_name"] if isinstance(rec[f.split("/")[0]], dict)
+                                else rec[f.split("/")[0]]) or "" for f in fields] for rec in records]}
+        if method == "read_group":
+            return self.read_group(kwargs.get("domain") or [], kwargs.get("fields") or [], kwargs.get("groupby") or [],
+                                   window if model == "stock.opening.closing" else None)
+        if method == "fields_get":
+            return {f: ({"type": "many2one", "relation": f"mock.{f}"} if MANY2ONE_FIELD.search(f) else {"type": "char"})
+                    for f in kwargs.get("allfields") or []}
+        if method == "retrieve_fg_store_datas":
+            # Computes the FG store figures of the window in the call, like a wizard button
+            time.sleep(self.compute_latency)
+            return [{"product": [i, f"FG {i}"], "qty": i * 3, "value": i * 12.5} for i in range(self.rows)]
+        return True
+
+    def call_button(self, model, method, args, kwargs):
+        time.sleep(self.compute_latency)
+        if method == "print_date_wise_stock_register":
+            # The user's report rows are replaced by this wizard's
+            with self._lock:
+                for wizard_id in args[0]:
+                    self.computed, self.computed_values = wizard_id, dict(self.wizards.get(wizard_id, {}))
+        if method == "action_generate_xlsx_report":
+            # Every wizard's report is built on its own, so several can be generating at once
+            self.report_ready_at[args[0][0]] = time.time() + self.report_latency
+            return {"type": "ir.actions.report", "report_name": f"mock.{model}"}
+        return True
+
+    def xlsx(self):
+        df = pd.DataFrame(self.records({"product_id": {"fields": {"display_name": {}}}, "qty": {}, "value": {},
+                                        "date_order": {}}))
+        buf = io.BytesIO()
+        with pd.ExcelWriter(buf) as writer:
+            df.to_excel(writer, index=False, sheet_name="Sheet1")
+            df.to_excel(writer, index=False, sheet_name="Sheet2")
+        return buf.getvalue()
+
+
+def make_handler(mock):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, body, content_type="application/json", status=200, encoding=None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            if encoding:
+                self.send_header("Content-Encoding", encoding)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _json(self, payload):
+            body = json.dumps(payload).encode()
+            if mock.gzip and "gzip" in self.headers.get("Accept-Encoding", ""):
+                self._send(gzip.compress(body, compresslevel=6), encoding="gzip")
+            else:
+                self._send(body)
+
+        def do_GET(self):
+            if self.path.startswith("/web"):
+                mock.count("GET /web")
+                html = f'<script>var odoo = {{\n    csrf_token: "{CSRF_TOKEN}",\n}};</script>'
+                self._send(html.encode(), "text/html")
+            elif self.path.startswith("/mock/stats"):
+                self._json(dict(mock.calls))
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            time.sleep(mock.latency)
+            raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            if self.path == "/report/download":
+                mock.count("POST /report/download")
+                form = parse_qs(raw.decode())
+                if form.get("csrf_token", [""])[0] != CSRF_TOKEN:
+                    self.send_error(400, "Invalid CSRF token")
+                    return
+                report_path = json.loads(form.get("data", ["[]"])[0])[0]
+                context = json.loads(form.get("context", ["{}"])[0])
+                wizard = context.get("active_id") or int(WIZARD_IN_PATH.search(report_path).group(1))
+                if time.time() < mock.report_ready_at.get(wizard, 0):
+                    mock.count("POST /report/download (not ready)")
+                    self.send_error(503, "Report is still being generated")
+                    return
+                time.sleep(mock.render_latency)
+                self._send(mock.xlsx(), XLSX_TYPE)
+                return
+            if self.path == "/mock/reset":
+                mock.calls.clear()
+                self._json({})
+                return
+
+            params = json.loads(raw or b"{}").get("params", {})
+            if self.path == "/web/session/authenticate":
+                mock.count("authenticate")
+                result = {"uid": 2, "user_companies": {"allowed_companies": {"1": {"name": "Zipper"},
+                                                                            "3": {"name": "Metal Trims"}}}}
+            elif self.path.startswith("/web/dataset/call_kw/"):
+                mock.count(f"{params.get('model')}.{params.get('method')}")
+                result = mock.call_kw(params.get("model"), params.get("method"),
+                                      params.get("args") or [], params.get("kwargs") or {})
+            elif self.path == "/web/dataset/call_button":
+                mock.count(f"{params.get('model')}.{params.get('method')}")
+                result = mock.call_button(params.get("model"), params.get("method"),
+                                          params.get("args") or [], params.get("kwargs") or {})
+            else:
+                self.send_error(404)
+                return
+            self._json({"jsonrpc": "2.0", "id": None, "result": result})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(port=8069, rows=200, latency=0.0, compute_latency=0.0, scan_latency=0.0, row_latency=0.0, gzip=False,
+          report_latency=0.0, render_latency=0.0):
+    mock = MockOdoo(rows=rows, latency=latency, compute_latency=compute_latency, scan_latency=scan_latency,
+                    row_latency=row_latency, gzip=gzip, report_latency=report_latency, render_latency=render_latency)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(mock))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    log.info(f"🧪 Mock Odoo on http://127.0.0.1:{server.server_address[1]} ({rows} rows per read)")
+    return server, mock
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a mock Odoo for local report runs")
+    parser.add_argument("--port", type=int, default=8069)
+    parser.add_argument("--rows", type=int, default=200, help="records returned by each full read")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every POST")
+    parser.add_argument("--compute-latency", type=float, default=0.0,
+                        help="seconds added to every call_button (server-side report compute)")
+    parser.add_argument("--scan-latency", type=float, default=0.0,
+                        help="seconds added to every read filtered on category names (join + text scan)")
+    parser.add_argument("--row-latency", type=float, default=0.0,
+                        help="seconds added per 1000 records returned by a read")
+    parser.add_argument("--gzip", action="store_true", help="gzip JSON responses for clients that accept it")
+    parser.add_argument("--report-latency", type=float, default=0.0,
+                        help="seconds after action_generate_xlsx_report before /report/download serves the file")
+    parser.add_argument("--render-latency", type=float, default=0.0,
+                        help="seconds /report/download spends rendering the file inside the request, like Odoo")
+    args = parser.parse_args()
+
+    server, _ = serve(args.port, args.rows, args.latency, args.compute_latency, args.scan_latency, args.row_latency,
+                      args.gzip, args.report_latency, args.render_latency)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,275 @@
+"""Shared Odoo JSON-RPC client used by the report scripts and the refresh daemon.
+
+A single ``OdooClient`` keeps one logged-in ``requests.Session`` so that several
+reports can be refreshed back to back without paying the login again.
+
+Responses are decoded straight from the body bytes, with ``orjson`` when it is installed
+(faster and lighter than ``json``, and no intermediate ``str`` copy of the body).
+
+The session asks for every encoding urllib3 can decode (gzip and deflate, plus br / zstd
+when ``brotli`` / ``zstandard`` are installed). With ODOO_TRANSPORT_STATS=1 every call logs
+its bytes on the wire against its decoded size, and a per model/method summary is logged at exit.
+"""
+import os
+import re
+import json
+import time
+import heapq
+import atexit
+import logging
+import itertools
+import threading
+from contextlib import contextmanager
+
+import requests
+from dotenv import load_dotenv
+from urllib3.util import make_headers
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+load_dotenv()
+log = logging.getLogger(__name__)
+
+ODOO_URL = os.getenv("ODOO_URL")
+DB = os.getenv("ODOO_DB")
+USERNAME = os.getenv("ODOO_USERNAME")
+PASSWORD = os.getenv("ODOO_PASSWORD")
+
+SESSION_EXPIRED = "odoo.http.SessionExpiredException"
+TRANSPORT_STATS = os.getenv("ODOO_TRANSPORT_STATS", "").strip().lower() in ("1", "true", "yes")
+
+# Lower value = more urgent; see report_registry.REPORTS
+DEFAULT_PRIORITY = 5
+
+
+class OdooError(Exception):
+    """Raised when Odoo answers a JSON-RPC call with an ``error`` member."""
+
+    def __init__(self, error):
+        self.error = error or {}
+        data = self.error.get("data") or {}
+        self.name = data.get("name", "")
+        super().__init__(data.get("message") or self.error.get("message") or str(error))
+
+
+class OdooBudget:
+    """Caps concurrent JSON-RPC calls from this process and hands free slots out by priority.
+
+    When the budget is saturated, a lower-priority unit waits at its next call while the
+    more urgent ones go first, so urgent reports are not stuck behind long backfills.
+    """
+
+    def __init__(self, limit=0):
+        self.limit = limit
+        self.in_use = 0
+        self._waiting = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def slot(self, priority=DEFAULT_PRIORITY):
+        if not self.limit:
+            yield
+            return
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiting, ticket)
+            if self.in_use >= self.limit:
+                log.debug(f"⏳ Odoo budget saturated ({self.in_use}/{self.limit}), priority {priority} waiting")
+            self._cond.wait_for(lambda: self._waiting[0] == ticket and self.in_use < self.limit)
+            heapq.heappop(self._waiting)
+            self.in_use += 1
+            self._cond.notify_all()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_use -= 1
+                self._cond.notify_all()
+
+
+# Shared by every client in the process; ODOO_MAX_CONCURRENCY=0 (default) means unlimited
+BUDGET = OdooBudget(int(os.getenv("ODOO_MAX_CONCURRENCY", 0) or 0))
+
+
+class TransportStats:
+    """Calls, bytes on the wire, decoded bytes and decode time per ``model.method``."""
+
+    def __init__(self):
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, encoding, wire_bytes, body_bytes, decode_seconds):
+        with self._lock:
+            entry = self.calls.setdefault(key, {"calls": 0, "wire": 0, "body": 0, "decode": 0.0, "encodings": set()})
+            entry["calls"] += 1
+            entry["wire"] += wire_bytes
+            entry["body"] += body_bytes
+            entry["decode"] += decode_seconds
+            entry["encodings"].add(encoding)
+        if TRANSPORT_STATS:
+            log.info(f"📶 {key}: {wire_bytes / 1024:.0f} kB {encoding} on the wire, {body_bytes / 1024:.0f} kB decoded "
+                     f"in {decode_seconds * 1000:.0f} ms")
+
+    def report(self):
+        with self._lock:
+            entries = sorted(self.calls.items(), key=lambda item: -item[1]["wire"])
+        for key, e in entries:
+            ratio = e["wire"] / e["body"] if e["body"] else 1
+            log.info(f"📶 {key}: {e['calls']} calls, {e['wire'] / 1e6:.1f} MB on the wire for {e['body'] / 1e6:.1f} MB "
+                     f"({ratio:.0%}, {'/'.join(sorted(e['encodings']))}), {e['decode']:.1f}s decoding")
+
+
+TRANSPORT = TransportStats()
+if TRANSPORT_STATS:
+    atexit.register(TRANSPORT.report)
+
+
+def decode_body(content):
+    return orjson.loads(content) if orjson is not None else json.loads(content)
+
+
+def flatten_record(record):
+    """Replace ``{"display_name": ...}`` relational values by their display name."""
+    return {k: v.get("display_name") if isinstance(v, dict) and "display_name" in v else v for k, v in record.items()}
+
+
+class OdooClient:
+    def __init__(self, url=None, db=None, username=None, password=None):
+        self.url = url or ODOO_URL
+        self.db = db or DB
+        self.username = username or USERNAME
+        self.password = password or PASSWORD
+        self.session = requests.Session()
+        self.session.headers.update({"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)",
+                                     # Every encoding urllib3 can decode here (br / zstd with their packages)
+                                     "Accept-Encoding": make_headers(accept_encoding=True)["accept-encoding"]})
+        self.uid = None
+        self.user_info = {}
+        # Long-lived lookups (category tree, dimension names, ...) kept warm between runs
+        self.cache = {}
+        # Priority of the report currently using this client, for the shared Odoo budget
+        self.priority = DEFAULT_PRIORITY
+        # Size and duration of this thread's latest response (and latest read per model), for page tuning
+        self.last_response = threading.local()
+        self._login_lock = threading.Lock()
+        self._csrf_token = None
+
+    # ===== Session =====
+    def login(self):
+        payload = {"jsonrpc": "2.0", "params": {"db": self.db, "login": self.username, "password": self.password}}
+        r = self.session.post(f"{self.url}/web/session/authenticate", json=payload)
+        r.raise_for_status()
+        result = r.json().get("result")
+        if result and "uid" in result:
+            self.uid = result["uid"]
+            self.user_info = result
+            # A new session comes with a new token
+            self._csrf_token = None
+            log.info(f"✅ Logged in (uid={self.uid})")
+            return result
+        raise Exception("❌ Login failed")
+
+    def ensure_login(self):
+        with self._login_lock:
+            if self.uid is None:
+                self.login()
+        return self.uid
+
+    def fetch_csrf_token(self, refresh=False):
+        """CSRF token of this session, read from the /web page once; ``refresh`` after a 400/403."""
+        self.ensure_login()
+        if self._csrf_token and not refresh:
+            return self._csrf_token
+        resp = self.session.get(f"{self.url}/web")
+        match = re.search(r'var odoo = {\s*csrf_token: "([A-Za-z0-9]+)"', resp.text)
+        if not match:
+            raise Exception("❌ Failed to extract CSRF token")
+        self._csrf_token = match.group(1)
+        return self._csrf_token
+
+    def context(self, company_id, **extra):
+        ctx = {"lang": "en_US", "tz": "Asia/Dhaka", "uid": self.uid,
+               "allowed_company_ids": [company_id], "company_id": company_id}
+        ctx.update(extra)
+        return ctx
+
+    # ===== JSON-RPC =====
+    def _post(self, path, params):
+        with BUDGET.slot(self.priority):
+            started = time.monotonic()
+            r = self.session.post(f"{self.url}{path}", json={"jsonrpc": "2.0", "method": "call", "params": params})
+            self.last_response.seconds = time.monotonic() - started
+        content = r.content
+        self.last_response.bytes = len(content)
+        # Bytes actually pulled from the socket, before gzip / br decompression
+        self.last_response.wire_bytes = r.raw.tell() or len(content)
+        r.raise_for_status()
+        decode_started = time.monotonic()
+        body = decode_body(content)
+        self.last_response.decode_seconds = time.monotonic() - decode_started
+        TRANSPORT.record(f"{params.get('model', path)}.{params.get('method', '')}".rstrip("."),
+                         r.headers.get("Content-Encoding", "identity"), self.last_response.wire_bytes,
+                         len(content), self.last_response.decode_seconds)
+        if "error" in body:
+            raise OdooError(body["error"])
+        return body.get("result")
+
+    def rpc(self, path, params):
+        """POST a JSON-RPC call, logging in again once if the session expired."""
+        self.ensure_login()
+        try:
+            return self._post(path, params)
+        except OdooError as e:
+            if e.name != SESSION_EXPIRED:
+                raise
+            log.warning("🔑 Odoo session expired, logging in again")
+            with self._login_lock:
+                self.login()
+            return self._post(path, params)
+
+    def call_kw(self, model, method, args=None, kwargs=None):
+        params = {"model": model, "method": method, "args": args or [], "kwargs": kwargs or {}}
+        return self.rpc(f"/web/dataset/call_kw/{model}/{method}", params)
+
+    def call_button(self, model, method, args=None, kwargs=None):
+        params = {"model": model, "method": method, "args": args or [], "kwargs": kwargs or {}}
+        return self.rpc("/web/dataset/call_button", params)
+
+    def switch_company(self, company_id):
+        self.ensure_login()
+        try:
+            self.call_kw("res.users", "write", [[self.uid], {"company_id": company_id}],
+                         {"context": {"allowed_company_ids": [company_id], "company_id": company_id}})
+        except OdooError as e:
+            log.error(f"❌ Failed to switch to company {company_id}: {e.error}")
+            return False
+        log.info(f"🔄 Session switched to company {company_id}")
+        return True
+
+    def web_search_read(self, model, specification, domain=None, context=None, offset=0, limit=5000, count_limit=10000):
+        kwargs = {
+            "specification": specification,
+            "offset": offset,
+            "limit": limit,
+            "context": context or {},
+            "count_limit": count_limit,
+            "domain": domain or [],
+        }
+        result = self.call_kw(model, "web_search_read", [], kwargs)
+        # Kept per model: a page read may be followed by name lookups on other models
+        reads = getattr(self.last_response, "reads", None) or {}
+        reads[model] = (self.last_response.seconds, self.last_response.bytes)
+        self.last_response.reads = reads
+        return result
+
+    def export_rows(self, model, ids, fields, context=None):
+        """Rows of ``ids`` as lists of ``fields`` values (``export_data``): no key repeated per record.
+
+        Values come in export format, so many2ones are names and empty values (``False``, ``0``)
+        are ``""``; paths such as ``product_id/display_name`` are allowed.
+        """
+        return self.call_kw(model, "export_data", [ids, fields], {"context": context or {}}).get("datas", [])
@@ -0,0 +1,165 @@
+"""Page sizes for paged ``web_search_read`` loops, tuned per model from measured responses.
+
+Each page records how long Odoo took and how many bytes came back per row. The next
+page size aims for PAGE_TARGET_SECONDS (default 2) and PAGE_TARGET_BYTES (default
+8 MB), whichever is reached first. It is kept between PAGE_MIN_ROWS and PAGE_MAX_ROWS
+(500 / 20000) and moves by at most a factor of two per page. So a narrow model such as
+product.template ends up with large pages and the 26-column stock.opening.closing
+with smaller ones. Tuned sizes are saved to ``.cache/page_sizes.json`` so the next
+run starts where this one ended.
+
+``read_all`` counts the matching rows first (``search_count``), so the pages are planned
+up to that total and the result list is allocated once. Every counted row is read, with
+no row cap. A read that returns a different number of rows than counted raises
+``IncompleteFetch`` before anything is published; FETCH_TRUNCATION=warn only logs it and
+returns what was read.
+"""
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+
+import dimension_cache
+
+log = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv("ODOO_CACHE_DIR", ".cache")
+TARGET_SECONDS = float(os.getenv("PAGE_TARGET_SECONDS", 2.0))
+TARGET_BYTES = int(os.getenv("PAGE_TARGET_BYTES", 8 * 1024 * 1024))
+MIN_ROWS = int(os.getenv("PAGE_MIN_ROWS", 500))
+MAX_ROWS = int(os.getenv("PAGE_MAX_ROWS", 20000))
+DEFAULT_ROWS = 2000
+SMOOTHING = 0.5
+SAVE_EVERY_SECONDS = 30
+TRUNCATION = os.getenv("FETCH_TRUNCATION", "error").strip().lower()
+
+_path = os.path.join(CACHE_DIR, "page_sizes.json")
+_models = None
+_dirty = False
+_saved_at = 0.0
+_lock = threading.Lock()
+
+
+def _load():
+    global _models
+    if _models is None:
+        try:
+            with open(_path) as f:
+                _models = json.load(f)
+        except (OSError, ValueError):
+            _models = {}
+    return _models
+
+
+def current_size(model):
+    with _lock:
+        return _load().get(model, {}).get("page_size", DEFAULT_ROWS)
+
+
+def record(model, rows, seconds, nbytes):
+    """Fold one page's measurements into the model's averages and return the next page size."""
+    global _dirty
+    if rows <= 0:
+        return current_size(model)
+    with _lock:
+        entry = _load().setdefault(model, {"page_size": DEFAULT_ROWS})
+        for key, value in (("seconds_per_row", seconds / rows), ("bytes_per_row", nbytes / rows)):
+            entry[key] = value if key not in entry else SMOOTHING * value + (1 - SMOOTHING) * entry[key]
+        # Size that would just hit whichever target comes first
+        ideal = min(TARGET_SECONDS / max(entry["seconds_per_row"], 1e-9),
+                    TARGET_BYTES / max(entry["bytes_per_row"], 1))
+        current = entry["page_size"]
+        size = int(max(MIN_ROWS, min(MAX_ROWS, current * 2, max(current / 2, ideal))))
+        if size != current:
+            log.debug(f"📐 {model}: page size {current} -> {size}")
+        entry["page_size"] = size
+        _dirty = True
+    if time.time() - _saved_at > SAVE_EVERY_SECONDS:
+        save()
+    return size
+
+
+def save():
+    """Write the tuned sizes, merged over what other processes saved meanwhile."""
+    global _dirty, _saved_at
+    with _lock:
+        if not _dirty:
+            return
+        try:
+            with open(_path) as f:
+                on_disk = json.load(f)
+        except (OSError, ValueError):
+            on_disk = {}
+        on_disk.update(_models)
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = f"{_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(on_disk, f, indent=1, sort_keys=True)
+        os.replace(tmp, _path)
+        _dirty = False
+        _saved_at = time.time()
+
+
+atexit.register(save)
+
+
+class IncompleteFetch(Exception):
+    """Raised when a read got fewer rows than Odoo counted for its domain."""
+
+
+def count(client, model, domain, context):
+    return client.call_kw(model, "search_count", [domain], {"context": context})
+
+
+def check_total(model, received, total, label=""):
+    """Fail (or warn, with FETCH_TRUNCATION=warn) when ``received`` is not the counted ``total``."""
+    if received == total:
+        return
+    message = f"{label or model}: {received} of {total} matching rows"
+    if TRUNCATION == "warn":
+        log.warning(f"⚠️ {message}")
+        return
+    raise IncompleteFetch(message)
+
+
+def iter_pages(client, model, specification, domain, context, page_size=None, max_rows=None):
+    """Yield pages of ``model`` records; sizes are tuned per model unless ``page_size`` is given.
+
+    ``max_rows`` caps the total like a one-shot read with that ``limit`` would; when it is
+    the counted total, no extra call is made to find the end.
+    """
+    offset = 0
+    while max_rows is None or offset < max_rows:
+        limit = page_size or current_size(model)
+        if max_rows is not None:
+            limit = min(limit, max_rows - offset)
+        result = dimension_cache.web_search_read(client, model, specification, domain=domain, context=context,
+                                                 offset=offset, limit=limit)
+        records = result["records"]
+        if page_size is None and len(records) >= min(limit, MIN_ROWS):
+            # A short tail page is mostly fixed overhead and would skew the per-row figures
+            record(model, len(records), *client.last_response.reads[model])
+        if records:
+            yield records
+        offset += len(records)
+        if len(records) < limit:
+            return
+
+
+def read_all(client, model, specification, domain, context, page_size=None, label="", transform=None):
+    """Every record of ``model`` matching ``domain``, counted first and checked against the count.
+
+    ``transform`` (e.g. a flattener) is applied page by page as the pages arrive, so only one
+    page of nested records is alive at a time.
+    """
+    total = count(client, model, domain, context)
+    records = [None] * total
+    received = 0
+    for page in iter_pages(client, model, specification, domain, context, page_size=page_size, max_rows=total):
+        records[received:received + len(page)] = page if transform is None else [transform(rec) for rec in page]
+        received += len(page)
+    del records[received:]
+    check_total(model, received, total, label)
+    return records
@@ -0,0 +1,72 @@
+"""Rows of report windows that lie in a closed month, kept on disk.
+
+The ``lm`` (last month) windows of Fg_stock.py and MT_spares.py recompute, on every run,
+a month that no longer changes. Once the month of a window's end date is over, plus
+CLOSED_PERIOD_GRACE_DAYS (default 2) for late postings, the first run stores its rows in
+``.cache/closed_periods/`` and later runs are served from there. Windows reaching into
+the current month are never cached. CLOSED_PERIOD_REFRESH=1 recomputes the closed windows
+and rewrites their files.
+"""
+import os
+import pickle
+import logging
+import threading
+from datetime import date, timedelta
+
+import date_windows
+from date_windows import Window
+
+log = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv("ODOO_CACHE_DIR", ".cache")
+GRACE_DAYS = int(os.getenv("CLOSED_PERIOD_GRACE_DAYS", 2))
+REFRESH = os.getenv("CLOSED_PERIOD_REFRESH", "").strip().lower() in ("1", "true", "yes")
+
+_dir = os.path.join(CACHE_DIR, "closed_periods")
+
+
+def is_closed(to_date, today=None):
+    """True once the month holding ``to_date`` (ISO date) is over on the run date, grace days included."""
+    end = date.fromisoformat(to_date)
+    next_month = (end.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return (today or date_windows.run_date()) >= next_month + timedelta(days=GRACE_DAYS)
+
+
+def _path(scope, company_id, from_date, to_date):
+    return os.path.join(_dir, f"{scope}_{company_id}_{Window(from_date, to_date).key}.pkl")
+
+
+def load(scope, company_id, from_date, to_date):
+    """Stored rows of a closed window, or None (open window, refresh requested, or not stored yet)."""
+    if REFRESH or not is_closed(to_date):
+        return None
+    try:
+        with open(_path(scope, company_id, from_date, to_date), "rb") as f:
+            return pickle.load(f)
+    except Exception:
+        # Missing, truncated or written by another version: computed again
+        return None
+
+
+def store(scope, company_id, from_date, to_date, records):
+    """Keep the rows of a closed window; open windows and empty results are not stored."""
+    if not records or not is_closed(to_date):
+        return
+    os.makedirs(_dir, exist_ok=True)
+    path = _path(scope, company_id, from_date, to_date)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(records, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+    log.info(f"🗄️ {scope}[{company_id}] {from_date} → {to_date}: {len(records)} rows stored as a closed period")
+
+
+def cached(scope, company_id, from_date, to_date, compute):
+    """Rows of a window: from the closed-period cache when possible, else ``compute()`` (stored when closed)."""
+    records = load(scope, company_id, from_date, to_date)
+    if records is not None:
+        log.info(f"🗄️ {scope}[{company_id}] {from_date} → {to_date}: {len(records)} rows from the closed-period cache")
+        return records
+    records = compute()
+    store(scope, company_id, from_date, to_date, records)
+    return records
@@ -0,0 +1,211 @@
+"""Streaming mode for the large report fetches: Odoo pages flow through bounded queues.
+
+    web_search_read pages ─▶ flatten ─┬─▶ chunked sheet append (caller thread)
+                                      └─▶ xlsx backup (openpyxl write-only)
+
+Each queue holds at most a few pages, so a slow sheet upload holds back the fetch
+instead of letting rows pile up in memory, and the first rows are uploaded while
+later pages are still being read. The rows go to a hidden staging tab. The target range
+is replaced in one batch update only once every counted row has arrived. A short or
+interrupted stream leaves the sheet as it was. Enable with STREAM_PIPELINE=1.
+
+This is a trade-off. Readers of the worksheet see no row before the whole report is
+staged, so the time to the first visible row is that of the full stream. What streaming
+still saves is the total time, since upload overlaps the fetch, and the memory of the
+whole report. Publishing chunks straight into the worksheet would show rows sooner, but a
+failed run would then leave a half-replaced sheet, which the atomic swap rules out.
+"""
+import os
+import time
+import queue
+import logging
+import threading
+from datetime import datetime
+
+import pytz
+from openpyxl import Workbook
+
+import gsheets
+import page_tuner
+from category_domains import compile_domain
+from odoo_client import flatten_record
+
+log = logging.getLogger(__name__)
+
+ENABLED = os.getenv("STREAM_PIPELINE", "").strip().lower() in ("1", "true", "yes")
+# Unset: page sizes are tuned per model (see page_tuner)
+PAGE_SIZE = int(os.getenv("STREAM_PAGE_SIZE", 0)) or None
+CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", 5000))
+QUEUE_PAGES = 4
+
+_DONE = object()
+
+
+class PipelineStopped(Exception):
+    """Raised inside a stage when another stage failed and the pipeline is shutting down."""
+
+
+# ===== Queue helpers that give up when another stage failed =====
+def _put(q, item, stop):
+    while True:
+        if stop.is_set():
+            raise PipelineStopped()
+        try:
+            q.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            pass
+
+
+def _get(q, stop):
+    while True:
+        if stop.is_set():
+            raise PipelineStopped()
+        try:
+            return q.get(timeout=0.5)
+        except queue.Empty:
+            pass
+
+
+def _cell(value):
+    # Same clean-up as replace(False, "") / fillna("") on the DataFrame path
+    return "" if value is False or value is None else value
+
+
+class _Stage(threading.Thread):
+    def __init__(self, name, target, stop):
+        super().__init__(name=name, daemon=True)
+        self._target_fn = target
+        self.stop = stop
+        self.error = None
+
+    def run(self):
+        try:
+            self._target_fn()
+        except PipelineStopped:
+            pass
+        except BaseException as e:
+            self.error = e
+            self.stop.set()
+
+
+def stream_report(client, model, specification, domain, context, worksheet, xlsx_path=None,
+                  flatten=flatten_record, clear_range=None, timestamp_cell=None, label="",
+                  page_size=PAGE_SIZE, chunk_rows=CHUNK_ROWS, queue_pages=QUEUE_PAGES):
+    """Fetch ``model`` page by page into a staging tab and publish it to ``worksheet`` once complete.
+
+    The sheet gets every column but the leading ``id`` (as the DataFrame path drops the
+    first column); the optional xlsx backup keeps all of them. Returns the row count.
+    """
+    domain = compile_domain(client, domain)
+    stop = threading.Event()
+    pages = queue.Queue(maxsize=queue_pages)
+    to_sheet = queue.Queue(maxsize=queue_pages)
+    to_xlsx = queue.Queue(maxsize=queue_pages) if xlsx_path else None
+    header = []
+    started = time.time()
+
+    def fetch():
+        # Counted first: a read that comes up short fails instead of ending quietly
+        expected = page_tuner.count(client, model, domain, context)
+        received = 0
+        for page in page_tuner.iter_pages(client, model, specification, domain, context, page_size,
+                                          max_rows=expected):
+            received += len(page)
+            _put(pages, page, stop)
+        page_tuner.check_total(model, received, expected, label)
+        _put(pages, _DONE, stop)
+
+    def transform():
+        while True:
+            page = _get(pages, stop)
+            if page is _DONE:
+                break
+            flat = [flatten(rec) for rec in page]
+            if not header:
+                header.extend(flat[0].keys())
+            rows = [[_cell(rec.get(col)) for col in header] for rec in flat]
+            _put(to_sheet, rows, stop)
+            if to_xlsx is not None:
+                _put(to_xlsx, rows, stop)
+        _put(to_sheet, _DONE, stop)
+        if to_xlsx is not None:
+            _put(to_xlsx, _DONE, stop)
+
+    def write_xlsx():
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet()
+        written = 0
+        while True:
+            rows = _get(to_xlsx, stop)
+            if rows is _DONE:
+                break
+            if not written:
+                ws.append(header)
+            for row in rows:
+                ws.append(row)
+            written += len(rows)
+        if written:
+            wb.save(xlsx_path)
+
+    stages = [_Stage(f"{label}-fetch", fetch, stop), _Stage(f"{label}-transform", transform, stop)]
+    if to_xlsx is not None:
+        stages.append(_Stage(f"{label}-xlsx", write_xlsx, stop))
+    for stage in stages:
+        stage.start()
+
+    # ===== Sheet upload in the calling thread =====
+    total, next_row, buffer, first_staged = 0, 1, [], None
+    staging = None
+
+    def flush():
+        nonlocal next_row, first_staged, staging
+        if staging is None:
+            # Created only once there is something to publish: an empty report leaves the sheet as it is
+            staging = gsheets.staging_worksheet(worksheet)
+        values = buffer if next_row > 1 else [header[1:]] + buffer
+        last_row = next_row + len(values) - 1
+        if last_row > staging.row_count or len(header) - 1 > staging.col_count:
+            staging.resize(rows=max(last_row, staging.row_count), cols=max(len(header) - 1, staging.col_count))
+        staging.update(values=values, range_name=f"A{next_row}", value_input_option="USER_ENTERED")
+        next_row = last_row + 1
+        if first_staged is None:
+            first_staged = time.time() - started
+            log.info(f"📤 {label}: first {len(values) - 1} rows staged after {first_staged:.1f}s")
+        buffer.clear()
+
+    try:
+        while True:
+            rows = _get(to_sheet, stop)
+            if rows is _DONE:
+                break
+            buffer.extend(row[1:] for row in rows)
+            total += len(rows)
+            # The first page goes out on its own so the sheet starts filling straight away
+            if len(buffer) >= chunk_rows or next_row == 1:
+                flush()
+        if buffer:
+            flush()
+    except PipelineStopped:
+        pass
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        for stage in stages:
+            stage.join()
+        if stop.is_set() and staging is not None:
+            gsheets.discard_staged(staging)
+    for stage in stages:
+        if stage.error is not None:
+            raise stage.error
+
+    if staging is not None:
+        gsheets.publish_staged(staging, worksheet, next_row - 1, len(header) - 1, clear_range)
+        log.info(f"📤 {label}: {total} rows published to {worksheet.title}")
+    if timestamp_cell and total:
+        local_time = datetime.now(pytz.timezone("Asia/Dhaka")).strftime("%Y-%m-%d %H:%M:%S")
+        worksheet.update(values=[[local_time]], range_name=timestamp_cell)
+    log.info(f"✅ {label}: {total} rows streamed in {time.time() - started:.1f}s"
+             + (f" (backup {os.path.basename(xlsx_path)})" if xlsx_path else ""))
+    return total
@@ -0,0 +1,174 @@
+"""Long-running refresh daemon.
+
+Keeps one logged-in Odoo session, one Google Sheets client and the client-side
+caches warm, and re-runs each report on its own interval so a refresh only pays
+for the data-dependent work.
+
+    python refresh_daemon.py
+    python refresh_daemon.py --interval pending_slider=15 --jitter 0.2 --status-port 8787
+
+Status is served as JSON on http://127.0.0.1:<status-port>/status
+"""
+import sys
+import json
+import time
+import heapq
+import random
+import signal
+import logging
+import argparse
+import importlib
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import date_windows
+import gsheets
+import transform_pool
+import wizards
+from odoo_client import OdooClient
+
+logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+log = logging.getLogger()
+
+# ===== Default refresh intervals (minutes) =====
+DEFAULT_INTERVALS = {
+    "Closing_stock_last_day": 60,
+    "pending_slider": 30,
+    "Raw_materials": 60,
+}
+DEFAULT_JITTER = 0.1
+DEFAULT_STATUS_PORT = 8787
+
+
+class RefreshDaemon:
+    def __init__(self, intervals, jitter=DEFAULT_JITTER, client=None):
+        self.intervals = intervals
+        self.jitter = jitter
+        self.client = client or OdooClient()
+        self.stop_event = threading.Event()
+        self.started_at = None
+        self.status = {
+            name: {"interval_minutes": minutes, "runs": 0, "failures": 0, "last_started": None,
+                   "last_finished": None, "last_duration": None, "last_error": None, "next_run": None}
+            for name, minutes in intervals.items()
+        }
+        self._lock = threading.Lock()
+        self._queue = []
+
+    # ===== Scheduling =====
+    def _jittered(self, seconds):
+        return seconds * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def _schedule(self, name, due):
+        heapq.heappush(self._queue, (due, name))
+        with self._lock:
+            self.status[name]["next_run"] = datetime.fromtimestamp(due).isoformat(timespec="seconds")
+
+    def _run_report(self, name):
+        st = self.status[name]
+        started = time.time()
+        with self._lock:
+            st["last_started"] = datetime.fromtimestamp(started).isoformat(timespec="seconds")
+        log.info(f"\n🔁 Refreshing {name}")
+        # Dates are resolved again for every refresh, not kept from the day the daemon started
+        date_windows.new_run()
+        try:
+            module = importlib.import_module(name)
+            skipped = module.run(self.client)
+            error = f"skipped {', '.join(map(str, skipped))}" if skipped else None
+        except Exception as e:
+            error = str(e)
+        if error:
+            log.error(f"❌ Refresh of {name} failed: {error}")
+        finished = time.time()
+        with self._lock:
+            st["runs"] += 1
+            st["failures"] += error is not None
+            st["last_error"] = error
+            st["last_finished"] = datetime.fromtimestamp(finished).isoformat(timespec="seconds")
+            st["last_duration"] = round(finished - started, 2)
+        log.info(f"⏱️ {name} refreshed in {finished - started:.1f}s")
+        return finished
+
+    def run_forever(self):
+        self.started_at = datetime.now().isoformat(timespec="seconds")
+        self.client.ensure_login()
+        if not gsheets.DRY_RUN:
+            gsheets.get_client()
+
+        # Stagger the first runs so the reports do not all hit Odoo at start-up
+        now = time.time()
+        for name, minutes in self.intervals.items():
+            self._schedule(name, now + random.uniform(0, self.jitter * minutes * 60))
+
+        while not self.stop_event.is_set():
+            due, name = heapq.heappop(self._queue)
+            if self.stop_event.wait(max(0, due - time.time())):
+                break
+            finished = self._run_report(name)
+            self._schedule(name, finished + self._jittered(self.intervals[name] * 60))
+        wizards.release_all()
+        transform_pool.shutdown()
+        log.info("👋 Refresh daemon stopped")
+
+    def snapshot(self):
+        with self._lock:
+            return {"started_at": self.started_at, "uid": self.client.uid,
+                    "reports": json.loads(json.dumps(self.status))}
+
+
+# ===== Status endpoint =====
+def serve_status(daemon, port):
+    class StatusHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") not in ("", "/status"):
+                self.send_error(404)
+                return
+            body = json.dumps(daemon.snapshot(), indent=2).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), StatusHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    log.info(f"📡 Status endpoint on http://127.0.0.1:{port}/status")
+    return server
+
+
+def parse_intervals(values):
+    intervals = dict(DEFAULT_INTERVALS)
+    for value in values or []:
+        name, _, minutes = value.partition("=")
+        if not minutes:
+            raise SystemExit(f"❌ Invalid --interval {value!r}, expected NAME=MINUTES")
+        intervals[name.removesuffix(".py")] = float(minutes)
+    return {name: minutes for name, minutes in intervals.items() if minutes > 0}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep reports refreshed from a warm Odoo session")
+    parser.add_argument("--interval", action="append", metavar="NAME=MINUTES",
+                        help="refresh interval for a report script (0 disables it); repeatable")
+    parser.add_argument("--jitter", type=float, default=DEFAULT_JITTER,
+                        help="random +/- fraction applied to every interval (default 0.1)")
+    parser.add_argument("--status-port", type=int, default=DEFAULT_STATUS_PORT,
+                        help="local port for the JSON status endpoint (0 disables it)")
+    args = parser.parse_args()
+
+    intervals = parse_intervals(args.interval)
+    if not intervals:
+        raise SystemExit("❌ No reports left to refresh")
+    daemon = RefreshDaemon(intervals, jitter=args.jitter)
+    signal.signal(signal.SIGTERM, lambda *_: daemon.stop_event.set())
+    if args.status_port:
+        serve_status(daemon, args.status_port)
+    try:
+        daemon.run_forever()
+    except KeyboardInterrupt:
+        daemon.stop_event.set()
@@ -0,0 +1,195 @@
+"""Download of server-generated XLSX reports, as soon as they are ready.
+
+The invoice scripts slept before downloading: 10 s for Zipper, and 5-20 s between attempts.
+``PendingReport`` instead polls ``/report/download`` with exponential backoff (0.5 s
+doubling up to 15 s) until REPORT_READY_TIMEOUT seconds (default 180) have passed. Each
+attempt is streamed, and only the headers are looked at until they announce an xlsx
+body. So a report that is not ready yet costs a status line, not an error page, and the
+file itself is fetched by the attempt that finds it ready.
+
+Odoo's ``/report/download`` is POST-only and renders the file inside the request, so there
+is no separate HEAD or range target. The streamed attempt is both the probe and the download.
+
+The observed generation time (from the report button to a ready response) is kept per
+report in ``.cache/report_latency.json`` and logged next to its running average. That
+time includes the render done inside the download request, so the first attempt is sent
+right after the trigger. The backoff only starts when the server answers that the
+report is not ready.
+
+Generation happens on the server, so the scripts trigger the report of every company
+first (``PendingReport``) and ``collect`` them afterwards. Each pending report is downloaded
+on a thread of a small pool (REPORT_DOWNLOAD_WORKERS, default 4), because Odoo renders
+during the download request. Each POST takes a slot of the Odoo budget at the priority of
+the report that triggered it. A report is handed to its ``on_ready`` callback on its
+thread as soon as it is downloaded, in whatever order the server finishes them.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+
+from odoo_client import BUDGET
+
+log = logging.getLogger(__name__)
+
+XLSX_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CACHE_DIR = os.getenv("ODOO_CACHE_DIR", ".cache")
+READY_TIMEOUT = float(os.getenv("REPORT_READY_TIMEOUT", 180))
+FIRST_WAIT = 0.5
+MAX_WAIT = 15
+SMOOTHING = 0.3
+WORKERS = int(os.getenv("REPORT_DOWNLOAD_WORKERS", 4))
+
+_latency_path = os.path.join(CACHE_DIR, "report_latency.json")
+_lock = threading.Lock()
+_pool = None
+
+
+class ReportNotReady(Exception):
+    """Raised when a report still is not downloadable at the deadline."""
+
+
+def _load():
+    try:
+        with open(_latency_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def average_latency(label):
+    """Running average of the generation time of ``label`` in seconds, or None before the first download."""
+    with _lock:
+        return _load().get(label, {}).get("average")
+
+
+def record_latency(label, seconds):
+    """Fold one observed generation time into the running average of ``label``; returns the average."""
+    with _lock:
+        latencies = _load()
+        entry = latencies.setdefault(label, {"average": seconds, "count": 0})
+        entry["average"] = SMOOTHING * seconds + (1 - SMOOTHING) * entry["average"]
+        entry["count"] += 1
+        entry["last"] = seconds
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = f"{_latency_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(latencies, f, indent=1, sort_keys=True)
+        os.replace(tmp, _latency_path)
+        return entry["average"]
+
+
+class PendingReport:
+    """A report whose generation was triggered; ``on_ready`` gets its xlsx bytes once downloadable."""
+
+    def __init__(self, client, report_path, context, csrf_token, label, on_ready=None, triggered_at=None,
+                 ready_timeout=READY_TIMEOUT):
+        self.client = client
+        # Kept from the trigger: the client's priority follows whichever unit runs next
+        self.priority = client.priority
+        self.label = label
+        self.on_ready = on_ready
+        self.payload = {
+            "data": json.dumps([report_path, "xlsx"]),
+            "context": json.dumps(context),
+            "token": "dummy-because-api-expects-one",
+            "csrf_token": csrf_token,
+        }
+        self.headers = {"X-CSRF-Token": csrf_token, "Referer": f"{client.url}/web"}
+        self.started = time.time()
+        self.triggered_at = triggered_at or self.started
+        self.deadline = self.started + ready_timeout
+        self.next_check = self.started
+        self.wait = FIRST_WAIT
+        self.attempts = 0
+        self.finished_at = None
+        self.error = None
+        self.future = None
+
+    def _refresh_token(self):
+        """Swap in a freshly fetched CSRF token; False when the session's token did not change."""
+        token = self.client.fetch_csrf_token(refresh=True)
+        if token == self.payload["csrf_token"]:
+            return False
+        self.payload["csrf_token"] = token
+        self.headers["X-CSRF-Token"] = token
+        return True
+
+    def poll(self, timeout=60):
+        """One download attempt: the xlsx bytes when the report is ready, else None (next check rescheduled)."""
+        self.attempts += 1
+        try:
+            with BUDGET.slot(self.priority), \
+                    self.client.session.post(f"{self.client.url}/report/download", data=self.payload,
+                                             headers=self.headers, timeout=timeout, stream=True) as resp:
+                if resp.status_code == 200 and XLSX_TYPE in resp.headers.get("content-type", ""):
+                    content = resp.content
+                    latency = time.time() - self.triggered_at
+                    average = record_latency(self.label, latency)
+                    log.info(f"📥 {self.label}: ready after {latency:.1f}s ({self.attempts} attempt(s), "
+                             f"average {average:.1f}s), {len(content) / 1024:.0f} kB")
+                    return content
+                reason = f"status {resp.status_code}, {resp.headers.get('content-type', 'no content type')}"
+                rejected = resp.status_code in (400, 403)
+        except requests.RequestException as e:
+            reason, rejected = str(e), False
+        now = time.time()
+        if rejected and self._refresh_token():
+            log.warning(f"🔑 {self.label}: CSRF token rejected ({reason}), retrying with a fresh one")
+            self.next_check = now
+            return None
+        if now + self.wait > self.deadline:
+            raise ReportNotReady(f"not ready after {now - self.started:.0f}s "
+                                 f"({self.attempts} attempt(s), last: {reason})")
+        log.info(f"⏳ {self.label}: not ready ({reason}), next check in {self.wait:.1f}s")
+        self.next_check = now + self.wait
+        self.wait = min(self.wait * 2, MAX_WAIT)
+        return None
+
+
+    def download(self):
+        """Poll until the xlsx is downloadable and hand it to ``on_ready``; a failure is kept in ``error``."""
+        try:
+            while True:
+                time.sleep(max(0.0, self.next_check - time.time()))
+                content = self.poll()
+                if content is not None:
+                    break
+            if self.on_ready:
+                self.on_ready(content)
+        except Exception as e:
+            self.error = e
+            log.error(f"❌ {self.label}: {e}")
+        self.finished_at = time.time()
+        return self
+
+
+def _executor():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="download")
+        return _pool
+
+
+def collect(pending, block=True):
+    """Download the reports of ``pending`` concurrently and remove the finished ones from the list.
+
+    The first call starts a download for every report. With ``block`` the call returns once
+    every report is handled; otherwise it returns the ones finished so far without waiting.
+    Returns the reports handled; the ones that timed out or whose ``on_ready`` raised have
+    ``error`` set.
+    """
+    for report in pending:
+        if report.future is None:
+            report.future = _executor().submit(report.download)
+    if block:
+        wait([report.future for report in pending])
+    handled = [report for report in pending if report.future.done()]
+    for report in handled:
+        pending.remove(report)
+    return handled
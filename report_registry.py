@@ -0,0 +1,111 @@
+"""Catalogue of the report scripts and the (report, company, window) units they split into.
+
+Every script exposes ``run(client, company_ids=None[, windows=None])``; one unit is
+one call of that function restricted to a single company (and window where the
+script builds several date ranges per run). The scripts retry and skip a failing company
+themselves, so ``run`` returns the companies (or downloads) it skipped; ``run_unit``
+raises for them, so the runner and the queue see the unit as failed. Reports marked ``concurrent_windows``
+compute all their windows at once inside a run, so they get one unit per company.
+
+``priority`` (lower = more urgent) and ``sla`` (minutes after the run starts by which
+the sheet should be refreshed) drive the runner's ordering; reports without them get
+the defaults below.
+
+Reports marked ``xlsx`` are built by Odoo after a button call and downloaded later;
+they also expose ``trigger_all(client, company_ids=None)``, which starts the build of
+every company and returns the pending downloads (see report_download).
+"""
+import importlib
+
+from odoo_client import DEFAULT_PRIORITY
+
+DEFAULT_SLA_MINUTES = 120
+
+# ===== Reports in the same order as the GitHub workflow =====
+REPORTS = {
+    "Closing_stock": {"companies": (1, 3), "priority": 2, "sla": 45},
+    "Closing_stock_last_day": {"companies": (1, 3), "priority": 1, "sla": 20},
+    "Closing_stock_1": {"companies": (1, 3)},
+    "Raw_materials": {"companies": (1, 3), "priority": 3, "sla": 60},
+    "pending_slider": {"companies": (1, 3), "priority": 1, "sla": 15, "xlsx": True},
+    "inventory_ageing": {"companies": (1, 3)},
+    "inventory_ageing_last_day": {"companies": (1, 3)},
+    "inventory_ageing_1": {"companies": (1, 3)},
+    "MT_spares": {"companies": (3,), "windows": ("cs", "ld", "lm"), "concurrent_windows": True},
+    "inovice_summary": {"companies": (1, 3), "priority": 3, "sla": 60, "xlsx": True},
+    "Relese_inovice_summary": {"companies": (1, 3), "xlsx": True},
+    "Consumption_stock_mar24_till": {"companies": (1, 3)},
+    "Consumption_stock_Apr24_till": {"companies": (1, 3)},
+    "Sep_inovice_summary": {"companies": (1, 3), "xlsx": True},
+    "pending_invoice_last_month": {"companies": (1, 3), "xlsx": True},
+    "Fg_stock": {"companies": (1, 3), "windows": ("cs", "ld", "lm"), "concurrent_windows": True},
+    "Spares_stock": {"companies": (1, 3)},
+    "spares_workcenter_df": {"companies": (1, 3), "priority": 9, "sla": 240},
+    "unuseable_stock": {"companies": (1, 3)},
+    "spares_ageing": {"companies": (1, 3), "priority": 8, "sla": 240},
+    "spares_ageing_closing_preious_month": {"companies": (1, 3), "priority": 8, "sla": 240},
+}
+
+
+def resolve_names(names=None):
+    """Validate report names (``.py`` suffix allowed); ``None`` or ``All`` selects every report."""
+    if not names or names == ["All"]:
+        return list(REPORTS)
+    resolved = []
+    for name in names:
+        name = name.removesuffix(".py")
+        if name not in REPORTS:
+            raise SystemExit(f"❌ Unknown report {name!r}")
+        resolved.append(name)
+    return resolved
+
+
+def build_units(names=None):
+    """List every ``(report, company_id, window)`` unit; ``window`` is ``""`` for single-window reports."""
+    units = []
+    for name in resolve_names(names):
+        entry = REPORTS[name]
+        for company_id in entry["companies"]:
+            split = entry.get("windows") if not entry.get("concurrent_windows") else None
+            for window in split or ("",):
+                units.append((name, company_id, window))
+    return units
+
+
+def schedule(report):
+    """``(priority, sla_minutes)`` of a report."""
+    entry = REPORTS[report]
+    return entry.get("priority", DEFAULT_PRIORITY), entry.get("sla", DEFAULT_SLA_MINUTES)
+
+
+def deadline(report, run_started):
+    return run_started + schedule(report)[1] * 60
+
+
+def order_units(units, run_started):
+    """Earliest deadline first, more urgent report first on equal deadlines; otherwise workflow order."""
+    position = {unit: i for i, unit in enumerate(units)}
+    return sorted(units, key=lambda u: (deadline(u[0], run_started), schedule(u[0])[0], position[u]))
+
+
+def run_unit(client, report, company_id, window=""):
+    module = importlib.import_module(report)
+    # Every Odoo call of this unit competes for the shared budget at the report's priority
+    client.priority = schedule(report)[0]
+    if window:
+        skipped = module.run(client, company_ids=[company_id], windows=[window])
+    else:
+        skipped = module.run(client, company_ids=[company_id])
+    if skipped:
+        raise RuntimeError(f"{report} skipped {', '.join(map(str, skipped))}")
+
+
+def is_xlsx(report):
+    return REPORTS[report].get("xlsx", False)
+
+
+def trigger_unit(client, report, company_id):
+    """Start the server-side build of an ``xlsx`` unit; returns its pending downloads."""
+    module = importlib.import_module(report)
+    client.priority = schedule(report)[0]
+    return module.trigger_all(client, company_ids=[company_id])
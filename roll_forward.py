@@ -0,0 +1,174 @@
+"""RM opening/closing windows rolled forward locally from stored lot movements.
+
+Closing_stock.py (month to date), Closing_stock_last_day.py (month to yesterday) and
+Closing_stock_1.py (previous month) had the server compute three heavily overlapping
+windows. With ROLL_FORWARD=1 a window is cut into segments:
+
+* whole closed months, stored as the backfill archive partitions
+  (``archive/closing_stock/company=<id>/month=<YYYY-MM>/``), so backfill.py can warm them;
+* single days, stored next to them (``day=<YYYY-MM-DD>/``) once they are older than
+  CLOSED_PERIOD_GRACE_DAYS;
+* one open tail with the most recent days, computed on every run.
+
+Missing segments are computed by ROLL_FORWARD_WORKERS threads (default 4), which take turns
+on the user's result set (``stock_reports.result_set``). The window
+is then rolled forward per lot in one vectorised pass: the opening of its first segment,
+receipts and issues summed, and closing = opening + receive + issue (Odoo reports issues as
+negative quantities and values). The previous month
+needs no wizard once it is archived. The current-month windows only compute their tail.
+
+Two checks guard the result:
+
+* every run, each lot's rolled closing must equal the closing Odoo reported for it in the
+  window's last segment. A segment that does not chain on the one before breaks this. A lot
+  with no row in the last segment cannot be checked (it would roll to the closing it was last
+  seen with), so it sends the window to the server as well;
+* in a ROLL_FORWARD_VERIFY fraction of runs (default 0.05), the window is also computed on
+  the server and the lots' closings are compared.
+
+On any difference the server's window is used and a warning names the first lot.
+
+The segments are stored as Parquet under ODOO_ARCHIVE_DIR, so roll-forward is meant for runs
+that keep that directory between runs (local or self-hosted). The GitHub workflow neither
+installs pyarrow nor keeps the archive; without pyarrow the window is computed on the server.
+"""
+import os
+import random
+import logging
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import backfill
+import date_windows
+import period_cache
+from cumulative_stock import fetch_window
+
+log = logging.getLogger(__name__)
+
+ENABLED = os.getenv("ROLL_FORWARD", "").strip().lower() in ("1", "true", "yes")
+WORKERS = int(os.getenv("ROLL_FORWARD_WORKERS", 4))
+VERIFY_RATE = float(os.getenv("ROLL_FORWARD_VERIFY", 0.05))
+TOLERANCE = 0.01
+
+REPORT = "closing_stock"
+KEY = ["product_id", "lot_id"]
+OPENING = ["opening_qty", "opening_value"]
+FLOWS = ["receive_qty", "receive_value", "issue_qty", "issue_value"]
+CLOSING = ["cloing_qty", "cloing_value"]
+
+
+def segments(from_date, to_date, today=None):
+    """``(from_date, to_date, kind)`` segments covering the window: ``month``, ``day``, or None for the open tail."""
+    today = today or date_windows.run_date()
+    settled = today - timedelta(days=period_cache.GRACE_DAYS)
+    start, end = date.fromisoformat(from_date), date.fromisoformat(to_date)
+    parts = []
+    while start <= end:
+        month_end = (start.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        if start.day == 1 and month_end <= end and period_cache.is_closed(month_end.isoformat(), today):
+            parts.append((start, month_end, "month"))
+            start = month_end + timedelta(days=1)
+        elif start < settled:
+            parts.append((start, start, "day"))
+            start += timedelta(days=1)
+        else:
+            parts.append((start, end, None))
+            break
+    return [(first.isoformat(), last.isoformat(), kind) for first, last, kind in parts]
+
+
+def segment_path(company_id, from_date, kind):
+    if kind == "month":
+        return backfill.partition_path(REPORT, company_id, date.fromisoformat(from_date))
+    return os.path.join(backfill.ARCHIVE_DIR, REPORT, f"company={company_id}", f"day={from_date}", "part-0.parquet")
+
+
+def load_segment(client, company_id, cname, segment):
+    """``(rows, computed)``: the stored rows of a settled segment, else the segment computed (and stored)."""
+    from_date, to_date, kind = segment
+    path = kind and segment_path(company_id, from_date, kind)
+    if path and not period_cache.REFRESH and os.path.exists(path):
+        return pd.read_parquet(path), False
+    records = fetch_window(client, company_id, cname, from_date, to_date)
+    if path and records:
+        backfill.write_parquet(path, records)
+    return backfill.columnar(records), True
+
+
+def roll(frames):
+    """``(rolled, reported)`` per lot: the window rolled forward, and Odoo's closing in the last segment.
+
+    ``reported`` is NaN for a lot with no row in the last segment.
+    """
+    df = pd.concat([frame.assign(_segment=i) for i, frame in enumerate(frames)], ignore_index=True)
+    numeric = OPENING + FLOWS + CLOSING
+    df[numeric] = df[numeric].apply(pd.to_numeric, errors="coerce").fillna(0)
+    lots = df.groupby(KEY, dropna=False, sort=False)
+    first = df[df["_segment"] == lots["_segment"].transform("min")]
+    last = df[df["_segment"] == df["_segment"].max()]
+    # Several rows of one lot in a segment are summed; the attributes are the latest ones
+    rolled = lots[[c for c in df.columns if c not in numeric and c not in KEY and c != "_segment"]].last()
+    rolled = rolled.join(first.groupby(KEY, dropna=False)[OPENING].sum()).join(lots[FLOWS].sum())
+    for closing, opening, receive, issue in zip(CLOSING, OPENING, FLOWS[:2], FLOWS[2:]):
+        rolled[closing] = rolled[opening] + rolled[receive] + rolled[issue]
+    return rolled, last.groupby(KEY, dropna=False)[CLOSING].sum().reindex(rolled.index)
+
+
+def unreported(reported):
+    """Lots with no row in the last segment: their rolled closing is the one they were last seen with."""
+    return reported.index[reported.isna().all(axis=1)]
+
+
+def mismatches(rolled, closings):
+    """Lots whose rolled closing differs from ``closings`` (indexed by lot)."""
+    closings = closings.reindex(rolled.index.union(closings.index), fill_value=0)
+    differs = (rolled[CLOSING].reindex(closings.index, fill_value=0) - closings).abs() > TOLERANCE
+    return closings.index[differs.any(axis=1)]
+
+
+def to_records(rolled, columns):
+    df = rolled.reset_index()[[c for c in columns if c != "_segment"]].sort_values("id")
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def fetch(client, company_id, cname, from_date, to_date):
+    """Rows of ``from_date`` → ``to_date`` as the stock register window would give them, one per lot."""
+    if backfill.pyarrow is None:
+        log.warning(f"⚠️ {cname}: the roll-forward store is Parquet and pyarrow is missing, computing the window")
+        return fetch_window(client, company_id, cname, from_date, to_date)
+    parts = segments(from_date, to_date)
+    with ThreadPoolExecutor(max_workers=max(1, min(WORKERS, len(parts))), thread_name_prefix="segment") as pool:
+        loaded = list(pool.map(lambda part: load_segment(client, company_id, cname, part), parts))
+    frames = [frame for frame, _ in loaded if not frame.empty]
+    if not frames:
+        return []
+    rolled, reported = roll(frames)
+
+    missing = unreported(reported)
+    if len(missing):
+        log.warning(f"⚠️ {cname}: {len(missing)} lot(s) have no row in the last segment (e.g. {missing[0]}), "
+                    f"computing {from_date} → {to_date} on the server")
+        return fetch_window(client, company_id, cname, from_date, to_date)
+    broken = mismatches(rolled, reported)
+    if len(broken):
+        log.warning(f"⚠️ {cname}: {len(broken)} lot(s) do not roll forward to Odoo's closing "
+                    f"(e.g. {broken[0]}), computing {from_date} → {to_date} on the server")
+        return fetch_window(client, company_id, cname, from_date, to_date)
+    if random.random() < VERIFY_RATE:
+        rows = fetch_window(client, company_id, cname, from_date, to_date)
+        server = backfill.columnar(rows)
+        if server.empty:
+            return rows
+        server[CLOSING] = server[CLOSING].apply(pd.to_numeric, errors="coerce").fillna(0)
+        differing = mismatches(rolled, server.groupby(KEY, dropna=False)[CLOSING].sum())
+        if len(differing):
+            log.warning(f"⚠️ {cname}: {len(differing)} lot(s) differ from the server window "
+                        f"(e.g. {differing[0]}), using the server's rows")
+            return rows
+        log.info(f"🔎 {cname}: roll-forward matches the server window ({len(rolled)} lots)")
+    computed = sum(1 for _, was_computed in loaded if was_computed)
+    log.info(f"🧮 {cname}: {len(rolled)} lots rolled forward over {len(parts)} segment(s), "
+             f"{computed} computed on the server")
+    return to_records(rolled, frames[-1].columns)
@@ -0,0 +1,258 @@
+"""Run the report scripts as (report, company, window) units, optionally split across workers.
+
+    python run_reports.py                                  # every unit, one after the other
+    python run_reports.py Fg_stock MT_spares               # only some reports
+    python run_reports.py --shard 2/3                      # static split: this host runs every 3rd unit
+    python run_reports.py --queue runs.db --workers 4      # 4 local processes claim units from a SQLite queue
+    python run_reports.py --workers 2 --threads 3          # 3 concurrent units per process
+    python run_reports.py --threads 4 --odoo-concurrency 3 # at most 3 Odoo calls in flight per process
+
+Reports generated by Odoo as xlsx files are all triggered first; their downloads are
+collected between the other units as soon as the server has built them.
+Units run earliest SLA deadline first (see ``priority``/``sla`` in report_registry); when
+the Odoo budget is saturated, urgent reports get the next free slot and the rest wait.
+Several hosts can share one run by pointing ``--queue`` at the same file; the first
+worker queues the units and every worker keeps claiming until the queue is drained.
+"""
+import os
+import sys
+import time
+import socket
+import logging
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+import date_windows
+import odoo_client
+import report_download
+import report_registry
+import transform_pool
+import wizards
+from odoo_client import OdooClient
+from work_queue import DEFAULT_LEASE_SECONDS, DEFAULT_MAX_ATTEMPTS, Heartbeat, WorkQueue
+
+logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+log = logging.getLogger()
+
+IDLE_POLL_SECONDS = 5
+
+
+def parse_shard(value):
+    index, _, count = value.partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid shard {value!r}, expected I/N")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"invalid shard {value!r}, I must be between 1 and N")
+    return index, count
+
+
+def select_units(reports, shard=None, run_started=None):
+    units = report_registry.build_units(reports)
+    if shard:
+        # Sliced in workflow order so every host computes the same split
+        index, count = shard
+        units = units[index - 1::count]
+    return report_registry.order_units(units, run_started or time.time())
+
+
+def describe(report, company_id, window):
+    return f"{report}[{company_id}{'/' + window if window else ''}]"
+
+
+def check_sla(name, deadline, finished_at, run_started):
+    """Log a unit that landed after its deadline; returns True on a miss."""
+    if finished_at <= deadline:
+        return False
+    log.warning(f"⏰ SLA miss: {name} landed {(finished_at - run_started) / 60:.1f} min into the run, "
+                f"{(finished_at - deadline) / 60:.1f} min past its deadline")
+    return True
+
+
+# ===== Direct run =====
+def run_units(units, run_started):
+    client = OdooClient()
+    client.login()
+    failed, missed = [], 0
+
+    # Odoo builds the xlsx reports on its side: start them all, collect them as they finish
+    pending, owners, remaining = [], {}, {}
+    for unit in units:
+        if not report_registry.is_xlsx(unit[0]):
+            continue
+        name = describe(*unit)
+        try:
+            reports = report_registry.trigger_unit(client, unit[0], unit[1])
+        except Exception as e:
+            log.error(f"❌ {name} failed: {e}")
+            failed.append(unit)
+            continue
+        log.info(f"🚀 {name} triggered")
+        pending += reports
+        owners.update((r, unit) for r in reports)
+        remaining[unit] = len(reports)
+
+    def collected(reports):
+        nonlocal missed
+        for r in reports:
+            unit = owners[r]
+            name = describe(*unit)
+            if r.error is not None:
+                if unit not in failed:
+                    failed.append(unit)
+                continue
+            remaining[unit] -= 1
+            if remaining[unit] or unit in failed:
+                continue
+            log.info(f"⏱️ {name} done in {r.finished_at - r.triggered_at:.1f}s")
+            missed += check_sla(name, report_registry.deadline(unit[0], run_started), r.finished_at, run_started)
+
+    for report, company_id, window in units:
+        if report_registry.is_xlsx(report):
+            continue
+        collected(report_download.collect(pending, block=False))
+        started = time.time()
+        name = describe(report, company_id, window)
+        log.info(f"\n▶ {name}")
+        try:
+            report_registry.run_unit(client, report, company_id, window)
+        except Exception as e:
+            log.error(f"❌ {name} failed: {e}")
+            failed.append((report, company_id, window))
+            continue
+        log.info(f"⏱️ {name} done in {time.time() - started:.1f}s")
+        missed += check_sla(name, report_registry.deadline(report, run_started), time.time(), run_started)
+    collected(report_download.collect(pending))
+    wizards.release_all()
+    transform_pool.shutdown()
+    if missed:
+        log.warning(f"⏰ {missed} unit(s) missed their SLA")
+    return failed
+
+
+# ===== Queue worker =====
+def claim_loop(queue, worker, max_attempts):
+    client = OdooClient()
+    client.login()
+    done = 0
+
+    while True:
+        unit = queue.claim(worker)
+        if unit is None:
+            if not queue.outstanding():
+                break
+            # Other workers still hold units; wait in case one of them dies and its lease expires
+            time.sleep(IDLE_POLL_SECONDS)
+            continue
+
+        name = describe(unit["report"], unit["company_id"], unit["window"])
+        log.info(f"\n▶ {worker} claimed {name} (attempt {unit['attempts']}/{max_attempts})")
+        started = time.time()
+        try:
+            with Heartbeat(queue, unit["id"], worker):
+                report_registry.run_unit(client, unit["report"], unit["company_id"], unit["window"])
+        except Exception as e:
+            log.error(f"❌ {name} failed on {worker}: {e}")
+            queue.release(unit["id"], worker, error=str(e))
+            continue
+        finished_at = queue.complete(unit["id"], worker)
+        done += 1
+        log.info(f"⏱️ {name} done in {finished_at - started:.1f}s")
+        if unit["deadline"] is not None:
+            # The deadline was set by whoever queued the run, relative to its start
+            sla_minutes = report_registry.schedule(unit["report"])[1]
+            check_sla(name, unit["deadline"], finished_at, unit["deadline"] - sla_minutes * 60)
+
+    log.info(f"👋 {worker} finished, {done} unit(s) completed")
+
+
+def worker_loop(queue_path, lease_seconds, max_attempts, threads=1):
+    """One worker process; with ``threads`` > 1 it runs several units at once, each with its own
+    Odoo session, while their xlsx/DataFrame work goes to the transform pool."""
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    queue = WorkQueue(queue_path, lease_seconds=lease_seconds, max_attempts=max_attempts)
+    try:
+        if threads == 1:
+            claim_loop(queue, worker, max_attempts)
+            return
+        pool = [threading.Thread(target=claim_loop, args=(queue, f"{worker}/{i}", max_attempts))
+                for i in range(1, threads + 1)]
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+    finally:
+        # Worker processes leave through os._exit, without atexit hooks
+        wizards.release_all()
+        # A worker process waits for its children on exit, so the pool must be stopped first
+        transform_pool.shutdown()
+
+
+def run_queue(queue_path, units, workers, lease_seconds, max_attempts, reset=False, threads=1, run_started=None):
+    queue = WorkQueue(queue_path, lease_seconds=lease_seconds, max_attempts=max_attempts)
+    if reset:
+        queue.reset()
+    run_started = run_started or time.time()
+    queue.enqueue([(report, company_id, window, report_registry.schedule(report)[0],
+                    report_registry.deadline(report, run_started))
+                   for report, company_id, window in units])
+
+    if workers == 1:
+        worker_loop(queue_path, lease_seconds, max_attempts, threads)
+    else:
+        processes = [multiprocessing.Process(target=worker_loop, args=(queue_path, lease_seconds, max_attempts, threads))
+                     for _ in range(workers)]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+
+    log.info(f"📋 Queue summary: {queue.summary()}")
+    missed = queue.sla_misses()
+    if missed:
+        log.warning(f"⏰ {len(missed)} unit(s) missed their SLA: "
+                    + ", ".join(describe(u["report"], u["company_id"], u["window"]) for u in missed))
+    failed = queue.failures()
+    for unit in failed:
+        log.error(f"🚫 {describe(unit['report'], unit['company_id'], unit['window'])}: {unit['error']}")
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run report scripts, optionally sharded or from a work queue")
+    parser.add_argument("reports", nargs="*", help="report scripts to run (default: all)")
+    parser.add_argument("--shard", type=parse_shard, metavar="I/N", help="only run the I-th of N static slices")
+    parser.add_argument("--queue", metavar="PATH", help="SQLite work queue shared by all workers")
+    parser.add_argument("--workers", type=int, default=1, help="local worker processes (default 1)")
+    parser.add_argument("--threads", type=int, default=1,
+                        help="units run concurrently inside each worker process (default 1)")
+    parser.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS,
+                        help="seconds without heartbeat before a claimed unit is handed to another worker")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help="attempts per unit before it is marked failed")
+    parser.add_argument("--reset", action="store_true", help="empty the queue before queueing this run")
+    parser.add_argument("--odoo-concurrency", type=int, default=odoo_client.BUDGET.limit,
+                        help="Odoo calls in flight per worker process, urgent reports first (default: unlimited)")
+    args = parser.parse_args()
+
+    # Worker processes inherit the budget through the environment
+    os.environ["ODOO_MAX_CONCURRENCY"] = str(args.odoo_concurrency)
+    odoo_client.BUDGET.limit = args.odoo_concurrency
+
+    run_started = time.time()
+    # Every unit of the run, in any worker process, resolves its dates against the same day
+    os.environ[date_windows.RUN_DATE_ENV] = date_windows.run_date().isoformat()
+    units = select_units(args.reports, args.shard, run_started)
+    log.info(f"🧩 {len(units)} unit(s) selected")
+
+    if args.queue or args.workers > 1 or args.threads > 1:
+        queue_path = args.queue or os.path.join(tempfile.mkdtemp(), "run_reports.db")
+        failed = run_queue(queue_path, units, args.workers, args.lease, args.max_attempts,
+                           reset=args.reset, threads=args.threads, run_started=run_started)
+    else:
+        failed = run_units(units, run_started)
+
+    sys.exit(1 if failed else 0)
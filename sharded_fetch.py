@@ -0,0 +1,114 @@
+"""Parallel fetch of large stock reads, split into independent shards.
+
+Offset pages of one big stock.opening.closing / stock.ageing read are served one
+after the other by a single sorted query. With SHARDED_FETCH=1 a read of at least
+SHARDED_FETCH_MIN_ROWS rows (default 5000, from ``search_count``) is split into
+FETCH_SHARDS shards (default 4):
+
+* by product category: the categories the filter selects are counted one by one
+  and packed into shards of about the same size (largest first);
+* by record id range, for a category larger than a shard or a domain without a
+  single category filter.
+
+Shards are read concurrently, each page by page, so several server workers share
+the work. Every call still goes through the shared Odoo budget
+(``--odoo-concurrency``), which caps how many run at once.
+"""
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import page_tuner
+from category_domains import compile_domain, load_categories
+
+log = logging.getLogger(__name__)
+
+ENABLED = os.getenv("SHARDED_FETCH", "").strip().lower() in ("1", "true", "yes")
+SHARDS = int(os.getenv("FETCH_SHARDS", 4))
+MIN_ROWS = int(os.getenv("SHARDED_FETCH_MIN_ROWS", 5000))
+
+
+def _category_leaf(client, domain):
+    """``(index, field, category ids)`` of the only category leaf of a plain AND domain, else None."""
+    if any(not isinstance(term, (list, tuple)) for term in domain):
+        return None
+    leaves = [(i, term) for i, term in enumerate(domain) if term[0].endswith("categ_id")
+              and term[1] in ("child_of", "in", "=")]
+    if len(leaves) != 1:
+        return None
+    i, (field, operator, value) = leaves[0]
+    ids = set(value if isinstance(value, (list, tuple)) else [value])
+    if operator == "child_of":
+        children = {}
+        for c in load_categories(client):
+            if c["parent_id"]:
+                children.setdefault(c["parent_id"], []).append(c["id"])
+        stack = list(ids)
+        while stack:
+            for child in children.get(stack.pop(), ()):
+                if child not in ids:
+                    ids.add(child)
+                    stack.append(child)
+    return i, field, sorted(ids)
+
+
+def _id_ranges(client, model, domain, context, parts):
+    ids = sorted(client.call_kw(model, "search", [domain], {"context": context}))
+    size = -(-len(ids) // parts) if ids else 0
+    return [list(domain) + [["id", ">=", ids[k]], ["id", "<=", ids[min(k + size, len(ids)) - 1]]]
+            for k in range(0, len(ids), size or 1)]
+
+
+def plan(client, model, domain, context, shards=SHARDS):
+    """Split ``domain`` into at most ``shards`` (about) equally sized domains; returns (domains, row count)."""
+    domain = compile_domain(client, domain)
+    total = page_tuner.count(client, model, domain, context)
+    if shards < 2 or total < MIN_ROWS:
+        return [domain], total
+    target = total / shards
+
+    leaf = _category_leaf(client, domain)
+    if leaf is None:
+        return _id_ranges(client, model, domain, context, shards), total
+
+    index, field, categories = leaf
+    if not categories:
+        return [domain], total
+    per_category = [domain[:index] + [[field, "=", cid]] + domain[index + 1:] for cid in categories]
+    with ThreadPoolExecutor(max_workers=min(8, len(per_category))) as pool:
+        counts = list(pool.map(lambda d: page_tuner.count(client, model, d, context), per_category))
+
+    bins = [[0, []] for _ in range(shards)]
+    oversized = []
+    for count, cat_domain in sorted(zip(counts, per_category), key=lambda pair: -pair[0]):
+        if not count:
+            continue
+        if count > target * 1.5:
+            # Too big for one shard: cut it by id range instead
+            oversized.append((count, cat_domain))
+            continue
+        smallest = min(bins, key=lambda b: b[0])
+        smallest[0] += count
+        smallest[1].append(cat_domain[index][2])
+    domains = [domain[:index] + [[field, "in", cids]] + domain[index + 1:] for _, cids in bins if cids]
+    for count, cat_domain in oversized:
+        domains += _id_ranges(client, model, cat_domain, context, max(2, round(count / target)))
+    return domains, total
+
+
+def _read_shard(client, model, specification, domain, context):
+    return [rec for page in page_tuner.iter_pages(client, model, specification, domain, context) for rec in page]
+
+
+def fetch(client, model, specification, domain, context, shards=SHARDS):
+    """Every record of ``model`` matching ``domain``, read shard by shard in parallel, in id order."""
+    domains, total = plan(client, model, domain, context, shards)
+    if len(domains) == 1:
+        records = _read_shard(client, model, specification, domains[0], context)
+    else:
+        log.info(f"🧩 {model}: {total} rows split into {len(domains)} shards")
+        with ThreadPoolExecutor(max_workers=len(domains), thread_name_prefix="shard") as pool:
+            parts = list(pool.map(lambda d: _read_shard(client, model, specification, d, context), domains))
+        records = sorted((rec for part in parts for rec in part), key=lambda rec: rec["id"])
+    page_tuner.check_total(model, len(records), total)
+    return records
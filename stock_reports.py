@@ -0,0 +1,185 @@
+"""Odoo steps shared by the stock scripts: forecast wizard, server-side compute and report fetch."""
+import os
+import re
+import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import page_tuner
+import sharded_fetch
+import wizards
+from category_domains import compile_domain
+from odoo_client import OdooError, flatten_record
+
+log = logging.getLogger(__name__)
+
+FORECAST_MODEL = "stock.forecast.report"
+CACHE_DIR = os.getenv("ODOO_CACHE_DIR", ".cache")
+
+# ===== Field specifications =====
+OPENING_CLOSING_SPEC = {
+    "product_category": {"fields": {"display_name": {}}},
+    "classification_id": {"fields": {"display_name": {}}},
+    "cloing_qty": {},
+    "cloing_value": {},
+    "lot_id": {"fields": {"display_name": {}}},
+    "issue_qty": {},
+    "issue_value": {},
+    "product_id": {"fields": {"display_name": {}}},
+    "pr_code": {},
+    "landed_cost": {},
+    "opening_qty": {},
+    "opening_value": {},
+    "po_type": {},
+    "lot_price": {},
+    "parent_category": {"fields": {"display_name": {}}},
+    "pur_price": {},
+    "receive_date": {},
+    "receive_qty": {},
+    "receive_value": {},
+    "rejected": {},
+    "shipment_mode": {},
+    "product_uom": {"fields": {"display_name": {}}},
+    "partner_id": {"fields": {"display_name": {}}},
+    "po_number": {},
+    "product_type": {"fields": {"display_name": {}}},
+    "item_category": {"fields": {"display_name": {}}},
+}
+
+# Closing qty/value with the lot's rejected / slow-move / unusable flags
+UNUSABLE_SPEC = {
+    "item_category": {"fields": {"display_name": {}}},
+    "product_id": {"fields": {"display_name": {}}},
+    "parent_category": {"fields": {"display_name": {}}},
+    "product_type": {"fields": {"display_name": {}}},
+    "pr_code": {},
+    "product_uom": {"fields": {"display_name": {}}},
+    "lot_id": {
+        "fields": {
+            "display_name": {},
+            "rejected": {},
+            "slow_move": {},
+            "unusable": {},
+            "unusable_actions": {}
+        }
+    },
+    "receive_date": {},
+    "classification_id": {"fields": {"display_name": {}}},
+    "cloing_qty": {},
+    "cloing_value": {},
+}
+
+# ===== Category filters =====
+RM_DOMAIN = [["product_id.categ_id.complete_name", "ilike", "All / RM"]]
+SPARE_PARTS_DOMAIN = [["product_id.categ_id.complete_name", "ilike", "All / Spare Parts"]]
+SPARE_DOMAIN = [["product_id.categ_id.complete_name", "ilike", "All / Spare"]]
+
+
+# ===== Wizard =====
+def create_forecast_wizard(client, company_id, from_date, to_date):
+    wizard_id = wizards.save(
+        client, FORECAST_MODEL, company_id,
+        {"from_date": from_date, "to_date": to_date},
+        {"allowed_company_ids": [company_id], "company_id": company_id},
+    )
+    log.info(f"🪄 Wizard {wizard_id} ready for company {company_id}")
+    return wizard_id
+
+def save_forecast_wizard(client, company_id, report_type, report_for, from_date, to_date):
+    """Create (or reuse) a typed wizard (``ageing``, ``rmstock``, ...) through ``web_save``."""
+    wizard_id = wizards.save(
+        client, FORECAST_MODEL, company_id,
+        {
+            "report_type": report_type,
+            "report_for": report_for,
+            "all_iteam_list": [],
+            "from_date": from_date,
+            "to_date": to_date,
+        },
+        client.context(company_id),
+        specification={
+            "report_type": {},
+            "report_for": {},
+            "all_iteam_list": {"fields": {"display_name": {}}},
+            "from_date": {},
+            "to_date": {},
+        },
+        kind=f"{report_type}/{report_for}",
+    )
+    log.info(f"🪄 {report_type} wizard {wizard_id} ready for company {company_id}")
+    return wizard_id
+
+def compute_forecast(client, company_id, wizard_id):
+    result = client.call_button(
+        FORECAST_MODEL, "print_date_wise_stock_register",
+        [[wizard_id]], {"context": client.context(company_id)},
+    )
+    log.info(f"⚡ Forecast computed for wizard {wizard_id} (company {company_id})")
+    return result
+
+
+# ===== Result set =====
+_user_locks = {}
+_user_locks_lock = threading.Lock()
+_held = threading.local()
+
+
+@contextmanager
+def result_set(client):
+    """Hold the user's report rows from a wizard's compute until they have been read.
+
+    Odoo keeps one computed stock.opening.closing / stock.ageing result set per user, whatever
+    wizard or session computed it, so the next compute replaces the rows. Windows of one user
+    computed at the same time (window threads, queue workers) take turns here: a lock per user
+    shared by the threads, and a lock file in ODOO_CACHE_DIR shared by the processes. A thread
+    already holding it can enter again.
+    """
+    key = re.sub(r"\W+", "_", f"{client.db or 'odoo'}_{client.username or 'user'}")
+    with _user_locks_lock:
+        lock = _user_locks.setdefault(key, threading.RLock())
+    held = _held.__dict__.setdefault("depth", {})
+    with lock:
+        if held.get(key):
+            held[key] += 1
+            try:
+                yield
+            finally:
+                held[key] -= 1
+            return
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(os.path.join(CACHE_DIR, f"result_set_{key}.lock"), "w") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            held[key] = 1
+            try:
+                yield
+            finally:
+                held[key] = 0
+
+
+# ===== Fetch =====
+def report_context(company_id, wizard_id=0):
+    return {"allowed_company_ids": [company_id], "company_id": company_id,
+            "active_model": FORECAST_MODEL, "active_id": wizard_id, "active_ids": [wizard_id]}
+
+def fetch_report_rows(client, model, specification, domain, company_id, cname, wizard_id=0,
+                      flatten=flatten_record, context=None):
+    """Read the rows a computed wizard left in ``model`` and flatten them for pandas."""
+    context = context or report_context(company_id, wizard_id)
+    try:
+        if sharded_fetch.ENABLED:
+            flattened = [flatten(rec) for rec in sharded_fetch.fetch(client, model, specification, domain, context)]
+        else:
+            # Flattened page by page as the pages arrive
+            flattened = page_tuner.read_all(client, model, specification, compile_domain(client, domain), context,
+                                            label=cname, transform=flatten)
+    except OdooError as e:
+        log.error(f"❌ {cname}: Failed to parse report: {e.error}")
+        return []
+    log.info(f"📊 {cname}: {len(flattened)} rows fetched (flattened)")
+    return flattened
@@ -0,0 +1,118 @@
+"""Compact summary tabs (totals by category) published next to the detailed report sheets.
+
+The closing stock and ageing sheets are mostly pivoted downstream: closing value per
+category, ageing slot totals, ... With SUMMARY_TABS=1 the reports also publish those
+totals in a ``<worksheet>_summary`` tab, so the sheets no longer aggregate every lot
+row themselves:
+
+* when the report already holds its rows (one-shot or shared read) they are summed
+  locally with pandas;
+* otherwise (streaming mode, summary-only runs) Odoo sums them with ``read_group``
+  on the computed report model, and no rows are transferred.
+
+SUMMARY_ONLY=1 refreshes only the summary tabs (computing the wizard, but skipping the
+detailed read and paste), which is cheap enough to run more often than the full reports.
+"""
+import os
+import logging
+from datetime import datetime
+
+import pandas as pd
+import pytz
+from gspread.utils import rowcol_to_a1
+from gspread_dataframe import set_with_dataframe
+
+import gsheets
+from category_domains import compile_domain
+from odoo_client import OdooError
+
+log = logging.getLogger(__name__)
+
+ONLY = os.getenv("SUMMARY_ONLY", "").strip().lower() in ("1", "true", "yes")
+ENABLED = ONLY or os.getenv("SUMMARY_TABS", "").strip().lower() in ("1", "true", "yes")
+
+# ===== Summaries =====
+OPENING_CLOSING = {
+    "model": "stock.opening.closing",
+    "groupby": ["parent_category", "product_category"],
+    "measures": ["opening_qty", "opening_value", "receive_qty", "receive_value", "issue_qty", "issue_value",
+                 "cloing_qty", "cloing_value"],
+}
+
+AGEING = {
+    "model": "stock.ageing",
+    "groupby": ["parent_category", "product_category"],
+    "measures": ["slot_1", "slot_2", "slot_3", "slot_4", "slot_5", "slot_6", "cloing_qty", "cloing_value"],
+}
+
+
+def _group_value(value):
+    # read_group returns many2one groups as [id, display_name] and empty groups as False
+    if isinstance(value, (list, tuple)):
+        return value[1]
+    return value or ""
+
+
+def server_summary(client, summary, domain, context, labels=None):
+    """Totals of ``summary`` computed by Odoo with ``read_group`` over the report rows."""
+    labels = labels or {}
+    groups = client.call_kw(summary["model"], "read_group", [], {
+        "domain": compile_domain(client, domain),
+        "fields": [f"{m}:sum" for m in summary["measures"]],
+        "groupby": summary["groupby"],
+        "lazy": False,
+        "context": context,
+    })
+    rows = [{**{labels.get(f, f): _group_value(g.get(f)) for f in summary["groupby"]},
+             "Rows": g.get("__count", 0),
+             **{labels.get(m, m): g.get(m) or 0 for m in summary["measures"]}} for g in groups]
+    return pd.DataFrame(rows, columns=[labels.get(f, f) for f in summary["groupby"]] + ["Rows"]
+                        + [labels.get(m, m) for m in summary["measures"]])
+
+
+def local_summary(rows, summary, labels=None):
+    """The same totals as ``server_summary``, from rows flattened with ``labels``."""
+    labels = labels or {}
+    keys = [labels.get(f, f) for f in summary["groupby"]]
+    measures = [labels.get(m, m) for m in summary["measures"]]
+    df = pd.DataFrame(rows, columns=keys + measures)
+    df[keys] = df[keys].replace(False, "").fillna("")
+    df[measures] = df[measures].apply(pd.to_numeric, errors="coerce").fillna(0)
+    grouped = df.groupby(keys, sort=True)
+    result = grouped[measures].sum()
+    result.insert(0, "Rows", grouped.size())
+    return result.reset_index()
+
+
+def with_total(df):
+    if df.empty:
+        return df
+    total = {col: df[col].sum() if col == "Rows" or pd.api.types.is_numeric_dtype(df[col]) else "" for col in df}
+    total[df.columns[0]] = "Total"
+    return pd.concat([df.sort_values(list(df.columns[:df.columns.get_loc("Rows")])), pd.DataFrame([total])],
+                     ignore_index=True)
+
+
+def publish(client, summary, company_id, cname, sheet_key, worksheet_name, domain, context, rows=None, labels=None):
+    """Compute the summary (locally from ``rows`` when given, else with ``read_group``) and paste it."""
+    try:
+        if rows is not None:
+            df, source = local_summary(rows, summary, labels), "local rows"
+        else:
+            df, source = server_summary(client, summary, domain, context, labels), "read_group"
+    except OdooError as e:
+        log.error(f"❌ {cname}: read_group on {summary['model']} failed: {e}")
+        return None
+    df = with_total(df)
+    if df.empty:
+        log.warning(f"⚠️ {cname}: empty summary, {worksheet_name}_summary left as is")
+        return df
+
+    tab = f"{worksheet_name}_summary"
+    worksheet = gsheets.get_worksheet(sheet_key, tab, create=True)
+    worksheet.clear()
+    set_with_dataframe(worksheet, df)
+    local_time = datetime.now(pytz.timezone("Asia/Dhaka")).strftime("%Y-%m-%d %H:%M:%S")
+    worksheet.update([[local_time]], rowcol_to_a1(2, len(df.columns) + 2))
+    log.info(f"🧾 {cname}: {len(df) - 1} summary rows ({source}) pasted into {tab}")
+    return df
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import date_windows  # noqa: E402
+
+
+@pytest.fixture
+def run_on(monkeypatch):
+    """Resolve the windows of a fresh run against a given date, without FROM_DATE / TO_DATE."""
+    for name in ("FROM_DATE", "TO_DATE", date_windows.RUN_DATE_ENV):
+        monkeypatch.delenv(name, raising=False)
+
+    def start(today):
+        date_windows.new_run(today)
+
+    yield start
+    date_windows.new_run()
@@ -0,0 +1,47 @@
+import cumulative_stock
+
+
+def row(row_id, lot, opening, receive, issue, rejected="Ok"):
+    """An opening/closing row; issues are negative, as in Odoo."""
+    closing = opening + receive + issue
+    return {"id": row_id, "product_id": "P", "lot_id": lot, "rejected": rejected,
+            "opening_qty": opening, "opening_value": opening * 2, "receive_qty": receive, "receive_value": receive * 2,
+            "issue_qty": issue, "issue_value": issue * 2, "cloing_qty": closing, "cloing_value": closing * 2}
+
+
+def test_month_windows():
+    assert cumulative_stock.month_windows("2025-01-15", "2025-03-10") == [
+        ("2025-01-15", "2025-01-31"), ("2025-02-01", "2025-02-28"), ("2025-03-01", "2025-03-10")]
+
+
+def test_rows_of_one_lot_in_a_month_are_summed():
+    lots = cumulative_stock._by_lot([row(1, "L1", 5, 2, -1), row(2, "L1", 3, 0, -1)])
+    assert lots[("P", "L1")]["opening_qty"] == 8 and lots[("P", "L1")]["cloing_qty"] == 8
+
+
+def test_chained_months_combine():
+    months = [("2025-01-01", cumulative_stock._by_lot([row(1, "L1", 10, 5, -3)])),
+              ("2025-02-01", cumulative_stock._by_lot([row(1, "L1", 12, 1, -2, rejected="Reject")]))]
+    assert cumulative_stock.reconcile(months) == []
+    [combined] = cumulative_stock.combine(months)
+    assert [combined[f] for f in ("opening_qty", "receive_qty", "issue_qty", "cloing_qty")] == [10, 6, -5, 11]
+    assert combined["issue_value"] == -10
+    # A flag, not a quantity: the latest month's value
+    assert combined["rejected"] == "Reject"
+
+
+def test_reconcile_tells_gaps_from_breaks():
+    months = [("2025-01-01", cumulative_stock._by_lot([row(1, "L1", 10, 5, -3), row(2, "L2", 4, 0, 0)])),
+              ("2025-02-01", cumulative_stock._by_lot([row(1, "L1", 11, 1, -2)]))]
+    mismatches = {(key, field): in_both for _, key, field, _, _, in_both in cumulative_stock.reconcile(months)}
+    # L1 opens with 11 after closing with 12: a break; L2 has no February row: a gap
+    assert mismatches == {(("P", "L1"), "opening_qty"): True, (("P", "L1"), "opening_value"): True,
+                          (("P", "L2"), "opening_qty"): False, (("P", "L2"), "opening_value"): False}
+
+
+def test_gap_lot_is_kept_as_reported():
+    months = [("2025-01-01", cumulative_stock._by_lot([row(1, "L1", 10, 0, 0), row(2, "L2", 4, 0, 0)])),
+              ("2025-02-01", cumulative_stock._by_lot([row(1, "L1", 10, 2, 0)]))]
+    combined = {r["lot_id"]: r for r in cumulative_stock.combine(months)}
+    assert combined["L2"]["cloing_qty"] == 4
+    assert combined["L1"]["cloing_qty"] == 12 and combined["L1"]["receive_qty"] == 2
@@ -0,0 +1,61 @@
+from datetime import date
+
+import pytest
+
+import date_windows
+from date_windows import Window
+
+
+def test_policies(run_on):
+    run_on(date(2025, 3, 15))
+    assert date_windows.resolve("mtd") == Window("2025-03-01", "2025-03-15")
+    assert date_windows.resolve("mt_yesterday") == Window("2025-03-01", "2025-03-14")
+    assert date_windows.resolve("prev_month") == Window("2025-02-01", "2025-02-28")
+    assert date_windows.resolve("month") == Window("2025-03-01", "2025-03-31")
+
+
+def test_month_to_yesterday_on_the_first(run_on):
+    run_on(date(2025, 3, 1))
+    assert date_windows.resolve("mt_yesterday") == Window("2025-02-01", "2025-02-28")
+
+
+def test_rollover(run_on):
+    run_on(date(2025, 3, 2))
+    assert date_windows.resolve("mtd", rollover_days=2) == Window("2025-02-01", "2025-02-28")
+    assert date_windows.resolve("mtd", rollover_days=1) == Window("2025-03-01", "2025-03-02")
+
+
+def test_ci_to_date_moves_open_windows_only(run_on, monkeypatch):
+    # The workflow always exports TO_DATE as the day of the run
+    run_on(date(2025, 3, 15))
+    monkeypatch.setenv("FROM_DATE", "")
+    monkeypatch.setenv("TO_DATE", "2025-03-10")
+    assert date_windows.resolve("mtd") == Window("2025-03-01", "2025-03-10")
+    assert date_windows.resolve("prev_month", env=False) == Window("2025-02-01", "2025-02-28")
+    assert date_windows.resolve("mt_yesterday", env=False) == Window("2025-03-01", "2025-03-14")
+    assert date_windows.as_of("prev_month", env=False) == Window(False, "2025-02-28")
+
+
+def test_from_date_applies_to_as_of(run_on, monkeypatch):
+    run_on(date(2025, 3, 15))
+    monkeypatch.setenv("FROM_DATE", "2025-01-01")
+    assert date_windows.as_of("mtd") == Window("2025-01-01", "2025-03-15")
+    assert date_windows.as_of("mtd", env=False) == Window(False, "2025-03-15")
+
+
+def test_run_date_from_env(run_on, monkeypatch):
+    run_on(None)
+    monkeypatch.setenv(date_windows.RUN_DATE_ENV, "2024-12-31")
+    assert date_windows.resolve("mtd", env=False) == Window("2024-12-01", "2024-12-31")
+
+
+def test_bad_dates(run_on, monkeypatch):
+    run_on(date(2025, 3, 15))
+    with pytest.raises(ValueError):
+        date_windows.resolve("fortnight")
+    monkeypatch.setenv("TO_DATE", "15/03/2025")
+    with pytest.raises(ValueError):
+        date_windows.resolve("mtd")
+    monkeypatch.setenv("TO_DATE", "2025-02-01")
+    with pytest.raises(ValueError):
+        date_windows.resolve("since", start="2025-03-01")
@@ -0,0 +1,56 @@
+from datetime import date
+
+import pandas as pd
+
+import roll_forward
+
+
+def segment(*lots):
+    """A segment's rows from ``(lot, opening, receive, issue)``; issues are negative, as in Odoo."""
+    return pd.DataFrame([{"id": i, "product_id": "P", "lot_id": lot,
+                          "opening_qty": opening, "opening_value": opening * 2,
+                          "receive_qty": receive, "receive_value": receive * 2,
+                          "issue_qty": issue, "issue_value": issue * 2,
+                          "cloing_qty": opening + receive + issue, "cloing_value": (opening + receive + issue) * 2}
+                         for i, (lot, opening, receive, issue) in enumerate(lots, 1)])
+
+
+def test_roll_chains_segments():
+    rolled, reported = roll_forward.roll([segment(("L1", 10, 5, -3)), segment(("L1", 12, 1, -2))])
+    assert rolled.loc[("P", "L1"), ["opening_qty", "receive_qty", "issue_qty", "cloing_qty"]].tolist() == [10, 6, -5, 11]
+    assert rolled.loc[("P", "L1"), "cloing_value"] == 22
+    assert not len(roll_forward.unreported(reported))
+    assert not len(roll_forward.mismatches(rolled, reported))
+
+
+def test_lot_missing_from_last_segment_is_unreported():
+    rolled, reported = roll_forward.roll([segment(("L1", 10, 5, -3), ("L2", 4, 0, 0)), segment(("L1", 12, 1, -2))])
+    # L2 rolls to the closing it was last seen with, which nothing can check
+    assert rolled.loc[("P", "L2"), "cloing_qty"] == 4
+    assert list(roll_forward.unreported(reported)) == [("P", "L2")]
+
+
+def test_segment_that_does_not_chain_mismatches():
+    # A back-dated posting: the second segment opens with 11, not the 12 the first one closed with
+    rolled, reported = roll_forward.roll([segment(("L1", 10, 5, -3)), segment(("L1", 11, 1, -2))])
+    assert not len(roll_forward.unreported(reported))
+    assert list(roll_forward.mismatches(rolled, reported)) == [("P", "L1")]
+
+
+def test_lot_new_in_a_later_segment():
+    rolled, reported = roll_forward.roll([segment(("L1", 10, 0, 0)), segment(("L1", 10, 0, 0), ("L2", 0, 7, -1))])
+    assert rolled.loc[("P", "L2"), ["opening_qty", "cloing_qty"]].tolist() == [0, 6]
+    assert not len(roll_forward.mismatches(rolled, reported))
+
+
+def test_segments(monkeypatch):
+    monkeypatch.setattr(roll_forward.period_cache, "GRACE_DAYS", 2)
+    today = date(2025, 3, 10)
+    assert roll_forward.segments("2025-02-01", "2025-03-10", today) == [
+        ("2025-02-01", "2025-02-28", "month"),
+        ("2025-03-01", "2025-03-01", "day"), ("2025-03-02", "2025-03-02", "day"),
+        ("2025-03-03", "2025-03-03", "day"), ("2025-03-04", "2025-03-04", "day"),
+        ("2025-03-05", "2025-03-05", "day"), ("2025-03-06", "2025-03-06", "day"),
+        ("2025-03-07", "2025-03-07", "day"),
+        ("2025-03-08", "2025-03-10", None),
+    ]
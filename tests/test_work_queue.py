@@ -0,0 +1,67 @@
+import pytest
+
+from work_queue import WorkQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return WorkQueue(str(tmp_path / "queue.db"), lease_seconds=60, max_attempts=2)
+
+
+def expire_lease(queue, unit_id):
+    queue.db.execute("UPDATE units SET heartbeat = heartbeat - ? WHERE id = ?", (queue.lease_seconds + 1, unit_id))
+
+
+def test_enqueue_skips_queued_units(queue):
+    assert queue.enqueue([("Closing_stock", 1, "", 5, None), ("Closing_stock", 3, "", 5, None)]) == 2
+    assert queue.enqueue([("Closing_stock", 1, "", 5, None)]) == 0
+    assert queue.summary() == {"pending": 2}
+
+
+def test_claim_order_and_exclusivity(queue):
+    queue.enqueue([("late", 1, "", 1, None), ("urgent", 1, "", 9, 100.0), ("low", 1, "", 9, None)])
+    first, second, third = (queue.claim(f"w{i}") for i in range(3))
+    assert [first["report"], second["report"], third["report"]] == ["urgent", "late", "low"]
+    assert first["attempts"] == 1 and first["worker"] == "w0"
+    assert queue.claim("w3") is None
+
+
+def test_expired_lease_is_reclaimed(queue):
+    queue.enqueue([("Closing_stock", 1, "", 5, None)])
+    unit = queue.claim("a")
+    assert queue.claim("b") is None
+    expire_lease(queue, unit["id"])
+    taken = queue.claim("b")
+    assert taken["id"] == unit["id"] and taken["attempts"] == 2
+    # The first worker lost the unit
+    assert not queue.heartbeat(unit["id"], "a")
+    assert queue.heartbeat(unit["id"], "b")
+
+
+def test_expired_lease_without_attempts_left_fails(queue):
+    queue.enqueue([("Closing_stock", 1, "", 5, None)])
+    for worker in ("a", "b"):
+        unit = queue.claim(worker)
+        expire_lease(queue, unit["id"])
+    assert queue.claim("c") is None
+    [failed] = queue.failures()
+    assert failed["error"] == "lease expired" and queue.outstanding() == 0
+
+
+def test_release_retries_then_fails(queue):
+    queue.enqueue([("Closing_stock", 1, "", 5, None)])
+    unit = queue.claim("a")
+    queue.release(unit["id"], "a", "timeout")
+    assert queue.summary() == {"pending": 1}
+    unit = queue.claim("b")
+    queue.release(unit["id"], "b", "timeout again")
+    assert queue.summary() == {"failed": 1}
+    assert queue.failures()[0]["error"] == "timeout again"
+    assert queue.claim("c") is None
+
+
+def test_complete(queue):
+    queue.enqueue([("Closing_stock", 1, "", 5, None)])
+    unit = queue.claim("a")
+    queue.complete(unit["id"], "a")
+    assert queue.summary() == {"done": 1} and queue.outstanding() == 0
@@ -0,0 +1,157 @@
+"""Process pool for the CPU-bound DataFrame / xlsx steps of the report scripts.
+
+``pd.read_excel``, ``DataFrame.to_excel`` and the ``replace(False, "")`` clean-up hold
+the GIL; run in this pool they leave the calling process free for network I/O of
+other reports running in threads. Frames cross the process boundary as Arrow IPC
+streams in shared memory when ``pyarrow`` is installed and fall back to pickling
+otherwise (or for object columns Arrow cannot type, e.g. ``False`` mixed with text).
+
+Set TRANSFORM_WORKERS=0 to run everything inline.
+"""
+import os
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+log = logging.getLogger(__name__)
+
+WORKERS = int(os.getenv("TRANSFORM_WORKERS", min(4, os.cpu_count() or 1)))
+
+_pool = None
+_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _lock:
+        if _pool is None and WORKERS > 0:
+            # spawn: the callers may be multi-threaded, which does not mix with fork
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            log.info(f"🧮 Transform pool started with {WORKERS} worker(s)")
+        return _pool
+
+
+def shutdown():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+# ===== Frame transport =====
+# The producer of a shared-memory block stops tracking it and the consumer unlinks it,
+# so the block outlives the producer's call without being reported as leaked.
+def pack(df):
+    if pa is not None:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            return ("pickle", df)
+        # Size the stream first so it can be written straight into the shared block
+        mock = pa.MockOutputStream()
+        with pa.ipc.new_stream(mock, table.schema) as writer:
+            writer.write_table(table)
+        size = mock.size()
+        shm = SharedMemory(create=True, size=max(size, 1))
+        sink = pa.FixedSizeBufferWriter(pa.py_buffer(shm.buf))
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        sink.close()
+        del sink, writer
+        resource_tracker.unregister(shm._name, "shared_memory")
+        shm.close()
+        return ("arrow", shm.name, size)
+    return ("pickle", df)
+
+
+def unpack(handle):
+    if handle[0] == "pickle":
+        return handle[1]
+    _, name, size = handle
+    shm = SharedMemory(name=name)
+    try:
+        # One flat copy out of the block: to_pandas() may keep zero-copy views on its input,
+        # which would pin the shared memory after it is unlinked
+        data = pa.py_buffer(bytes(shm.buf[:size]))
+    finally:
+        shm.close()
+        shm.unlink()
+    return pa.ipc.open_stream(data).read_all().to_pandas()
+
+
+def discard(handle):
+    """Free a packed frame that was never unpacked (the consumer failed)."""
+    if handle[0] != "arrow":
+        return
+    try:
+        shm = SharedMemory(name=handle[1])
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+# ===== Jobs (run in the pool) =====
+def _write_excel_job(payload, path, drop_first_column):
+    df = unpack(payload) if isinstance(payload, tuple) else pd.DataFrame(payload)
+    if drop_first_column and df.shape[1] > 1:
+        df = df.iloc[:, 1:]
+    df.to_excel(path, index=False)
+    return path
+
+
+def _load_excel(path, drop_first_column, replace_false, fillna, read_kwargs):
+    df = pd.read_excel(path, **read_kwargs)
+    if drop_first_column and df.shape[1] > 1:
+        df = df.iloc[:, 1:]
+    if replace_false:
+        df = df.replace(False, "")
+    if fillna is not None:
+        df = df.fillna(fillna)
+    return df
+
+
+def _read_excel_job(path, drop_first_column, replace_false, fillna, read_kwargs):
+    return pack(_load_excel(path, drop_first_column, replace_false, fillna, read_kwargs))
+
+
+# ===== Public API =====
+def submit_write_excel(data, path, drop_first_column=False):
+    """Write ``data`` (records or a DataFrame) to ``path`` in the pool; returns a Future of the path."""
+    pool = get_pool()
+    if pool is None:
+        future = Future()
+        try:
+            future.set_result(_write_excel_job(data, path, drop_first_column))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    payload = pack(data) if isinstance(data, pd.DataFrame) else data
+    future = pool.submit(_write_excel_job, payload, path, drop_first_column)
+    if isinstance(payload, tuple):
+        future.add_done_callback(lambda f: f.exception() and discard(payload))
+    return future
+
+
+def write_excel(data, path, drop_first_column=False):
+    return submit_write_excel(data, path, drop_first_column).result()
+
+
+def read_excel(path, drop_first_column=False, replace_false=False, fillna=None, **read_kwargs):
+    """``pd.read_excel`` plus the usual sheet clean-up, parsed in the pool."""
+    pool = get_pool()
+    if pool is None:
+        return _load_excel(path, drop_first_column, replace_false, fillna, read_kwargs)
+    return unpack(pool.submit(_read_excel_job, path, drop_first_column, replace_false, fillna, read_kwargs).result())
+
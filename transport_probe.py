@@ -0,0 +1,81 @@
+"""Compare what a page of a model costs in each response shape Odoo offers.
+
+    python transport_probe.py --model stock.opening.closing --rows 5000
+    python transport_probe.py --model product.template --fields name,categ_id,qty_available
+
+The same records are read as ``web_search_read`` (nested dicts, the shape the reports
+use), ``search_read`` (flat dicts, many2ones as ``[id, name]``) and ``export_data``
+(one list per row). For each shape the probe logs bytes on the wire (after gzip / br
+when the server compresses), decoded bytes, bytes per row and decode time. These are
+the numbers needed to judge per model whether compression or an array shape is worth it.
+"""
+import sys
+import time
+import logging
+import argparse
+
+from odoo_client import OdooClient
+from stock_reports import OPENING_CLOSING_SPEC
+
+log = logging.getLogger(__name__)
+
+SPECS = {
+    "stock.opening.closing": OPENING_CLOSING_SPEC,
+}
+
+NAME_ONLY = {"fields": {"display_name": {}}}
+
+
+def specification_for(client, model, fields):
+    """A web_search_read specification for ``fields``, asking for the name of many2ones."""
+    info = client.call_kw(model, "fields_get", [], {"allfields": fields, "attributes": ["type"]})
+    return {f: NAME_ONLY if info.get(f, {}).get("type") == "many2one" else {} for f in fields}
+
+
+def probe(client, model, specification, context, rows):
+    """One read of the same ``rows`` records per shape; returns a dict of measurements per shape."""
+    ids = client.call_kw(model, "search", [[]], {"limit": rows, "context": context})
+    domain = [["id", "in", ids]]
+    fields = list(specification)
+    shapes = {
+        "web_search_read": lambda: client.web_search_read(model, specification, domain=domain, context=context,
+                                                          limit=len(ids)),
+        "search_read": lambda: client.call_kw(model, "search_read", [],
+                                              {"domain": domain, "fields": fields, "context": context}),
+        "export_data": lambda: client.export_rows(model, ids, fields, context),
+    }
+    results = {}
+    for shape, read in shapes.items():
+        started = time.monotonic()
+        read()
+        last = client.last_response
+        results[shape] = {"rows": len(ids), "wire": last.wire_bytes, "body": last.bytes,
+                          "decode": last.decode_seconds, "seconds": time.monotonic() - started}
+    return results
+
+
+if __name__ == "__main__":
+    logging.basicConfig(stream=sys.stdout, level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Measure the response shapes of an Odoo model")
+    parser.add_argument("--model", default="stock.opening.closing")
+    parser.add_argument("--fields", help="comma-separated fields (default: the report specification of --model)")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--company", type=int, default=1)
+    args = parser.parse_args()
+
+    client = OdooClient()
+    client.login()
+    if args.fields:
+        specification = specification_for(client, args.model, args.fields.split(","))
+    elif args.model in SPECS:
+        specification = SPECS[args.model]
+    else:
+        raise SystemExit(f"❌ No known specification for {args.model}, pass --fields")
+
+    results = probe(client, args.model, specification, client.context(args.company), args.rows)
+    baseline = results["web_search_read"]["wire"] or 1
+    for shape, r in results.items():
+        per_row = r["wire"] / max(r["rows"], 1)
+        log.info(f"📶 {shape:16} {r['rows']} rows: {r['wire'] / 1024:8.0f} kB wire ({r['wire'] / baseline:4.0%}), "
+                 f"{r['body'] / 1024:8.0f} kB decoded, {per_row:6.0f} B/row, decode {r['decode'] * 1000:5.0f} ms, "
+                 f"total {r['seconds']:.2f}s")
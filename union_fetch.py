@@ -0,0 +1,169 @@
+"""One stock.opening.closing read per company and window, shared by several reports.
+
+Closing_stock.py (All / RM), unuseable_stock.py (All / RM, lot flags) and
+Spares_stock.py (All / Spare Parts) each compute the same forecast wizard and scan
+stock.opening.closing for the same window. With UNION_FETCH=1 the first of them
+computes the wizard once and reads the union of their fields under an OR of their
+category filters. The rows are kept in memory and in ``.cache/`` for
+UNION_FETCH_TTL seconds (default 900). Each report then gets its rows by local
+category filtering and projection onto its own specification, so they have the
+same shape as its own read. ageing_engine takes its lots in stock from the same read.
+"""
+import os
+import pickle
+import logging
+import threading
+import time
+
+import page_tuner
+import pipeline
+import sharded_fetch
+from category_domains import compile_domain, load_categories, match_categories
+from date_windows import Window
+from odoo_client import flatten_record
+from stock_reports import (OPENING_CLOSING_SPEC, RM_DOMAIN, SPARE_PARTS_DOMAIN, UNUSABLE_SPEC,
+                           create_forecast_wizard, compute_forecast, report_context, result_set)
+
+log = logging.getLogger(__name__)
+
+ENABLED = os.getenv("UNION_FETCH", "").strip().lower() in ("1", "true", "yes")
+CACHE_DIR = os.getenv("ODOO_CACHE_DIR", ".cache")
+TTL = int(os.getenv("UNION_FETCH_TTL", 900))
+
+MODEL = "stock.opening.closing"
+
+# ===== Reads that share one window =====
+SHARED_READS = [
+    (OPENING_CLOSING_SPEC, RM_DOMAIN),       # Closing_stock
+    (UNUSABLE_SPEC, RM_DOMAIN),              # unuseable_stock
+    (OPENING_CLOSING_SPEC, SPARE_PARTS_DOMAIN),  # Spares_stock
+]
+
+
+def merge_specs(specs):
+    """Union of web_search_read specifications, merging nested ``fields``."""
+    merged = {}
+    for spec in specs:
+        for field, sub in spec.items():
+            if field in merged and sub.get("fields") and merged[field].get("fields"):
+                merged[field] = {"fields": merge_specs([merged[field]["fields"], sub["fields"]])}
+            elif field not in merged or sub.get("fields"):
+                merged[field] = sub
+    return merged
+
+
+def project(record, specification):
+    """Cut a union record down to what a read with ``specification`` would have returned."""
+    projected = {"id": record["id"]}
+    for field, sub in specification.items():
+        value = record.get(field, False)
+        if isinstance(value, dict) and sub.get("fields"):
+            value = {"id": value.get("id"), **{k: value.get(k, False) for k in sub["fields"]}}
+        projected[field] = value
+    return projected
+
+
+def _category_patterns(domain):
+    patterns = [term[2] for term in domain if isinstance(term, (list, tuple)) and term[1] == "ilike"
+                and term[0] == "product_id.categ_id.complete_name"]
+    if len(patterns) != len(domain):
+        raise ValueError(f"Only product category filters can be shared, got {domain}")
+    return patterns
+
+
+# Every report reads the product category too, so rows can be split locally; the spares
+# ageing reports (ageing_engine) also need the work centres
+UNION_SPEC = merge_specs([spec for spec, _ in SHARED_READS]
+                         + [{"product_id": {"fields": {"display_name": {}, "categ_id": {}, "work_center": {}}},
+                             "lot_id": {"fields": {"display_name": {}, "work_center": {}}}}])
+
+
+def _union_domain(client):
+    domains = []
+    for _, domain in SHARED_READS:
+        if domain not in domains:
+            domains.append(domain)
+    compiled = [compile_domain(client, d) for d in domains]
+    return ["|"] * (len(compiled) - 1) + [leaf for domain in compiled for leaf in domain]
+
+
+# ===== Shared frame =====
+_frames = {}
+_locks = {}
+_lock = threading.Lock()
+
+
+def _evict(now):
+    """Drop the windows whose rows have expired, with their locks unless a read holds one (under ``_lock``)."""
+    for key, (stamp, _) in list(_frames.items()):
+        if now - stamp >= TTL:
+            _frames.pop(key, None)
+            if key in _locks and not _locks[key].locked():
+                del _locks[key]
+
+
+def _cache_path(client, company_id, from_date, to_date):
+    return os.path.join(CACHE_DIR, f"union_{client.db or 'odoo'}_{company_id}_{Window(from_date, to_date).key}.pkl")
+
+
+def _read_union(client, company_id, cname, from_date, to_date):
+    started = time.time()
+    with result_set(client):
+        wizard_id = create_forecast_wizard(client, company_id, from_date, to_date)
+        compute_forecast(client, company_id, wizard_id)
+        if sharded_fetch.ENABLED:
+            records = sharded_fetch.fetch(client, MODEL, UNION_SPEC, _union_domain(client),
+                                          report_context(company_id, wizard_id))
+        else:
+            records = page_tuner.read_all(client, MODEL, UNION_SPEC, _union_domain(client),
+                                          report_context(company_id, wizard_id),
+                                          page_size=pipeline.PAGE_SIZE, label=cname)
+    log.info(f"🧺 {cname}: {len(records)} shared opening/closing rows read in {time.time() - started:.1f}s")
+    return records
+
+
+def shared_rows(client, company_id, cname, from_date, to_date):
+    """The union rows of a company/window: from memory, from disk, or one wizard compute and read."""
+    key = (client.db, company_id, Window(from_date, to_date).key)
+    with _lock:
+        # A long-lived process (refresh_daemon) sees a new window every day
+        _evict(time.time())
+        key_lock = _locks.setdefault(key, threading.Lock())
+    # Concurrent reports of the same window wait for the first one's read
+    with key_lock:
+        cached = _frames.get(key)
+        if cached and time.time() - cached[0] < TTL:
+            return cached[1]
+        path = _cache_path(client, company_id, from_date, to_date)
+        try:
+            with open(path, "rb") as f:
+                cached = pickle.load(f)
+        except Exception:
+            # Missing, truncated or written by another version: read the window again
+            cached = None
+        if not cached or time.time() - cached[0] >= TTL:
+            cached = (time.time(), _read_union(client, company_id, cname, from_date, to_date))
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump(cached, f)
+            os.replace(tmp, path)
+        _frames[key] = cached
+        return cached[1]
+
+
+def split(client, records, domain):
+    """The union records that a read with ``domain`` (one of SHARED_READS) would have returned."""
+    categories = load_categories(client)
+    wanted = set().union(*(match_categories(categories, pattern) for pattern in _category_patterns(domain)))
+    return [rec for rec in records if (rec.get("product_id") or {}).get("categ_id") in wanted]
+
+
+def fetch_rows(client, company_id, cname, from_date, to_date, specification, domain, flatten=flatten_record):
+    """Rows of one report, split out of the shared read and flattened like ``fetch_report_rows``."""
+    if (specification, domain) not in SHARED_READS:
+        raise ValueError(f"{cname}: read is not part of SHARED_READS")
+    rows = [flatten(project(rec, specification))
+            for rec in split(client, shared_rows(client, company_id, cname, from_date, to_date), domain)]
+    log.info(f"📊 {cname}: {len(rows)} rows taken from the shared read")
+    return rows
@@ -0,0 +1,107 @@
+"""Transient report wizards (stock.forecast.report, mrp.report.custom, ppc.report), reused and cleaned up.
+
+Every report run used to create new wizard records and never delete them. The invoice
+scripts even created two per company: ``create`` with no values, then ``web_save`` on no
+id. Now:
+
+* ``save`` creates a wizard with all its values in one ``web_save``;
+* the next wizard of the same kind, for the same company and in the same thread (so no
+  other unit is using it), is the same record with the new values ``write``-n into it;
+* a wizard that is gone (vacuumed) is replaced. A model whose wizards refuse the
+  ``write`` is no longer reused in this process;
+* onchange defaults are fetched once per model and company (``defaults``), and not at
+  all when the values set every field of the form;
+* ``release_all`` unlinks every wizard the process created. The runner and the daemon
+  call it when they stop, and it runs at exit for direct script runs.
+
+WIZARD_REUSE=0 creates a new wizard every time; they are still unlinked at the end.
+"""
+import os
+import atexit
+import logging
+import threading
+
+import requests
+
+from odoo_client import OdooError
+
+log = logging.getLogger(__name__)
+
+REUSE = os.getenv("WIZARD_REUSE", "1").strip().lower() in ("1", "true", "yes")
+MISSING_ERROR = "odoo.exceptions.MissingError"
+
+
+class WizardManager:
+    def __init__(self):
+        self._current = {}     # (client, model, company_id, kind, thread) -> wizard id
+        self._created = {}     # (client, model, company_id) -> ids to unlink
+        self._no_write = set()
+        self._defaults = {}    # (client, model, company_id) -> onchange values
+        self._lock = threading.Lock()
+
+    def save(self, client, model, company_id, values, context, specification=None, kind=""):
+        """Id of a wizard of ``model`` holding ``values``: the reused one when possible, else a new one."""
+        key = (client, model, company_id, kind, threading.get_ident())
+        with self._lock:
+            wizard_id = self._current.get(key)
+        if wizard_id and REUSE and model not in self._no_write:
+            try:
+                client.call_kw(model, "write", [[wizard_id], values], {"context": context})
+                log.info(f"♻️ Reusing {model} wizard {wizard_id} for company {company_id}")
+                return wizard_id
+            except OdooError as e:
+                log.warning(f"⚠️ {model} wizard {wizard_id} not reusable, creating a new one: {e}")
+                with self._lock:
+                    if e.name != MISSING_ERROR:
+                        self._no_write.add(model)
+                    else:
+                        self._created[(client, model, company_id)].remove(wizard_id)
+
+        result = client.call_kw(model, "web_save", [[], values],
+                                {"context": context, "specification": specification or {}})
+        if not (isinstance(result, list) and result and result[0].get("id")):
+            raise Exception(f"❌ Failed to create {model} wizard: {result}")
+        wizard_id = result[0]["id"]
+        with self._lock:
+            self._current[key] = wizard_id
+            self._created.setdefault((client, model, company_id), []).append(wizard_id)
+        return wizard_id
+
+    def defaults(self, client, model, company_id, values, context, specification):
+        """Onchange defaults of a new ``model`` wizard, or ``{}`` without a call when ``values`` set every field."""
+        if set(specification) <= set(values):
+            return {}
+        key = (client, model, company_id)
+        with self._lock:
+            cached = self._defaults.get(key)
+        if cached is None:
+            result = client.call_kw(model, "onchange", [[], {}, [], specification], {"context": context})
+            cached = (result or {}).get("value", {})
+            with self._lock:
+                self._defaults[key] = cached
+        return cached
+
+    def release_all(self):
+        """Unlink every wizard created so far; returns how many were removed."""
+        with self._lock:
+            created, self._created = self._created, {}
+            self._current.clear()
+        removed = 0
+        for (client, model, company_id), ids in created.items():
+            if not ids:
+                continue
+            try:
+                client.call_kw(model, "unlink", [ids], {"context": client.context(company_id)})
+            except (OdooError, requests.RequestException) as e:
+                log.warning(f"⚠️ Could not unlink {model} wizards {ids}: {e}")
+                continue
+            removed += len(ids)
+            log.info(f"🧹 Unlinked {len(ids)} {model} wizard(s) of company {company_id}")
+        return removed
+
+
+MANAGER = WizardManager()
+save = MANAGER.save
+defaults = MANAGER.defaults
+release_all = MANAGER.release_all
+atexit.register(release_all)
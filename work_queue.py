@@ -0,0 +1,187 @@
+"""SQLite-backed work queue for splitting a report run across worker processes and hosts.
+
+Each row is one ``(report, company_id, window)`` unit. Workers claim a unit inside
+an immediate transaction, keep a heartbeat on it while it runs and either mark it
+done or release it for another worker. A claim whose heartbeat is older than the
+lease is considered abandoned and can be claimed again. Units are handed out earliest
+deadline first, then by priority.
+"""
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS units (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    report TEXT NOT NULL,
+    company_id INTEGER NOT NULL,
+    window TEXT NOT NULL DEFAULT '',
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    heartbeat REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    started_at REAL,
+    finished_at REAL,
+    priority INTEGER NOT NULL DEFAULT 5,
+    deadline REAL,
+    UNIQUE (report, company_id, window)
+)
+"""
+
+# Columns added after the first release; older queue files get them on open
+MIGRATIONS = {
+    "priority": "ALTER TABLE units ADD COLUMN priority INTEGER NOT NULL DEFAULT 5",
+    "deadline": "ALTER TABLE units ADD COLUMN deadline REAL",
+}
+
+
+class WorkQueue:
+    def __init__(self, path, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        with self._transaction() as db:
+            db.execute(SCHEMA)
+            columns = {row["name"] for row in db.execute("PRAGMA table_info(units)")}
+            for column, ddl in MIGRATIONS.items():
+                if column not in columns:
+                    db.execute(ddl)
+
+    # ===== Connection =====
+    @property
+    def db(self):
+        # sqlite3 connections may not be shared between threads (the heartbeat runs in its own)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        db = self.db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    # ===== Producer =====
+    def enqueue(self, units):
+        """Add ``(report, company_id, window, priority, deadline)`` units that are not queued yet;
+        returns how many were new."""
+        with self._transaction() as db:
+            before = db.total_changes
+            db.executemany("INSERT OR IGNORE INTO units (report, company_id, window, priority, deadline) "
+                           "VALUES (?, ?, ?, ?, ?)", units)
+            added = db.total_changes - before
+        log.info(f"📥 {added} new unit(s) queued ({len(units) - added} already present)")
+        return added
+
+    def reset(self):
+        with self._transaction() as db:
+            db.execute("DELETE FROM units")
+
+    # ===== Worker =====
+    def claim(self, worker):
+        """Atomically take the pending unit with the earliest deadline, or one whose lease has expired."""
+        now = time.time()
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE units SET state = 'failed', worker = NULL, error = 'lease expired', finished_at = ? "
+                "WHERE state = 'claimed' AND heartbeat < ? AND attempts >= ?",
+                (now, now - self.lease_seconds, self.max_attempts),
+            )
+            row = db.execute(
+                "SELECT * FROM units WHERE attempts < ? AND (state = 'pending' OR (state = 'claimed' AND heartbeat < ?)) "
+                "ORDER BY deadline IS NULL, deadline, priority, id LIMIT 1",
+                (self.max_attempts, now - self.lease_seconds),
+            ).fetchone()
+            if row is None:
+                return None
+            if row["state"] == "claimed":
+                log.warning(f"⏰ Lease of {row['worker']} on unit {row['id']} expired, reclaiming")
+            db.execute(
+                "UPDATE units SET state = 'claimed', worker = ?, heartbeat = ?, started_at = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                (worker, now, now, row["id"]),
+            )
+        return dict(row, worker=worker, attempts=row["attempts"] + 1)
+
+    def heartbeat(self, unit_id, worker):
+        """Extend the lease; returns False when the unit is no longer held by ``worker``."""
+        cur = self.db.execute("UPDATE units SET heartbeat = ? WHERE id = ? AND worker = ? AND state = 'claimed'",
+                              (time.time(), unit_id, worker))
+        return cur.rowcount == 1
+
+    def complete(self, unit_id, worker):
+        """Mark a unit done; returns the finish time."""
+        finished_at = time.time()
+        self.db.execute("UPDATE units SET state = 'done', error = NULL, finished_at = ? WHERE id = ? AND worker = ?",
+                        (finished_at, unit_id, worker))
+        return finished_at
+
+    def release(self, unit_id, worker, error=None):
+        """Give a failed unit back to the queue, or mark it failed once it ran out of attempts."""
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE units SET state = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END, "
+                "worker = NULL, heartbeat = NULL, error = ?, finished_at = ? WHERE id = ? AND worker = ?",
+                (self.max_attempts, error, time.time(), unit_id, worker),
+            )
+
+    # ===== Progress =====
+    def outstanding(self):
+        """Units that may still need a worker: pending, or claimed (possibly by a worker that died)."""
+        return self.db.execute("SELECT COUNT(*) FROM units WHERE state IN ('pending', 'claimed')").fetchone()[0]
+
+    def summary(self):
+        rows = self.db.execute("SELECT state, COUNT(*) FROM units GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
+
+    def sla_misses(self):
+        """Units that finished (or failed) after their deadline, most urgent first."""
+        return [dict(row) for row in self.db.execute(
+            "SELECT * FROM units WHERE state IN ('done', 'failed') AND finished_at > deadline ORDER BY priority, id")]
+
+    def failures(self):
+        return [dict(row) for row in self.db.execute("SELECT * FROM units WHERE state = 'failed' ORDER BY id")]
+
+
+class Heartbeat:
+    """Context manager that keeps a claimed unit's lease alive from a background thread."""
+
+    def __init__(self, queue, unit_id, worker, interval=None):
+        self.queue = queue
+        self.unit_id = unit_id
+        self.worker = worker
+        self.interval = interval or max(1, queue.lease_seconds / 3)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._beat, daemon=True)
+
+    def _beat(self):
+        while not self._stop.wait(self.interval):
+            if not self.queue.heartbeat(self.unit_id, self.worker):
+                log.warning(f"⚠️ Unit {self.unit_id} is no longer held by {self.worker}")
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()